@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Admission Module - 重い処理の同時実行数を制限する受付制御
+
+PDF解析やカレンダー登録のような重い処理について、同時に実行できる数（枠）と
+空きを待てる数（待ち行列）を制限します。待ち行列がいっぱいの場合や待ち時間が上限を超えた場合、
+同じセッションからの同時実行数が上限に達している場合は AdmissionRejected を送出し、
+呼び出し側で 503 と Retry-After を返せるようにします。
+
+制限はプロセス（gunicorn のワーカー）ごとに適用されます。
+"""
+
+import math
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import metrics
+
+QUEUE_DEPTH = metrics.registry.gauge(
+    'shiftmanager_admission_queue_depth',
+    '実行枠の空きを待っているリクエスト数',
+    ('pool',)
+)
+IN_FLIGHT = metrics.registry.gauge(
+    'shiftmanager_admission_in_flight',
+    '実行中のリクエスト数',
+    ('pool',)
+)
+WAIT_SECONDS = metrics.registry.histogram(
+    'shiftmanager_admission_wait_seconds',
+    '実行枠の空きを待った時間（秒）',
+    ('pool',)
+)
+REJECTIONS = metrics.registry.counter(
+    'shiftmanager_admission_rejections_total',
+    '受付制御で拒否したリクエスト数',
+    ('pool', 'reason')
+)
+
+
+class AdmissionRejected(Exception):
+    """受付制御でリクエストを拒否した場合の例外"""
+
+    def __init__(self, pool: str, reason: str, retry_after: int):
+        """
+        初期化
+
+        Args:
+            pool: 拒否した受付制御の名前
+            reason: 拒否の理由（'queue_full' / 'timeout' / 'session_limit'）
+            retry_after: 再試行までの推奨秒数
+        """
+        super().__init__(f"{pool}: {reason}")
+        self.pool = pool
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """同時実行数・待ち行列・セッションごとの同時実行数を制限する受付制御"""
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float,
+                 per_session_limit: int = 1, retry_after: int = 5):
+        """
+        初期化
+
+        Args:
+            name: 受付制御の名前（メトリクスのラベルに使用）
+            max_concurrent: 同時に実行できる数
+            max_queue: 実行枠の空きを待てる数
+            queue_timeout: 実行枠の空きを待つ最大秒数
+            per_session_limit: 同じセッションから同時に実行・待機できる数（0の場合は制限なし）
+            retry_after: 再試行までの推奨秒数の最小値
+        """
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.per_session_limit = per_session_limit
+        self.retry_after = retry_after
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._per_session: Dict[str, int] = {}
+        # 1件あたりの処理時間の指数移動平均（Retry-After の見積もりに使用）
+        self._service_seconds = float(retry_after)
+
+    def _retry_after(self) -> int:
+        """待ち行列の長さと平均処理時間から再試行までの秒数を見積もる"""
+        estimate = self._service_seconds * (self._waiting + 1) / self.max_concurrent
+        return max(self.retry_after, int(math.ceil(estimate)))
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        REJECTIONS.inc(pool=self.name, reason=reason)
+        return AdmissionRejected(self.name, reason, self._retry_after())
+
+    def _release_session(self, session_key: Optional[str]) -> None:
+        if session_key is None:
+            return
+        remaining = self._per_session.get(session_key, 0) - 1
+        if remaining > 0:
+            self._per_session[session_key] = remaining
+        else:
+            self._per_session.pop(session_key, None)
+
+    @contextmanager
+    def admit(self, session_key: Optional[str] = None):
+        """
+        実行枠を確保するコンテキストマネージャ
+
+        Args:
+            session_key: セッションの識別子（None の場合はセッションごとの制限を適用しない）
+
+        Raises:
+            AdmissionRejected: 受け付けられない場合
+        """
+        start = time.perf_counter()
+        with self._cond:
+            if session_key is not None and self.per_session_limit:
+                if self._per_session.get(session_key, 0) >= self.per_session_limit:
+                    raise self._reject('session_limit')
+                self._per_session[session_key] = self._per_session.get(session_key, 0) + 1
+
+            if self._active >= self.max_concurrent:
+                if self._waiting >= self.max_queue:
+                    self._release_session(session_key)
+                    raise self._reject('queue_full')
+                self._waiting += 1
+                QUEUE_DEPTH.set(self._waiting, pool=self.name)
+                try:
+                    admitted = self._cond.wait_for(lambda: self._active < self.max_concurrent,
+                                                   timeout=self.queue_timeout)
+                finally:
+                    self._waiting -= 1
+                    QUEUE_DEPTH.set(self._waiting, pool=self.name)
+                if not admitted:
+                    self._release_session(session_key)
+                    raise self._reject('timeout')
+
+            self._active += 1
+            IN_FLIGHT.set(self._active, pool=self.name)
+        WAIT_SECONDS.observe(time.perf_counter() - start, pool=self.name)
+
+        service_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - service_start
+            with self._cond:
+                self._active -= 1
+                self._release_session(session_key)
+                self._service_seconds = 0.8 * self._service_seconds + 0.2 * elapsed
+                IN_FLIGHT.set(self._active, pool=self.name)
+                self._cond.notify()
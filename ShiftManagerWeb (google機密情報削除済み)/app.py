@@ -7,6 +7,9 @@ import re
 import logging
 import json
 import tempfile
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from functools import wraps
 import secrets
@@ -14,14 +17,19 @@ import secrets
 import google.oauth2.credentials
 import google_auth_oauthlib.flow
 import googleapiclient.discovery
+import googleapiclient.discovery_cache
 import google.auth.transport.requests
-from flask import Flask, redirect, url_for, session, request, jsonify, render_template, flash, send_from_directory
+from flask import Flask, redirect, url_for, session, request, jsonify, render_template, flash, send_from_directory, g, Response, abort
 from flask_session import Session
 from werkzeug.utils import secure_filename
 
 # 自作モジュールのインポート
-from pdf_parser import PdfParser
+from pdf_parser import parse_roster_file, retarget_roster
+from roster_cache import diff_shifts
 from config import Config
+import metrics
+from metrics import timed
+from admission import AdmissionController, AdmissionRejected
 
 # ログ設定
 logging.basicConfig(
@@ -58,6 +66,78 @@ def configure_session():
 # アプリケーション初期化時に呼び出し
 configure_session()
 
+class TimedSessionInterface:
+    """セッションの読み書き時間を計測するためのラッパー"""
+
+    def __init__(self, interface):
+        self._interface = interface
+
+    def __getattr__(self, name):
+        return getattr(self._interface, name)
+
+    def open_session(self, app, request):
+        with timed('session_open'):
+            return self._interface.open_session(app, request)
+
+    def save_session(self, app, session, response):
+        with timed('session_save'):
+            return self._interface.save_session(app, session, response)
+
+app.session_interface = TimedSessionInterface(app.session_interface)
+
+class ServerTimingMiddleware:
+    """
+    リクエスト単位の計測を行い、必要に応じて Server-Timing ヘッダーを付与する WSGI ミドルウェア
+
+    セッションの読み込みは before_request より前、保存は after_request より後に行われるため、
+    Flask の外側で計測を開始し、レスポンスヘッダーの送信時に計測を終了します。
+    """
+
+    def __init__(self, wsgi_app):
+        self._wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        token = metrics.begin_request_spans()
+        ended = False
+
+        def timing_start_response(status, headers, exc_info=None):
+            nonlocal ended
+            if not ended:
+                ended = True
+                spans = metrics.end_request_spans(token)
+                if app.config.get('SERVER_TIMING_ENABLED'):
+                    spans.append(('total', time.perf_counter() - start))
+                    headers.append(('Server-Timing', metrics.format_server_timing(spans)))
+            return start_response(status, headers, exc_info)
+
+        try:
+            return self._wsgi_app(environ, timing_start_response)
+        finally:
+            if not ended:
+                ended = True
+                metrics.end_request_spans(token)
+
+app.wsgi_app = ServerTimingMiddleware(app.wsgi_app)
+
+@app.before_request
+def start_request_timer():
+    """ルートごとの処理時間の計測を開始"""
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """ルートごとの処理時間とリクエスト数を記録"""
+    start = g.pop('request_start', None)
+    if start is None:
+        return response
+
+    elapsed = time.perf_counter() - start
+    endpoint = request.endpoint or 'unknown'
+    metrics.REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, method=request.method)
+    metrics.REQUESTS_TOTAL.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
 # セッション初期化処理の追加
 def init_session():
     if 'state' not in session:
@@ -110,6 +190,53 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def _create_admission_controller(name, concurrency):
+    return AdmissionController(
+        name,
+        max_concurrent=concurrency,
+        max_queue=app.config['ADMISSION_QUEUE_SIZE'],
+        queue_timeout=app.config['ADMISSION_QUEUE_TIMEOUT'],
+        per_session_limit=app.config['ADMISSION_PER_SESSION'],
+        retry_after=app.config['ADMISSION_RETRY_AFTER'],
+    )
+
+# PDF解析とカレンダー登録の受付制御
+parse_admission = _create_admission_controller(
+    'parse', app.config['ADMISSION_PARSE_CONCURRENCY'] or os.cpu_count() or 1)
+register_admission = _create_admission_controller(
+    'register', app.config['ADMISSION_REGISTER_CONCURRENCY'])
+
+def admission_controlled(controller, methods=('POST',)):
+    """
+    重い処理を行うルートに受付制御を適用するデコレータ
+    
+    混雑している場合や同じセッションで処理中の場合は 503 と Retry-After を返します。
+    
+    Args:
+        controller: 適用する AdmissionController
+        methods: 受付制御の対象とするHTTPメソッド
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method not in methods:
+                return f(*args, **kwargs)
+            session_key = getattr(session, 'sid', None) or request.remote_addr
+            try:
+                with controller.admit(session_key):
+                    return f(*args, **kwargs)
+            except AdmissionRejected as e:
+                logger.warning(f"受付制御により拒否しました: {e}（Retry-After: {e.retry_after}秒）")
+                if e.reason == 'session_limit':
+                    message = '前回の処理が完了していません。完了してから再度お試しください'
+                else:
+                    message = f'混雑しています。{e.retry_after}秒ほど待ってから再度お試しください'
+                response = Response(render_template('error.html', error_code=503, message=message), status=503)
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response
+        return decorated_function
+    return decorator
+
 def get_calendar_service():
     """Google Calendar APIサービスを取得"""
     credentials = google.oauth2.credentials.Credentials(**session['credentials'])
@@ -131,7 +258,28 @@ def get_calendar_service():
             logger.error(f"トークン更新エラー: {e}")
             raise
     
-    return googleapiclient.discovery.build(API_SERVICE_NAME, API_VERSION, credentials=credentials)
+    # 負荷試験時はローカルの擬似Calendar APIに接続
+    client_options = None
+    if app.config.get('CALENDAR_API_ENDPOINT'):
+        client_options = {'api_endpoint': app.config['CALENDAR_API_ENDPOINT']}
+    
+    with timed('calendar_build_service'):
+        return googleapiclient.discovery.build_from_document(get_calendar_discovery_doc(), credentials=credentials,
+                                                             client_options=client_options)
+
+_calendar_discovery_doc = None
+
+def get_calendar_discovery_doc():
+    """
+    Calendar APIのディスカバリードキュメントを取得（初回のみ読み込み、以降は共有）
+    
+    gunicorn の preload_app 構成では、ワーカーの起動前に読み込んでおくことで全ワーカーで共有されます。
+    """
+    global _calendar_discovery_doc
+    if _calendar_discovery_doc is None:
+        _calendar_discovery_doc = json.loads(
+            googleapiclient.discovery_cache.get_static_doc(API_SERVICE_NAME, API_VERSION))
+    return _calendar_discovery_doc
 
 def get_user_settings():
     """ユーザー設定を取得（デフォルト値付き）"""
@@ -170,12 +318,12 @@ def create_calendar_event_from_shift(schedule_item, year, month, settings):
         if end_hour < start_hour:
             end_hour += 24
         
-        start_time = f"{year}-{month}-{int(date):02d}T{start_hour:02d}:{start_min:02d}:00+09:00"
-        end_time = f"{year}-{month}-{int(date):02d}T{end_hour:02d}:{end_min:02d}:00+09:00"
+        start_time = f"{year}-{int(month):02d}-{int(date):02d}T{start_hour:02d}:{start_min:02d}:00+09:00"
+        end_time = f"{year}-{int(month):02d}-{int(date):02d}T{end_hour:02d}:{end_min:02d}:00+09:00"
     else:
         # 時間形式が合わない場合のフォールバック
-        start_time = f"{year}-{month}-{int(date):02d}T10:00:00+09:00"
-        end_time = f"{year}-{month}-{int(date):02d}T12:00:00+09:00"
+        start_time = f"{year}-{int(month):02d}-{int(date):02d}T10:00:00+09:00"
+        end_time = f"{year}-{int(month):02d}-{int(date):02d}T12:00:00+09:00"
     
     # リマインダー設定
     reminders = {
@@ -302,6 +450,24 @@ def oauth2callback():
         flash('認証に失敗しました。もう一度お試しください。', 'error')
         return redirect(url_for('index'))
 
+def loadtest_login():
+    """負荷試験用: Google認証を省略してダミーの認証情報をセッションに設定"""
+    init_session()
+    session['credentials'] = {
+        'token': 'loadtest-token',
+        'refresh_token': None,
+        'token_uri': 'https://oauth2.googleapis.com/token',
+        'client_id': 'loadtest',
+        'client_secret': 'loadtest',
+        'scopes': SCOPES
+    }
+    return redirect(url_for('upload_pdf'))
+
+# 負荷試験モードの場合のみOAuthスタブを有効化（本番環境では無効）
+if app.config.get('LOADTEST_MODE') and os.getenv('VERCEL_ENV') != 'production':
+    logger.warning("負荷試験モードで起動しています（OAuthスタブ有効）")
+    app.add_url_rule('/_loadtest/login', 'loadtest_login', loadtest_login)
+
 @app.route('/calendar/events')
 @login_required
 def list_events():
@@ -315,14 +481,15 @@ def list_events():
         now = datetime.utcnow().isoformat() + 'Z'
         one_month_later = (datetime.utcnow() + timedelta(days=30)).isoformat() + 'Z'
         
-        events_result = service.events().list(
-            calendarId=calendar_id,
-            timeMin=now,
-            timeMax=one_month_later,
-            maxResults=50,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
+        with timed('calendar_events_list'):
+            events_result = service.events().list(
+                calendarId=calendar_id,
+                timeMin=now,
+                timeMax=one_month_later,
+                maxResults=50,
+                singleEvents=True,
+                orderBy='startTime'
+            ).execute()
         
         events = events_result.get('items', [])
         return render_template('events.html', events=events, settings=settings)
@@ -360,6 +527,16 @@ def settings():
         }
         session['settings'] = new_settings
         flash('設定を保存しました', 'success')
+        
+        # 名前を変更した場合は直前にアップロードしたシフト表を新しい名前で検索し直す
+        if new_settings['target_name'] != current_settings['target_name'] and session.get('last_rosters'):
+            shift_groups = retarget_last_rosters(new_settings['target_name'])
+            if shift_groups:
+                session['shift_groups'] = shift_groups
+                periods = '、'.join(f"{group['year']}年{group['month']}月" for group in shift_groups)
+                flash(f"前回アップロードしたシフト表から「{new_settings['target_name']}」の{periods}のシフトを読み込みました", 'info')
+                return redirect(url_for('confirm_shifts'))
+            flash(f"前回アップロードしたシフト表に「{new_settings['target_name']}」のシフトは見つかりませんでした", 'warning')
         return redirect(url_for('settings'))
     
     # カレンダーの色一覧
@@ -381,7 +558,8 @@ def settings():
     calendars = []
     try:
         service = get_calendar_service()
-        calendar_list = service.calendarList().list().execute()
+        with timed('calendar_calendar_list'):
+            calendar_list = service.calendarList().list().execute()
         calendars = calendar_list.get('items', [])
     except Exception as e:
         logger.error(f"カレンダー一覧取得エラー: {e}")
@@ -394,63 +572,88 @@ def settings():
 
 @app.route('/upload', methods=['GET', 'POST'])
 @login_required
+@admission_controlled(parse_admission)
 def upload_pdf():
-    """PDFアップロード画面"""
+    """PDFアップロード画面（複数ファイル・複数月に対応）"""
     settings = get_user_settings()
     
     if request.method == 'POST':
-        if 'file' not in request.files:
+        files = [f for f in request.files.getlist('file') if f and f.filename]
+        if not files:
             flash('ファイルが選択されていません', 'error')
             return render_template('upload.html', settings=settings)
         
-        file = request.files['file']
-        if file.filename == '':
-            flash('ファイルが選択されていません', 'error')
+        if len(files) > app.config['MAX_UPLOAD_FILES']:
+            flash(f"一度にアップロードできるファイルは{app.config['MAX_UPLOAD_FILES']}件までです", 'error')
             return render_template('upload.html', settings=settings)
         
-        if not allowed_file(file.filename):
+        if not all(allowed_file(f.filename) for f in files):
             flash('PDFファイルを選択してください', 'error')
             return render_template('upload.html', settings=settings)
         
+        filepaths = []
         try:
             # ファイルを安全に保存
-            filepath = handle_pdf_upload(file)
+            uploads = []
+            for file in files:
+                filepath = handle_pdf_upload(file)
+                filepaths.append(filepath)
+                uploads.append((filepath, file.filename))
             
-            # PDFを解析
-            parser = PdfParser(settings['target_name'])
+            # PDFを解析（ファイルごとに年月を判定）
+            results = parse_uploaded_pdfs(uploads, settings['target_name'])
             
-            # まずファイル名から年月を抽出
-            year, month = parser.extract_year_month_from_filename(file.filename)
-            if year and month:
-                logger.info(f"ファイル名から年月を抽出: {year}年{month}月 (ファイル名: {file.filename})")
+            for result in results:
+                # 解析はワーカープロセスで行われる場合があるため、メモリの計測結果はここで記録する
+                metrics.PARSE_PEAK_RSS_MB.observe(result['peak_rss_mb'])
+                if result['memory_exceeded']:
+                    metrics.PARSE_MEMORY_REJECTIONS.inc()
+                for work, count in result['skipped_work'].items():
+                    metrics.PARSE_SKIPPED_WORK.inc(count, work=work)
+                logger.info(f"{result['filename']}: 解析中の最大RSS {result['peak_rss_mb']:.1f}MB、"
+                            f"省いた処理 {result['skipped_work']}")
+                if result['period_source'] == 'content':
+                    flash(f"{result['filename']}: ファイル名に年月がないため、PDFの見出しから{result['year']}年{result['month']}月と判定しました", 'info')
+                if result['error']:
+                    flash(f"{result['filename']}: {result['error']}", 'warning')
+                elif not result['shifts']:
+                    flash(f"{result['filename']}: シフト情報が見つかりませんでした。名前「{settings['target_name']}」が正しいか確認してください。", 'warning')
             
-            # シフト情報を解析
-            shifts = parser.parse_pdf(filepath)
+            # 設定で名前を変更した場合に再解析せず検索し直せるよう、インデックスの識別子を保存
+            session['last_rosters'] = [
+                {'filename': result['filename'], 'index_id': result['index_id'],
+                 'year': result['year'], 'month': result['month']}
+                for result in results if result['index_id']
+            ]
             
-            if not shifts:
-                flash(f"シフト情報が見つかりませんでした。名前「{settings['target_name']}」が正しいか確認してください。", 'warning')
+            shift_groups = group_shifts_by_month(results)
+            if not shift_groups:
+                for filepath in filepaths:
+                    safe_remove_file(filepath)
                 return render_template('upload.html', settings=settings)
             
-            # 年月が取得できなかった場合はPDFの内容から抽出
-            if year is None or month is None:
-                year, month = parser.extract_year_month(filepath)
-                if year is None or month is None:
-                    flash('ファイル名またはPDFの内容から年月を特定できませんでした。', 'warning')
-                    return render_template('upload.html', settings=settings)
+            # 前回アップロードした同じ月のシフト表と比較
+            record_roster_changes(shift_groups, settings['target_name'])
             
             # セッションに保存
-            session['shifts'] = shifts
-            session['year'] = year
-            session['month'] = month
-            session['pdf_path'] = filepath
+            session['shift_groups'] = shift_groups
+            session['pdf_paths'] = filepaths
             
             # 確認画面で年月を表示
-            flash(f'{year}年{month}月のシフト情報を読み込みました', 'info')
+            periods = '、'.join(f"{group['year']}年{group['month']}月" for group in shift_groups)
+            flash(f'{periods}のシフト情報を読み込みました', 'info')
+            for group in shift_groups:
+                changes = group.get('changes')
+                if changes:
+                    flash(f"{group['year']}年{group['month']}月: 前回のシフト表から{changes['changed_pages']}ページが変更され、"
+                          f"追加{len(changes['added'])}件・削除{len(changes['removed'])}件・時間変更{len(changes['changed'])}件がありました", 'info')
             
             return redirect(url_for('confirm_shifts'))
             
         except Exception as e:
             logger.error(f"PDFアップロードエラー: {e}")
+            for filepath in filepaths:
+                safe_remove_file(filepath)
             flash('PDFの処理中にエラーが発生しました', 'error')
             return render_template('upload.html', settings=settings)
     
@@ -459,44 +662,42 @@ def upload_pdf():
 @app.route('/confirm', methods=['GET', 'POST'])
 @login_required
 def confirm_shifts():
-    """抽出したシフト情報の確認画面"""
-    if 'shifts' not in session or 'year' not in session or 'month' not in session:
+    """抽出したシフト情報の確認画面（月ごとにまとめて表示）"""
+    if 'shift_groups' not in session:
         flash('シフト情報がありません。PDFをアップロードしてください。', 'warning')
         return redirect(url_for('upload_pdf'))
     
-    shifts = session['shifts']
-    year = session['year']
-    month = session['month']
+    shift_groups = session['shift_groups']
     settings = get_user_settings()
     
     if request.method == 'POST':
         # 選択されたシフトのみを処理
         selected_shifts = []
-        for i, shift in enumerate(shifts):
-            if request.form.get(f'shift_{i}', '') == 'on':
-                selected_shifts.append(shift)
+        for group_index, group in enumerate(shift_groups):
+            for i, shift in enumerate(group['shifts']):
+                if request.form.get(f'shift_{group_index}_{i}', '') == 'on':
+                    selected_shifts.append(dict(shift, year=group['year'], month=group['month']))
         
         if not selected_shifts:
             flash('登録するシフトが選択されていません', 'warning')
-            return render_template('confirm.html', shifts=shifts, year=year, month=month, settings=settings)
+            return render_template('confirm.html', shift_groups=shift_groups, settings=settings)
         
         # 選択されたシフトをセッションに保存
         session['selected_shifts'] = selected_shifts
         return redirect(url_for('register_events'))
     
-    return render_template('confirm.html', shifts=shifts, year=year, month=month, settings=settings)
+    return render_template('confirm.html', shift_groups=shift_groups, settings=settings)
 
 @app.route('/register', methods=['GET'])
 @login_required
+@admission_controlled(register_admission, methods=('GET',))
 def register_events():
-    """選択したシフトをカレンダーに登録"""
-    if 'selected_shifts' not in session or 'year' not in session or 'month' not in session:
+    """選択したシフトをカレンダーに登録（全ての月をまとめて1回で登録）"""
+    if 'selected_shifts' not in session:
         flash('シフト情報がありません', 'warning')
         return redirect(url_for('upload_pdf'))
     
     shifts = session['selected_shifts']
-    year = session['year']
-    month = session['month']
     settings = get_user_settings()
     
     try:
@@ -505,8 +706,9 @@ def register_events():
         
         results = []
         for shift in shifts:
-            event = create_calendar_event_from_shift(shift, year, month, settings)
-            created_event = service.events().insert(calendarId=calendar_id, body=event).execute()
+            event = create_calendar_event_from_shift(shift, shift['year'], shift['month'], settings)
+            with timed('calendar_events_insert'):
+                created_event = service.events().insert(calendarId=calendar_id, body=event).execute()
             
             results.append({
                 'date': shift['date'],
@@ -520,9 +722,8 @@ def register_events():
         flash(f'{len(results)}件のシフトをカレンダーに登録しました', 'success')
         
         # 一時ファイルを削除
-        if 'pdf_path' in session and os.path.exists(session['pdf_path']):
-            os.remove(session['pdf_path'])
-            del session['pdf_path']
+        for pdf_path in session.pop('pdf_paths', []):
+            safe_remove_file(pdf_path)
         
         return render_template('result.html', results=results, settings=settings)
         
@@ -531,6 +732,26 @@ def register_events():
         flash('カレンダーへの登録中にエラーが発生しました', 'error')
         return redirect(url_for('confirm_shifts'))
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """
+    Prometheus形式のメトリクス出力
+    
+    METRICS_TOKEN が設定されている場合は Bearer トークンを要求し、
+    未設定の場合はローカル（ループバックアドレス）からの取得だけを許可します。
+    """
+    if not app.config.get('METRICS_ENABLED'):
+        abort(404)
+    token = app.config.get('METRICS_TOKEN')
+    if token:
+        auth = request.headers.get('Authorization', '')
+        allowed = secrets.compare_digest(auth.encode(), f'Bearer {token}'.encode())
+    else:
+        allowed = request.remote_addr in ('127.0.0.1', '::1')
+    if not allowed:
+        return Response('Forbidden\n', status=403, mimetype='text/plain')
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/favicon.ico')
 def favicon():
     """ファビコン"""
@@ -558,19 +779,133 @@ def safe_remove_file(file_path):
     except Exception as e:
         logger.warning(f"ファイル削除エラー: {e}")
 
+_parse_executor = None
+
+def get_parse_executor():
+    """
+    複数PDFの並列解析に使うプロセスプールを取得（初回のみ作成）
+    
+    リクエスト処理のスレッドが動いている間に fork するとロックの状態ごと複製されるため、
+    解析プロセスは forkserver（使えない環境では spawn）で起動します。
+    """
+    global _parse_executor
+    if _parse_executor is None:
+        workers = app.config.get('UPLOAD_PARSE_WORKERS') or os.cpu_count() or 1
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        _parse_executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method))
+    return _parse_executor
+
+def parse_uploaded_pdfs(uploads, target_name):
+    """
+    アップロードされたPDFを解析
+    
+    複数ファイルの場合はプロセスプールで並列に解析し、1ファイルの場合は同じプロセスで解析します。
+    戻り値はアップロードと同じ順序の parse_roster_file の結果リストです。
+    """
+    cache_dir = app.config.get('ROSTER_CACHE_DIR')
+    cache_ttl = app.config.get('ROSTER_CACHE_TTL')
+    rss_budget_mb = app.config.get('PARSE_RSS_BUDGET_MB') or None
+    if len(uploads) == 1 or (app.config.get('UPLOAD_PARSE_WORKERS') or os.cpu_count() or 1) == 1:
+        return [parse_roster_file(filepath, filename, target_name, cache_dir, cache_ttl, rss_budget_mb)
+                for filepath, filename in uploads]
+    
+    executor = get_parse_executor()
+    with timed('parse_parallel'):
+        futures = [executor.submit(parse_roster_file, filepath, filename, target_name,
+                                   cache_dir, cache_ttl, rss_budget_mb, True)
+                   for filepath, filename in uploads]
+        results = [future.result() for future in futures]
+    # ワーカープロセスで計測した段階ごとの所要時間を、このプロセスのメトリクスと Server-Timing に記録
+    for result in results:
+        metrics.record_spans(result.pop('stage_spans', []))
+    return results
+
+def group_shifts_by_month(results):
+    """解析結果を年月ごとにまとめ、重複を除いて日付順に並べる"""
+    groups = {}
+    for result in results:
+        if result['error'] or not result['shifts']:
+            continue
+        key = (result['year'], result['month'])
+        group = groups.setdefault(key, {'year': key[0], 'month': key[1], 'files': [], 'shifts': [],
+                                        'page_hashes': [], 'reused_pages': 0})
+        group['files'].append(result['filename'])
+        group['page_hashes'].extend(result.get('page_hashes', []))
+        group['reused_pages'] += result.get('reused_pages', 0)
+        seen = {(shift['date'], shift['time']) for shift in group['shifts']}
+        for shift in result['shifts']:
+            if (shift['date'], shift['time']) not in seen:
+                seen.add((shift['date'], shift['time']))
+                group['shifts'].append(shift)
+    
+    for group in groups.values():
+        group['shifts'].sort(key=lambda x: int(x['date']))
+    return [groups[key] for key in sorted(groups)]
+
+def retarget_last_rosters(target_name):
+    """
+    直前にアップロードしたシフト表を、保存済みのセルインデックスから別の名前で検索し直す
+    
+    PDFは再解析しないため、アップロード済みのファイルが削除されていても検索できます。
+    戻り値は group_shifts_by_month と同じ形式の月ごとのシフトです。
+    """
+    results = []
+    for roster in session.get('last_rosters', []):
+        shifts = retarget_roster(app.config['ROSTER_CACHE_DIR'], roster['index_id'], target_name,
+                                 app.config.get('ROSTER_CACHE_TTL'))
+        if shifts is None:
+            logger.info(f"{roster['filename']}: セルインデックスの有効期限が切れています")
+            continue
+        error = None if roster['year'] and roster['month'] else '年月を特定できませんでした'
+        results.append({'filename': roster['filename'], 'year': roster['year'], 'month': roster['month'],
+                        'shifts': shifts, 'error': error})
+    return group_shifts_by_month(results)
+
+def record_roster_changes(shift_groups, target_name):
+    """
+    前回アップロードした同じ月のシフト表と比較し、変更内容を group['changes'] に設定
+    
+    比較に使うため、今回のページハッシュとシフトをセッションの履歴に保存します。
+    同じ月のシフト表を初めてアップロードした場合は changes を設定しません。
+    """
+    history = session.get('roster_history', {})
+    for group in shift_groups:
+        key = f"{target_name}:{group['year']}-{group['month']:02d}"
+        previous = history.pop(key, None)
+        if previous:
+            previous_hashes = set(previous['page_hashes'])
+            changes = diff_shifts(previous['shifts'], group['shifts'])
+            changes['changed_pages'] = sum(1 for h in group['page_hashes'] if h not in previous_hashes)
+            changes['total_pages'] = len(group['page_hashes'])
+            group['changes'] = changes
+        # 最近アップロードした月が末尾になるよう入れ直す
+        history[key] = {'page_hashes': group['page_hashes'], 'shifts': group['shifts']}
+    
+    max_size = app.config.get('ROSTER_HISTORY_SIZE', 12)
+    while len(history) > max_size:
+        history.pop(next(iter(history)))
+    session['roster_history'] = history
+
 def handle_pdf_upload(file):
-    """PDFファイルの処理（Vercel環境対応）"""
+    """
+    PDFファイルの処理（Vercel環境対応）
+    
+    secure_filename は日本語を取り除くため（「シフト表.pdf」「勤務表.pdf」はどちらも「pdf」になる）、
+    同じリクエストの他のファイルを上書きしないよう一意な名前で保存します。
+    年月の判定には保存先のパスではなく元のファイル名（file.filename）を使ってください。
+    """
     if os.getenv('VERCEL_ENV') == 'production':
         # 一時ディレクトリを使用
-        temp_dir = '/tmp'
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(temp_dir, filename)
+        upload_dir = '/tmp'
     else:
         # 通常の環境
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        upload_dir = app.config['UPLOAD_FOLDER']
     
-    file.save(filepath)
+    stem = os.path.splitext(secure_filename(file.filename))[0] or 'upload'
+    fd, filepath = tempfile.mkstemp(prefix=f'{stem}_', suffix='.pdf', dir=upload_dir)
+    with timed('upload_save'):
+        with os.fdopen(fd, 'wb') as f:
+            file.save(f)
     return filepath
 
 if __name__ == '__main__':
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Batch CLI - シフト表PDFのディレクトリを一括処理するコマンドラインツール
+
+ディレクトリ内のシフト表PDFを複数プロセスで並列に解析し、指定した全員分のシフトを
+JSON Lines（標準出力またはファイル）または担当者ごとのICSファイルとして出力します。
+年月はファイル名から判定し、ファイル名にない場合はPDFの1ページ目の見出しから判定します。
+
+使い方:
+    python batch_cli.py rosters/ --names 瓜田,田中,佐藤 > shifts.jsonl
+    python batch_cli.py rosters/ --names-file staff.txt --format ics --output-dir ics/
+"""
+
+import os
+import re
+import sys
+import json
+import logging
+import argparse
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from pdf_parser import PdfParser
+
+logger = logging.getLogger(__name__)
+
+# RFC 5545 の1行の最大長（オクテット、改行を除く）
+ICS_LINE_OCTETS = 75
+# DTSTART/DTEND の TZID=Asia/Tokyo が参照するタイムゾーンの定義（日本標準時は夏時間がない）
+ICS_VTIMEZONE = (
+    'BEGIN:VTIMEZONE',
+    'TZID:Asia/Tokyo',
+    'BEGIN:STANDARD',
+    'DTSTART:19700101T000000',
+    'TZOFFSETFROM:+0900',
+    'TZOFFSETTO:+0900',
+    'TZNAME:JST',
+    'END:STANDARD',
+    'END:VTIMEZONE',
+)
+
+
+def load_names(names: Optional[str], names_file: Optional[str]) -> List[str]:
+    """
+    コマンドライン引数から対象者のリストを作成
+
+    Args:
+        names: カンマ区切りの名前
+        names_file: 1行に1名を記載したファイルのパス
+
+    Returns:
+        重複を除いた名前のリスト
+    """
+    result = []
+    if names:
+        result.extend(name.strip() for name in names.split(','))
+    if names_file:
+        with open(names_file, encoding='utf-8') as f:
+            result.extend(line.strip() for line in f)
+    return list(dict.fromkeys(name for name in result if name))
+
+
+def find_pdfs(directory: str, recursive: bool = False) -> List[str]:
+    """ディレクトリ内のPDFファイルを列挙"""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        for filename in sorted(files):
+            if filename.lower().endswith('.pdf'):
+                paths.append(os.path.join(root, filename))
+        if not recursive:
+            break
+    return sorted(paths)
+
+
+def shift_to_datetimes(shift: Dict[str, str], year: int, month: int) -> Tuple[datetime, datetime]:
+    """
+    シフト情報から開始・終了日時を作成
+
+    終了時刻が開始時刻より前の場合は翌日として扱います。
+    時間が解析できない場合は 10:00〜12:00 とします（アプリのカレンダー登録と同じ）。
+    """
+    day = int(shift['date'])
+    time_match = re.search(PdfParser.TIME_PATTERN, shift['time'])
+    if time_match:
+        start_hour, start_min, end_hour, end_min = (int(value) for value in time_match.groups())
+    else:
+        start_hour, start_min, end_hour, end_min = 10, 0, 12, 0
+
+    start = datetime(year, month, day, start_hour, start_min)
+    end = datetime(year, month, day) + timedelta(hours=end_hour, minutes=end_min)
+    if end <= start:
+        end += timedelta(days=1)
+    return start, end
+
+
+def process_file(pdf_path: str, names: List[str], year: Optional[int] = None,
+                 month: Optional[int] = None) -> Dict:
+    """
+    1つのPDFを解析し、全員分のシフトを抽出（ワーカープロセスで実行）
+
+    PDFの抽出は1回だけ行い、名前ごとの照合は抽出結果に対して行います。
+
+    Args:
+        pdf_path: PDFファイルのパス
+        names: 対象者のリスト
+        year: ファイル名から判定できない場合に使う年
+        month: ファイル名から判定できない場合に使う月（省略時はPDFの見出しから判定）
+
+    Returns:
+        {'file', 'year', 'month', 'shifts': {名前: シフトリスト}, 'error'} の辞書
+    """
+    result = {'file': pdf_path, 'year': None, 'month': None, 'shifts': {}, 'error': None}
+    try:
+        parser = PdfParser(names[0])
+        pages = parser.extract_pages(pdf_path)
+
+        file_year, file_month = parser.extract_year_month_from_filename(os.path.basename(pdf_path), guess_year=False)
+        if file_month is None and month is not None:
+            # ファイル名に月がない場合は引数の年月を見出しより優先する
+            file_year, file_month = year or file_year, month
+        result['year'], result['month'] = parser.resolve_period(file_year, file_month, parser.detected_period)
+        if result['year'] is None or result['month'] is None:
+            result['error'] = 'ファイル名とPDFの見出しから年月を特定できませんでした（--year/--month で指定できます）'
+            return result
+
+        for name in names:
+            result['shifts'][name] = PdfParser(name).parse_extracted(pages)
+    except Exception as e:
+        result['error'] = str(e)
+    return result
+
+
+def _ics_escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _ics_lines(*lines: str) -> str:
+    """
+    ICSの各行を CRLF で連結（RFC 5545 に従い75オクテットを超える行は折り返す）
+
+    折り返しは UTF-8 の文字の途中で分割しないよう文字単位で行い、続きの行は空白1つで始めます。
+    """
+    folded = []
+    for line in lines:
+        chunk, size = '', 0
+        for char in line:
+            char_size = len(char.encode('utf-8'))
+            if size + char_size > ICS_LINE_OCTETS:
+                folded.append(chunk)
+                chunk, size = ' ', 1
+            chunk += char
+            size += char_size
+        folded.append(chunk)
+    return ''.join(f'{line}\r\n' for line in folded)
+
+
+class IcsWriter:
+    """担当者ごとのICSファイルに逐次書き込むライター"""
+
+    def __init__(self, output_dir: str, title: str, location: str):
+        self.output_dir = output_dir
+        self.title = title
+        self.location = location
+        self._files = {}
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _file_for(self, name: str):
+        if name not in self._files:
+            safe_name = re.sub(r'[\\/:*?"<>|\s]+', '_', name)
+            f = open(os.path.join(self.output_dir, f'{safe_name}.ics'), 'w', encoding='utf-8', newline='')
+            f.write(_ics_lines('BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//ShiftManagerWeb//batch_cli//JA',
+                               'CALSCALE:GREGORIAN', 'X-WR-TIMEZONE:Asia/Tokyo', *ICS_VTIMEZONE))
+            self._files[name] = f
+        return self._files[name]
+
+    def write(self, name: str, shift: Dict[str, str], start: datetime, end: datetime) -> None:
+        stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+        self._file_for(name).write(_ics_lines(
+            'BEGIN:VEVENT',
+            f'UID:{uuid.uuid4()}@shiftmanagerweb',
+            f'DTSTAMP:{stamp}',
+            f'DTSTART;TZID=Asia/Tokyo:{start.strftime("%Y%m%dT%H%M%S")}',
+            f'DTEND;TZID=Asia/Tokyo:{end.strftime("%Y%m%dT%H%M%S")}',
+            f'SUMMARY:{_ics_escape(self.title)}',
+            f'LOCATION:{_ics_escape(self.location)}',
+            f'DESCRIPTION:{_ics_escape("シフト時間: " + shift["time"])}',
+            'END:VEVENT',
+        ))
+
+    def close(self) -> None:
+        for f in self._files.values():
+            f.write(_ics_lines('END:VCALENDAR'))
+            f.close()
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description='シフト表PDFを一括解析します')
+    arg_parser.add_argument('directory', help='シフト表PDFのディレクトリ')
+    arg_parser.add_argument('--names', help='対象者（カンマ区切り）')
+    arg_parser.add_argument('--names-file', help='対象者の一覧ファイル（1行1名）')
+    arg_parser.add_argument('--format', choices=['jsonl', 'ics'], default='jsonl', help='出力形式')
+    arg_parser.add_argument('--output', help='JSON Lines の出力先（省略時は標準出力）')
+    arg_parser.add_argument('--output-dir', default='ics', help='ICSファイルの出力先ディレクトリ')
+    arg_parser.add_argument('--event-title', default='図書館バイト📚', help='ICSのイベントタイトル')
+    arg_parser.add_argument('--event-location', default='図書館', help='ICSのイベントの場所')
+    arg_parser.add_argument('--year', type=int, help='ファイル名から年を判定できない場合の年')
+    arg_parser.add_argument('--month', type=int, help='ファイル名から月を判定できない場合の月')
+    arg_parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='並列プロセス数')
+    arg_parser.add_argument('--recursive', action='store_true', help='サブディレクトリも対象にする')
+    arg_parser.add_argument('--verbose', action='store_true', help='解析ログを表示')
+    args = arg_parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+
+    names = load_names(args.names, args.names_file)
+    if not names:
+        arg_parser.error('--names または --names-file で対象者を指定してください')
+    pdf_paths = find_pdfs(args.directory, args.recursive)
+    if not pdf_paths:
+        logger.warning(f"PDFファイルが見つかりません: {args.directory}")
+        return 1
+
+    out = None
+    ics_writer = None
+    if args.format == 'jsonl':
+        out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    else:
+        ics_writer = IcsWriter(args.output_dir, args.event_title, args.event_location)
+
+    failures = 0
+    try:
+        with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+            futures = [executor.submit(process_file, path, names, args.year, args.month) for path in pdf_paths]
+            # 解析が終わったファイルから順に出力する
+            for future in as_completed(futures):
+                result = future.result()
+                if result['error']:
+                    failures += 1
+                    logger.warning(f"{result['file']}: {result['error']}")
+                    continue
+
+                year, month = int(result['year']), int(result['month'])
+                for name, shifts in result['shifts'].items():
+                    for shift in shifts:
+                        try:
+                            start, end = shift_to_datetimes(shift, year, month)
+                        except ValueError as e:
+                            logger.warning(f"{result['file']}: {name} の {shift['date']}日 を日付に変換できません: {e}")
+                            continue
+                        if ics_writer:
+                            ics_writer.write(name, shift, start, end)
+                        else:
+                            out.write(json.dumps({
+                                'file': os.path.basename(result['file']),
+                                'name': name,
+                                'year': year,
+                                'month': month,
+                                'date': shift['date'],
+                                'time': shift['time'],
+                                'start': start.isoformat() + '+09:00',
+                                'end': end.isoformat() + '+09:00',
+                            }, ensure_ascii=False) + '\n')
+                if out:
+                    out.flush()
+    finally:
+        if ics_writer:
+            ics_writer.close()
+        if out and out is not sys.stdout:
+            out.close()
+
+    logger.info(f"{len(pdf_paths)}件中{len(pdf_paths) - failures}件のPDFを処理しました")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
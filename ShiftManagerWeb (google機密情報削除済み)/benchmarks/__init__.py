@@ -0,0 +1 @@
+"""PdfParser のベンチマーク"""
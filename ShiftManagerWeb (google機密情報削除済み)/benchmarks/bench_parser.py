@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Parser Benchmark - PdfParser のスループットとピークメモリを計測するベンチマーク
+
+合成シフト表（roster_generator）を使って `parse_pdf`、`parse_table_format`、
+`parse_text_format` を計測し、保存済みのベースラインと比較します。
+ベースラインより許容範囲を超えて遅く（または大きく）なった場合は終了コード1で終了します。
+
+使い方（ShiftManagerWeb ディレクトリで実行）:
+    python -m benchmarks.bench_parser                    # 計測してベースラインと比較
+    python -m benchmarks.bench_parser --update-baseline  # ベースラインを更新
+    python -m benchmarks.bench_parser --quick            # 小さいシナリオのみ
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+import pdfplumber
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_parser import PdfParser
+from benchmarks.roster_generator import generate_roster
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# (シナリオ名, generate_roster の引数)
+SCENARIOS = [
+    ('table_1p_12staff', dict(layout='table', pages=1, rows_per_page=31, staff_count=12)),
+    ('table_5p_40staff', dict(layout='table', pages=5, rows_per_page=31, staff_count=40, staff_per_row=4)),
+    ('table_20p_full_names', dict(layout='table', pages=20, rows_per_page=31, staff_count=60, full_names=True)),
+    ('table_5p_kanji_hours', dict(layout='table', pages=5, rows_per_page=31, staff_count=20,
+                                  time_formats=['kanji_hour', 'kanji_hour_fullwidth'])),
+    ('text_1p_12staff', dict(layout='text', pages=1, rows_per_page=40, staff_count=12)),
+    ('text_5p_40staff', dict(layout='text', pages=5, rows_per_page=45, staff_count=40, staff_per_row=3)),
+    ('text_20p_fullwidth', dict(layout='text', pages=20, rows_per_page=45, staff_count=60, full_names=True,
+                                time_formats=['colon_wave', 'colon_fullwidth_hyphen', 'kanji_hour_fullwidth'])),
+]
+QUICK_SCENARIOS = {'table_1p_12staff', 'text_1p_12staff'}
+
+# 比較対象の指標と、値が大きいほど悪いかどうか
+COMPARED_METRICS = {
+    'parse_pdf_ms': True,
+    'parse_pdf_peak_mb': True,
+    'parse_format_us_per_page': True,
+}
+
+
+def _best_time(func: Callable[[], object], repeat: int) -> float:
+    """関数の実行時間（秒）の最小値を計測（他プロセスの影響によるばらつきを抑えるため）"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def _peak_memory_mb(func: Callable[[], object]) -> float:
+    """関数実行中のPythonヒープのピーク使用量（MB）を計測"""
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def _extract_pages(pdf_bytes: bytes) -> Tuple[List[list], List[str]]:
+    """フォーマット別パーサーの入力となるテーブルとテキストを事前に抽出"""
+    tables, texts = [], []
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        for page in pdf.pages:
+            table = page.extract_table()
+            if table:
+                tables.append(table)
+            else:
+                texts.append(page.extract_text() or '')
+    return tables, texts
+
+
+def run_scenario(name: str, options: Dict, repeat: int, target_name: str = '瓜田') -> Dict[str, float]:
+    """
+    1つのシナリオを計測
+
+    Args:
+        name: シナリオ名
+        options: generate_roster に渡す引数
+        repeat: 計測の繰り返し回数
+        target_name: 検索対象の名前
+
+    Returns:
+        指標名と値の辞書
+    """
+    pdf_bytes, rows = generate_roster(**options)
+    parser = PdfParser(target_name)
+
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+        f.write(pdf_bytes)
+        pdf_path = f.name
+
+    try:
+        shifts = parser.parse_pdf(pdf_path)
+        skipped_tables = parser.skipped_work['table_detection']
+        parse_seconds = _best_time(lambda: parser.parse_pdf(pdf_path), repeat)
+        peak_mb = _peak_memory_mb(lambda: parser.parse_pdf(pdf_path))
+    finally:
+        os.remove(pdf_path)
+
+    tables, texts = _extract_pages(pdf_bytes)
+    if options.get('layout') == 'table':
+        format_func = lambda: [parser.parse_table_format(table) for table in tables]
+        format_pages = len(tables)
+    else:
+        format_func = lambda: [parser.parse_text_format(text) for text in texts]
+        format_pages = len(texts)
+    format_seconds = _best_time(format_func, repeat * 20)
+
+    pages = options.get('pages', 1)
+    return {
+        'pages': pages,
+        'rows': len(rows),
+        'shifts': len(shifts),
+        'parse_pdf_ms': parse_seconds * 1000,
+        'parse_pdf_pages_per_s': pages / parse_seconds if parse_seconds else 0.0,
+        'parse_pdf_peak_mb': peak_mb,
+        'parse_format_us_per_page': format_seconds / max(format_pages, 1) * 1e6,
+        'skipped_table_detections': skipped_tables,
+    }
+
+
+def compare_with_baseline(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                          tolerance: float) -> List[str]:
+    """
+    計測結果をベースラインと比較
+
+    Args:
+        results: シナリオごとの計測結果
+        baseline: シナリオごとのベースライン
+        tolerance: 許容する悪化率（0.25 なら 25%）
+
+    Returns:
+        許容範囲を超えた項目の説明リスト
+    """
+    regressions = []
+    for name, metrics in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if metrics['shifts'] != base.get('shifts', metrics['shifts']):
+            regressions.append(f"{name}: 抽出シフト数が変化 {base['shifts']} -> {metrics['shifts']}")
+        for key, higher_is_worse in COMPARED_METRICS.items():
+            if key not in base or not base[key]:
+                continue
+            ratio = metrics[key] / base[key]
+            if higher_is_worse and ratio > 1 + tolerance:
+                regressions.append(f"{name}: {key} {base[key]:.2f} -> {metrics[key]:.2f} (+{(ratio - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description='PdfParser ベンチマーク')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='計測の繰り返し回数')
+    arg_parser.add_argument('--quick', action='store_true', help='小さいシナリオのみ実行')
+    arg_parser.add_argument('--tolerance', type=float, default=0.5, help='許容する悪化率（デフォルト: 0.5）')
+    arg_parser.add_argument('--baseline', default=BASELINE_PATH, help='ベースラインJSONのパス')
+    arg_parser.add_argument('--update-baseline', action='store_true', help='計測結果でベースラインを上書き')
+    args = arg_parser.parse_args(argv)
+
+    results = {}
+    for name, options in SCENARIOS:
+        if args.quick and name not in QUICK_SCENARIOS:
+            continue
+        metrics = run_scenario(name, options, args.repeat)
+        results[name] = metrics
+        print(f"{name:<24} parse_pdf={metrics['parse_pdf_ms']:8.1f}ms "
+              f"({metrics['parse_pdf_pages_per_s']:6.1f} pages/s) "
+              f"peak={metrics['parse_pdf_peak_mb']:6.2f}MB "
+              f"format={metrics['parse_format_us_per_page']:8.1f}us/page "
+              f"shifts={metrics['shifts']} skipped_tables={metrics['skipped_table_detections']}")
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"ベースラインを更新しました: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"ベースラインがありません。--update-baseline で作成してください: {args.baseline}")
+        return 1
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print("\n性能の劣化を検出しました:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+
+    print("\nベースラインとの比較: 問題ありません")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Roster Generator - ベンチマーク用の合成シフト表PDFを生成するモジュール
+
+`uploads/` のサンプルと同じ「日付 / 曜日 / 勤務時間 / 担当者...」構成のシフト表を、
+罫線付きのテーブル形式と罫線なしのテキスト形式で生成します。
+追加の依存パッケージを使わないよう、PDFは直接書き出します。
+日本語は埋め込みなしのCIDフォント（HeiseiKakuGo-W5 / UniJIS-UCS2-H）で記述するため、
+pdfplumber からは実際のシフト表と同様にテキストとして抽出できます。
+"""
+
+import random
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# ページサイズ（A4, pt）
+PAGE_WIDTH = 595.2
+PAGE_HEIGHT = 841.68
+
+WEEKDAYS = ['月', '火', '水', '木', '金', '土', '日']
+
+SURNAMES = [
+    '瓜田', '吉田', '和野', '千葉', '楢館', '高橋', '渡部', '海沼', '市川', '小山',
+    '菊池', '田中', '木村', '佐藤', '島守', '白取', '柏崎', '鈴木', '伊藤', '山本',
+    '中村', '小林', '加藤', '山田', '佐々木', '山口', '松本', '井上', '斎藤', '清水',
+]
+GIVEN_NAMES = ['建', '小雪', '賢祐', '明日香', '恵', '春姫', '皓', '亘希', '那奈香', '壮一郎']
+
+# 時間表記のバリエーション（開始時, 終了時 を受け取って文字列を返す）
+TIME_FORMATS = {
+    'colon_hyphen': lambda s, e: f'{s}:00-{e}:00',
+    'colon_wave': lambda s, e: f'{s}:00～{e}:00',
+    'colon_fullwidth_hyphen': lambda s, e: f'{s}:00－{e}:00',
+    'colon_tilde': lambda s, e: f'{s}:00〜{e}:00',
+    'dot_hyphen': lambda s, e: f'{s}.00-{e}.00',
+    'kanji_hour': lambda s, e: f'{s}時-{e}時',
+    'kanji_hour_fullwidth': lambda s, e: f'{s}時～{e}時',
+}
+
+SHIFT_HOURS = [(10, 17), (17, 20), (10, 18), (9, 13), (13, 18)]
+
+
+def make_staff(count: int, rng: random.Random, full_names: bool = False) -> List[str]:
+    """
+    担当者名のリストを生成
+
+    Args:
+        count: 担当者数
+        rng: 乱数生成器
+        full_names: True の場合は「姓　名」形式（全角スペース区切り）にする
+
+    Returns:
+        担当者名のリスト（先頭は常に '瓜田' を含む名前）
+    """
+    names = []
+    for i in range(count):
+        surname = SURNAMES[i % len(SURNAMES)]
+        if i >= len(SURNAMES):
+            surname += SURNAMES[(i // len(SURNAMES)) % len(SURNAMES)]
+        if full_names:
+            names.append(f'{surname}　{rng.choice(GIVEN_NAMES)}')
+        else:
+            names.append(surname)
+    return names
+
+
+def generate_rows(rows: int, staff: Sequence[str], staff_per_row: int,
+                  time_formats: Sequence[str], rng: random.Random) -> List[List[str]]:
+    """
+    シフト表の行データを生成
+
+    Args:
+        rows: 行数（ページをまたいだ合計）
+        staff: 担当者名のリスト
+        staff_per_row: 1行あたりの担当者数
+        time_formats: 使用する時間表記（TIME_FORMATS のキー）
+        rng: 乱数生成器
+
+    Returns:
+        [日付, 曜日, 勤務時間, 担当者...] のリスト
+    """
+    table_rows = []
+    for i in range(rows):
+        day = i % 31 + 1
+        weekday = WEEKDAYS[i % 7]
+        if rng.random() < 0.15:
+            table_rows.append([f'{day}日', weekday, '閉館'] + [''] * staff_per_row)
+            continue
+        start, end = rng.choice(SHIFT_HOURS)
+        time_str = TIME_FORMATS[rng.choice(list(time_formats))](start, end)
+        assigned = rng.sample(list(staff), min(staff_per_row, len(staff)))
+        assigned += [''] * (staff_per_row - len(assigned))
+        table_rows.append([f'{day}日', weekday, time_str] + assigned)
+    return table_rows
+
+
+def _hex_text(text: str) -> str:
+    """文字列をUCS-2のPDF16進文字列に変換"""
+    return '<' + text.encode('utf-16-be').hex().upper() + '>'
+
+
+def _text_op(x: float, y: float, text: str, size: float = 10) -> str:
+    return f'BT /F1 {size} Tf {x:.2f} {y:.2f} Td {_hex_text(text)} Tj ET'
+
+
+def _table_page_stream(title: str, header: List[str], rows: List[List[str]]) -> str:
+    """罫線付きテーブル形式のページ内容を生成"""
+    ops = [_text_op(60, PAGE_HEIGHT - 50, title, 12)]
+    col_widths = [50, 40, 100] + [90] * (len(header) - 3)
+    row_height = 18
+    left = 50
+    top = PAGE_HEIGHT - 70
+    all_rows = [header] + rows
+
+    ops.append('0.5 w')
+    bottom = top - row_height * len(all_rows)
+    right = left + sum(col_widths)
+    # 横罫線
+    for i in range(len(all_rows) + 1):
+        y = top - row_height * i
+        ops.append(f'{left:.2f} {y:.2f} m {right:.2f} {y:.2f} l S')
+    # 縦罫線
+    x = left
+    for width in col_widths + [0]:
+        ops.append(f'{x:.2f} {top:.2f} m {x:.2f} {bottom:.2f} l S')
+        x += width
+
+    for r, row in enumerate(all_rows):
+        y = top - row_height * (r + 1) + 5
+        x = left
+        for c, cell in enumerate(row):
+            if cell:
+                ops.append(_text_op(x + 3, y, cell))
+            x += col_widths[c]
+    return '\n'.join(ops)
+
+
+def _text_page_stream(title: str, rows: List[List[str]]) -> str:
+    """罫線なしのテキスト形式のページ内容を生成（「名前 日付 時間」の並び）"""
+    ops = [_text_op(60, PAGE_HEIGHT - 50, title, 12)]
+    y = PAGE_HEIGHT - 80
+    for row in rows:
+        day, weekday, time_str = row[0], row[1], row[2]
+        names = [name for name in row[3:] if name]
+        if names:
+            line = f'{names[0]}　{day}（{weekday}） {time_str} ' + ' '.join(names[1:])
+        else:
+            line = f'{day}（{weekday}） {time_str}'
+        ops.append(_text_op(50, y, line))
+        y -= 16
+    return '\n'.join(ops)
+
+
+def build_pdf(page_streams: List[str]) -> bytes:
+    """
+    ページ内容のリストからPDFバイト列を組み立て
+
+    Args:
+        page_streams: 各ページのコンテンツストリーム
+
+    Returns:
+        PDFファイルのバイト列
+    """
+    objects: Dict[int, bytes] = {}
+    objects[3] = (b'<< /Type /Font /Subtype /Type0 /BaseFont /HeiseiKakuGo-W5 '
+                  b'/Encoding /UniJIS-UCS2-H /DescendantFonts [4 0 R] >>')
+    objects[4] = (b'<< /Type /Font /Subtype /CIDFontType0 /BaseFont /HeiseiKakuGo-W5 '
+                  b'/CIDSystemInfo << /Registry (Adobe) /Ordering (Japan1) /Supplement 2 >> '
+                  b'/FontDescriptor 5 0 R /DW 1000 /W [1 95 500] >>')
+    objects[5] = (b'<< /Type /FontDescriptor /FontName /HeiseiKakuGo-W5 /Flags 4 '
+                  b'/FontBBox [-92 -250 1010 922] /ItalicAngle 0 /Ascent 880 /Descent -120 '
+                  b'/CapHeight 700 /StemV 80 >>')
+
+    kids = []
+    next_id = 6
+    for stream in page_streams:
+        data = stream.encode('latin-1')
+        content_id, page_id = next_id, next_id + 1
+        next_id += 2
+        objects[content_id] = (f'<< /Length {len(data)} >>\nstream\n'.encode('latin-1')
+                               + data + b'\nendstream')
+        objects[page_id] = (f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+                            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>'
+                            ).encode('latin-1')
+        kids.append(f'{page_id} 0 R')
+
+    objects[1] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    objects[2] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>'.encode('latin-1')
+
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = len(out)
+        out += f'{obj_id} 0 obj\n'.encode('latin-1') + objects[obj_id] + b'\nendobj\n'
+    xref_offset = len(out)
+    size = max(objects) + 1
+    out += f'xref\n0 {size}\n0000000000 65535 f \n'.encode('latin-1')
+    for obj_id in range(1, size):
+        out += f'{offsets.get(obj_id, 0):010d} 00000 n \n'.encode('latin-1')
+    out += f'trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n'.encode('latin-1')
+    return bytes(out)
+
+
+def generate_roster(layout: str = 'table', pages: int = 1, rows_per_page: int = 31,
+                    staff_count: int = 12, staff_per_row: int = 2,
+                    time_formats: Optional[Sequence[str]] = None, full_names: bool = False,
+                    month: int = 5, seed: int = 0) -> Tuple[bytes, List[List[str]]]:
+    """
+    合成シフト表PDFを生成
+
+    Args:
+        layout: 'table'（罫線付き）または 'text'（罫線なし）
+        pages: ページ数
+        rows_per_page: 1ページあたりの行数
+        staff_count: 担当者の人数
+        staff_per_row: 1行あたりの担当者数
+        time_formats: 使用する時間表記（省略時はすべて）
+        full_names: 担当者名を「姓　名」形式にする
+        month: タイトルに表示する月
+        seed: 乱数シード
+
+    Returns:
+        (PDFバイト列, 生成した行データ) のタプル
+    """
+    if layout not in ('table', 'text'):
+        raise ValueError(f"未対応のレイアウトです: {layout}")
+
+    rng = random.Random(seed)
+    staff = make_staff(staff_count, rng, full_names)
+    rows = generate_rows(pages * rows_per_page, staff, staff_per_row,
+                         time_formats or list(TIME_FORMATS), rng)
+    title = f'{month}月 図書館夜間及び休日開館スタッフローテーション表'
+    header = ['日付', '曜日', '勤務時間'] + ['担当者'] * staff_per_row
+
+    streams = []
+    for p in range(pages):
+        page_rows = rows[p * rows_per_page:(p + 1) * rows_per_page]
+        if layout == 'table':
+            streams.append(_table_page_stream(title, header, page_rows))
+        else:
+            streams.append(_text_page_stream(title, page_rows))
+    return build_pdf(streams), rows
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Cell Index Module - シフト表のセルを正規化して名前で検索するためのインデックス
+
+抽出したテーブルの各セルを正規化（全角・半角の統一と空白の除去）したテキストと
+(ページ, 行, 列) の対応、および2文字単位（バイグラム）の転置インデックスとして保持します。
+対象者の名前を変更した場合も、PDFを再解析せずにインデックスから該当セルを検索できます。
+"""
+
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Tuple
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+class _LineNormalizationTable(dict):
+    """文字ごとの NFKC 正規化結果（改行以外の空白は除去）を必要になった時点で登録する表"""
+
+    def __missing__(self, codepoint: int) -> Optional[str]:
+        normalized = ''.join(c for c in unicodedata.normalize('NFKC', chr(codepoint)) if c == '\n' or not c.isspace())
+        self[codepoint] = normalized or None
+        return self[codepoint]
+
+
+_LINE_TABLE = _LineNormalizationTable()
+_line_changes: Optional[Pattern[str]] = None
+
+
+def _line_changes_pattern() -> Pattern[str]:
+    """
+    正規化で変化する文字（改行以外の空白と、NFKC で別の文字になる文字）に一致するパターンを返す
+
+    基本多言語面の文字を NFKC で変化しない範囲にまとめ、その否定の文字クラスとして初回の呼び出し時に作成します。
+    基本多言語面の外の文字は常に一致します。
+    """
+    global _line_changes
+    if _line_changes is None:
+        ranges = []
+        start = None
+        for codepoint in range(0x10000):
+            char = chr(codepoint)
+            stable = char == '\n' or (not char.isspace() and unicodedata.normalize('NFKC', char) == char)
+            if stable and start is None:
+                start = codepoint
+            elif not stable and start is not None:
+                ranges.append((start, codepoint - 1))
+                start = None
+        if start is not None:
+            ranges.append((start, 0xFFFF))
+        stable_class = ''.join(re.escape(chr(first)) if first == last else f'{re.escape(chr(first))}-{re.escape(chr(last))}'
+                               for first, last in ranges)
+        _line_changes = re.compile(f'[^{stable_class}]')
+    return _line_changes
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """
+    照合用にテキストを正規化
+
+    NFKC正規化で全角英数字・記号・全角スペースを半角に統一し、空白（改行を含む）を除去します。
+
+    Args:
+        text: 正規化するテキスト
+
+    Returns:
+        正規化したテキスト
+    """
+    if not text:
+        return ''
+    return _WHITESPACE.sub('', unicodedata.normalize('NFKC', str(text)))
+
+
+def normalize_lines(text: Optional[str]) -> str:
+    """
+    改行を残したまま、照合用にテキストを正規化
+
+    各行に normalize_text() を適用したものと同じ結果を返します。
+    ページ全体の NFKC 正規化や文字ごとの置き換え（str.translate）は遅いため、正規化で変化する文字の種類ごとに
+    str.replace で正規化結果に置き換えてから NFC で合成します
+    （文字ごとの NFKC の連結に NFC を適用した結果は、全体の NFKC と一致します）。
+    シフト表のテキストで変化する文字は空白や全角の括弧など数種類のため、置き換えは数回で済みます。
+
+    Args:
+        text: 正規化するテキスト
+
+    Returns:
+        正規化したテキスト
+    """
+    if not text:
+        return ''
+    text = str(text)
+    changes = _line_changes_pattern()
+    match = changes.search(text)
+    while match:
+        char = match.group()
+        replacement = _LINE_TABLE[ord(char)] or ''
+        text = text.replace(char, replacement)
+        match = changes.search(text, match.start() + len(replacement))
+    return unicodedata.normalize('NFC', text)
+
+
+def _bigrams(text: str) -> List[str]:
+    return [text[i:i + 2] for i in range(len(text) - 1)]
+
+
+class CellIndex:
+    """テーブルのセルを正規化テキストとバイグラムで検索するインデックス"""
+
+    def __init__(self):
+        """初期化"""
+        # (ページ, 行, 列, 正規化テキスト)
+        self.cells: List[Tuple[int, int, int, str]] = []
+        # バイグラム -> self.cells の位置のリスト
+        self.bigrams: Dict[str, List[int]] = {}
+        # ページ番号 -> テーブル（日付・時間の取得に使用）
+        self.tables: Dict[int, List[List[Any]]] = {}
+        # ページ番号 -> テキスト（テーブルが検出されなかったページ）
+        self.texts: Dict[int, str] = {}
+
+    @classmethod
+    def from_pages(cls, pages: Iterable[Tuple[str, Any]]) -> 'CellIndex':
+        """
+        extract_pages の結果からインデックスを作成
+
+        Args:
+            pages: ページごとの ('table', テーブル) / ('text', テキスト) / ('empty', None)
+
+        Returns:
+            作成したインデックス
+        """
+        index = cls()
+        for page_num, entry in enumerate(pages):
+            index.add_page(page_num, entry)
+        return index
+
+    def add_page(self, page_num: int, entry: Tuple[str, Any]) -> None:
+        """
+        1ページ分の抽出結果を追加
+
+        Args:
+            page_num: ページ番号（0始まり）
+            entry: ('table', テーブル) / ('text', テキスト) / ('empty', None)
+        """
+        kind, content = entry
+        if kind == 'text':
+            self.texts[page_num] = content
+            return
+        if kind != 'table':
+            return
+
+        self.tables[page_num] = content
+        for row_index, row in enumerate(content):
+            for col_index, cell in enumerate(row):
+                normalized = normalize_text(cell)
+                if not normalized:
+                    continue
+                position = len(self.cells)
+                self.cells.append((page_num, row_index, col_index, normalized))
+                for bigram in set(_bigrams(normalized)):
+                    self.bigrams.setdefault(bigram, []).append(position)
+
+    def lookup(self, name: str) -> List[Tuple[int, int, int]]:
+        """
+        名前に一致するセルを検索
+
+        PdfParser.name_matches と同じ基準（名前を含む、または名前の連続する2文字のいずれかを含む）で、
+        正規化したテキスト同士を比較します。
+
+        Args:
+            name: 検索する名前
+
+        Returns:
+            一致したセルの (ページ, 行, 列) のリスト（ページ・行・列の順）
+        """
+        normalized = normalize_text(name)
+        if not normalized:
+            return []
+        if len(normalized) == 1:
+            positions = [i for i, cell in enumerate(self.cells) if normalized in cell[3]]
+        else:
+            matched = set()
+            for bigram in _bigrams(normalized):
+                matched.update(self.bigrams.get(bigram, ()))
+            positions = sorted(matched)
+        return [self.cells[i][:3] for i in positions]
+
+    def matching_rows(self, name: str) -> List[Tuple[int, int]]:
+        """
+        名前に一致するセルを含む行を検索
+
+        Args:
+            name: 検索する名前
+
+        Returns:
+            (ページ, 行) のリスト（重複なし、ページ・行の順）
+        """
+        return list(dict.fromkeys((page, row) for page, row, _ in self.lookup(name)))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSONに保存できる辞書に変換"""
+        return {
+            'cells': self.cells,
+            'bigrams': self.bigrams,
+            'tables': {str(page): table for page, table in self.tables.items()},
+            'texts': {str(page): text for page, text in self.texts.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'CellIndex':
+        """to_dict で変換した辞書からインデックスを復元"""
+        index = cls()
+        index.cells = [tuple(cell) for cell in data['cells']]
+        index.bigrams = data['bigrams']
+        index.tables = {int(page): table for page, table in data['tables'].items()}
+        index.texts = {int(page): text for page, text in data['texts'].items()}
+        return index
@@ -4,25 +4,89 @@ Configuration Module - アプリケーション設定
 """
 import os
 import secrets
+import logging
 from datetime import timedelta
 
+logger = logging.getLogger(__name__)
+
+def load_secret(env_name, filename, nbytes=32):
+    """
+    署名用の秘密鍵を取得
+    
+    環境変数が設定されていればその値を使います。設定されていない場合は
+    SECRET_KEY_DIR（デフォルト: instance/）のファイルに保存した鍵を使い、なければ作成します。
+    プロセスごとに異なる鍵になると、複数ワーカー構成や再起動でセッションが無効になるためです。
+    """
+    value = os.getenv(env_name)
+    if value:
+        return value
+    
+    key_dir = os.getenv('SECRET_KEY_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance'))
+    path = os.path.join(key_dir, filename)
+    try:
+        os.makedirs(key_dir, exist_ok=True)
+        try:
+            # 同時に起動した他のプロセスと競合しないよう、存在しない場合のみ作成する
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            with open(path, encoding='utf-8') as f:
+                value = f.read().strip()
+            if value:
+                return value
+            # 他のプロセスが書き込み中の場合はプロセス固有の鍵を使う
+            logger.warning(f"{path} が空のため一時的な秘密鍵を使用します")
+            return secrets.token_hex(nbytes)
+        value = secrets.token_hex(nbytes)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(value)
+        logger.warning(f"{env_name} が未設定のため秘密鍵を作成しました: {path}")
+        return value
+    except OSError as e:
+        logger.warning(f"秘密鍵を保存できないためプロセス固有の鍵を使用します（{env_name} を設定してください）: {e}")
+        return secrets.token_hex(nbytes)
+
 class Config:
     """アプリケーション設定クラス"""
     
     # Flask設定
-    SECRET_KEY = os.getenv('FLASK_SECRET_KEY', secrets.token_hex(32))
+    SECRET_KEY = load_secret('FLASK_SECRET_KEY', 'secret_key')
     SESSION_TYPE = 'filesystem'
     SESSION_PERMANENT = False
     SESSION_USE_SIGNER = True
-    SESSION_FILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'flask_session')
+    SESSION_FILE_DIR = os.getenv('SESSION_FILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'flask_session'))
     
     # アップロード設定
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 最大16MB
-    UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 最大16MB（複数ファイルの合計）
+    MAX_UPLOAD_FILES = int(os.getenv('MAX_UPLOAD_FILES', '6'))  # 1回のアップロードで受け付けるPDF数
+    UPLOAD_PARSE_WORKERS = int(os.getenv('UPLOAD_PARSE_WORKERS', '0'))  # 複数PDFの並列解析プロセス数（0: CPU数）
+    UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads'))
+    PARSE_RSS_BUDGET_MB = float(os.getenv('PARSE_RSS_BUDGET_MB', '0'))  # PDF解析中のRSS上限（MB、0: 制限なし）
+    
+    # 再アップロード時の差分解析設定（ページ単位の抽出結果キャッシュ）
+    ROSTER_CACHE_DIR = os.getenv('ROSTER_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'roster_cache'))
+    ROSTER_CACHE_TTL = int(os.getenv('ROSTER_CACHE_TTL', str(45 * 24 * 3600)))  # キャッシュの有効期間（秒）
+    ROSTER_HISTORY_SIZE = int(os.getenv('ROSTER_HISTORY_SIZE', '12'))  # セッションに保持する月数
+    
+    # 受付制御（PDF解析とカレンダー登録の同時実行数の制限。値はワーカープロセスごと）
+    ADMISSION_PARSE_CONCURRENCY = int(os.getenv('ADMISSION_PARSE_CONCURRENCY', '0'))  # 同時に解析できるアップロード数（0: CPU数）
+    ADMISSION_REGISTER_CONCURRENCY = int(os.getenv('ADMISSION_REGISTER_CONCURRENCY', '4'))  # 同時に実行できるカレンダー登録数
+    ADMISSION_QUEUE_SIZE = int(os.getenv('ADMISSION_QUEUE_SIZE', '4'))  # 空きを待てるリクエスト数
+    ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', '10'))  # 空きを待つ最大秒数
+    ADMISSION_PER_SESSION = int(os.getenv('ADMISSION_PER_SESSION', '1'))  # 1セッションあたりの同時実行数（0: 制限なし）
+    ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', '5'))  # 503 応答の Retry-After の最小秒数
     
     # ログ設定
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     
+    # 計測設定
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() == 'true'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # 設定時は Authorization: Bearer <トークン> を要求（未設定時はローカルからのみ許可）
+    SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'false').lower() == 'true'
+    
+    # 負荷試験設定（ローカルの擬似Calendar APIとOAuthスタブを使用）
+    LOADTEST_MODE = os.getenv('LOADTEST_MODE', 'false').lower() == 'true'
+    CALENDAR_API_ENDPOINT = os.getenv('CALENDAR_API_ENDPOINT')
+    
     # デフォルト設定
     DEFAULT_SETTINGS = {
         'target_name': '瓜田',
@@ -42,7 +106,7 @@ class Config:
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
     WTF_CSRF_ENABLED = True
-    WTF_CSRF_SECRET_KEY = os.getenv('CSRF_SECRET_KEY', secrets.token_hex(16))
+    WTF_CSRF_SECRET_KEY = load_secret('CSRF_SECRET_KEY', 'csrf_secret_key', 16)
     
     # 初期化時にディレクトリを作成
     @classmethod
@@ -69,4 +133,5 @@ class ProductionConfig(Config):
     # Vercel環境用の設定
     if os.getenv('VERCEL_ENV') == 'production':
         SESSION_FILE_DIR = '/tmp/flask_session'
-        UPLOAD_FOLDER = '/tmp/uploads' 
\ No newline at end of file
+        UPLOAD_FOLDER = '/tmp/uploads'
+        ROSTER_CACHE_DIR = '/tmp/roster_cache' 
\ No newline at end of file
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+gunicorn 設定 - 本番環境用の複数ワーカー構成
+
+使い方（ShiftManagerWeb ディレクトリで実行）:
+    gunicorn -c gunicorn.conf.py app:app
+
+アプリはマスタープロセスで一度だけ読み込み（preload_app）、共有状態（warmup.py）を準備してから
+ワーカーを fork します。ワーカー数・スレッド数はCPUコア数から自動で決まり、環境変数で上書きできます。
+
+- GUNICORN_WORKERS: ワーカープロセス数（デフォルト: CPUコア数、最大 GUNICORN_MAX_WORKERS）
+- GUNICORN_THREADS: ワーカーあたりのスレッド数（デフォルト: CPUコア数の4倍をワーカー数で割った値、
+  最小2・最大 GUNICORN_MAX_THREADS。Calendar APIの待ち時間を重ねるため）
+- GUNICORN_BIND: 待ち受けアドレス（デフォルト: 0.0.0.0:$PORT または 0.0.0.0:8000）
+- GUNICORN_TIMEOUT: リクエストのタイムアウト秒数（デフォルト: 60）
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+_cpu_count = os.cpu_count() or 1
+
+# サーバー設定
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', '8000')}")
+workers = int(os.getenv('GUNICORN_WORKERS', min(_cpu_count, int(os.getenv('GUNICORN_MAX_WORKERS', '8')))))
+# 全ワーカーの合計がCPUコア数の4倍程度になるよう、ワーカー数が少ないほど1ワーカーのスレッドを増やす
+threads = int(os.getenv('GUNICORN_THREADS',
+                        max(2, min(_cpu_count * 4 // workers, int(os.getenv('GUNICORN_MAX_THREADS', '16'))))))
+worker_class = 'gthread'
+preload_app = True
+
+# タイムアウトと再起動（16MBのPDF解析を考慮）
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+# メモリの断片化を抑えるため、一定数のリクエストごとにワーカーを入れ替える（同時に入れ替わらないよう揺らす）
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = max_requests // 10
+
+# ログ
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
+pidfile = os.getenv('GUNICORN_PIDFILE')
+
+# ワーカーごとにPDF解析用のプロセスプールを作るとコア数を超えて並列になるため、
+# 複数ワーカー構成では各ワーカー内で解析する（app.py の読み込み前に設定する必要がある）
+if workers > 1:
+    os.environ.setdefault('UPLOAD_PARSE_WORKERS', '1')
+# 受付制御はワーカーごとに適用されるため、全体の同時解析数がCPUコア数程度になるよう配分する
+os.environ.setdefault('ADMISSION_PARSE_CONCURRENCY', str(max(1, _cpu_count // workers)))
+
+
+def when_ready(server):
+    """ワーカーを起動する前に、マスタープロセスで共有状態を準備"""
+    from app import app
+    from warmup import warm_shared_state
+
+    warm_shared_state(app)
+    server.log.info(f"workers={workers} threads={threads} で起動します（CPUコア数: {_cpu_count}）")
+
@@ -0,0 +1 @@
+"""ローカルの擬似Calendar APIを使った負荷試験"""
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Fake Calendar API - 負荷試験用のローカル擬似Google Calendar APIサーバー
+
+アプリが使用する `events.list` / `events.insert` / `calendarList.list` だけを実装し、
+応答遅延とエラー注入を設定できます。アプリ側は環境変数 `CALENDAR_API_ENDPOINT` に
+`http://127.0.0.1:<port>/calendar/v3/` を指定するとこのサーバーに接続します。
+
+単体で起動する場合:
+    python -m loadtest.fake_calendar --port 8089 --latency-ms 80 --error-rate 0.01
+"""
+
+import re
+import json
+import time
+import random
+import argparse
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+EVENTS_PATH = re.compile(r'/calendars/(?P<calendar_id>[^/]+)/events/?$')
+CALENDAR_LIST_PATH = re.compile(r'/users/me/calendarList/?$')
+
+
+class FakeCalendarState:
+    """擬似サーバーの設定と登録済みイベントを保持"""
+
+    def __init__(self, latency_ms: float = 50.0, jitter_ms: float = 20.0,
+                 error_rate: float = 0.0, error_status: int = 503, seed: Optional[int] = None):
+        """
+        初期化
+
+        Args:
+            latency_ms: 平均応答遅延（ミリ秒）
+            jitter_ms: 応答遅延のばらつき（ミリ秒、一様分布の幅）
+            error_rate: エラーを返す確率（0〜1）
+            error_status: エラー時のHTTPステータス
+            seed: 乱数シード
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.events: Dict[str, List[dict]] = {}
+        self.request_counts: Dict[str, int] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        """今回の応答遅延（秒）を決定"""
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms / 2, self.jitter_ms / 2)
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def should_fail(self) -> bool:
+        """今回のリクエストでエラーを返すか決定"""
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+    def count(self, operation: str) -> None:
+        with self._lock:
+            self.request_counts[operation] = self.request_counts.get(operation, 0) + 1
+
+    def add_event(self, calendar_id: str, body: dict) -> dict:
+        event = dict(body)
+        event['id'] = uuid.uuid4().hex
+        event['htmlLink'] = f'https://calendar.google.com/calendar/event?eid={event["id"]}'
+        event['status'] = 'confirmed'
+        with self._lock:
+            self.events.setdefault(calendar_id, []).append(event)
+        return event
+
+    def list_events(self, calendar_id: str, max_results: int) -> List[dict]:
+        with self._lock:
+            return list(self.events.get(calendar_id, [])[-max_results:])
+
+
+class FakeCalendarHandler(BaseHTTPRequestHandler):
+    """Calendar API v3 の一部を模したリクエストハンドラ"""
+
+    protocol_version = 'HTTP/1.1'
+    state: FakeCalendarState = None
+
+    def log_message(self, format, *args):
+        # 負荷試験中のアクセスログは出力しない
+        pass
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate(self, operation: str) -> bool:
+        """遅延とエラー注入を適用し、エラー応答を返した場合はTrue"""
+        self.state.count(operation)
+        time.sleep(self.state.delay())
+        if self.state.should_fail():
+            self.state.count(f'{operation}_error')
+            self._send_json(self.state.error_status, {
+                'error': {'code': self.state.error_status, 'message': 'injected error'}
+            })
+            return True
+        return False
+
+    def _read_body(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode('utf-8'))
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        events_match = EVENTS_PATH.search(path)
+        if events_match:
+            if self._simulate('events_list'):
+                return
+            query = dict(part.split('=', 1) for part in self.path.partition('?')[2].split('&') if '=' in part)
+            max_results = int(query.get('maxResults', 250))
+            items = self.state.list_events(events_match.group('calendar_id'), max_results)
+            self._send_json(200, {'kind': 'calendar#events', 'items': items})
+            return
+
+        if CALENDAR_LIST_PATH.search(path):
+            if self._simulate('calendar_list'):
+                return
+            self._send_json(200, {'kind': 'calendar#calendarList', 'items': [
+                {'id': 'primary', 'summary': 'loadtest', 'primary': True},
+                {'id': 'shifts@loadtest', 'summary': 'シフト'},
+            ]})
+            return
+
+        self._send_json(404, {'error': {'code': 404, 'message': f'not found: {path}'}})
+
+    def do_POST(self):
+        path = self.path.split('?', 1)[0]
+        events_match = EVENTS_PATH.search(path)
+        if events_match:
+            body = self._read_body()
+            if self._simulate('events_insert'):
+                return
+            self._send_json(200, self.state.add_event(events_match.group('calendar_id'), body))
+            return
+
+        self._send_json(404, {'error': {'code': 404, 'message': f'not found: {path}'}})
+
+
+def start_server(state: FakeCalendarState, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    """
+    擬似サーバーをバックグラウンドスレッドで起動
+
+    Args:
+        state: サーバーの設定と状態
+        host: 待ち受けアドレス
+        port: 待ち受けポート（0の場合は空きポート）
+
+    Returns:
+        起動したサーバー（server.server_address でポートを取得可能）
+    """
+    handler = type('BoundFakeCalendarHandler', (FakeCalendarHandler,), {'state': state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='擬似Google Calendar APIサーバー')
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=8089)
+    arg_parser.add_argument('--latency-ms', type=float, default=50.0, help='平均応答遅延（ミリ秒）')
+    arg_parser.add_argument('--jitter-ms', type=float, default=20.0, help='応答遅延のばらつき（ミリ秒）')
+    arg_parser.add_argument('--error-rate', type=float, default=0.0, help='エラーを返す確率（0〜1）')
+    arg_parser.add_argument('--error-status', type=int, default=503, help='エラー時のHTTPステータス')
+    args = arg_parser.parse_args(argv)
+
+    state = FakeCalendarState(args.latency_ms, args.jitter_ms, args.error_rate, args.error_status)
+    server = start_server(state, args.host, args.port)
+    print(f"擬似Calendar APIを起動しました: http://{args.host}:{server.server_address[1]}/calendar/v3/")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
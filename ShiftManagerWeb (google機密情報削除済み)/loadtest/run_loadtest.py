@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Load Test - アプリ全体の流れを並行実行する負荷試験ハーネス
+
+擬似Calendar APIサーバー（fake_calendar）と gunicorn を起動し、複数の仮想ユーザーが
+「OAuthスタブでログイン → /upload → /confirm → /register → /calendar/events → /settings」
+の流れを繰り返します。ルートごとの p50/p95/p99 レイテンシとスループットを出力します。
+
+使い方（ShiftManagerWeb ディレクトリで実行）:
+    python -m loadtest.run_loadtest --workers 1,2,4 --users 8 --iterations 5
+    python -m loadtest.run_loadtest --latency-ms 150 --error-rate 0.05 --json result.json
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import socket
+import shutil
+import argparse
+import tempfile
+import secrets
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import requests
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from benchmarks.roster_generator import generate_roster
+from loadtest.fake_calendar import FakeCalendarState, start_server
+
+SHIFT_FIELD = re.compile(r'name="(shift_\d+_\d+)"')
+
+
+class LatencyRecorder:
+    """ルートごとのレイテンシとステータスを記録"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[Tuple[float, int]]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, seconds: float, status: int) -> None:
+        with self._lock:
+            self.samples.setdefault(route, []).append((seconds, status))
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """ソート済みリストの百分位数（最近傍順位法）"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _timed_request(http: requests.Session, recorder: LatencyRecorder, method: str, base_url: str,
+                   path: str, **kwargs) -> requests.Response:
+    """リダイレクトを追わずに1リクエストを送信し、処理時間を記録"""
+    start = time.perf_counter()
+    try:
+        response = http.request(method, base_url + path, allow_redirects=False, timeout=60, **kwargs)
+    except requests.RequestException:
+        recorder.record(f'{method} {path}', time.perf_counter() - start, 0)
+        raise
+    recorder.record(f'{method} {path}', time.perf_counter() - start, response.status_code)
+    return response
+
+
+def run_user_flow(base_url: str, user_id: int, iterations: int, pdf_bytes: bytes,
+                  recorder: LatencyRecorder) -> None:
+    """
+    1人の仮想ユーザーとして一連の操作を繰り返す
+
+    Args:
+        base_url: アプリのURL
+        user_id: 仮想ユーザー番号（アップロードするファイル名に使用）
+        iterations: 繰り返し回数
+        pdf_bytes: アップロードするシフト表PDF
+        recorder: 記録先
+    """
+    http = requests.Session()
+    _timed_request(http, recorder, 'GET', base_url, '/_loadtest/login')
+
+    for i in range(iterations):
+        try:
+            _timed_request(http, recorder, 'GET', base_url, '/upload')
+            # 年月はアップロード時の元のファイル名から判定される（保存先は R75_u{n}_i{m}_ で始まる一時ファイル名で、
+            # secure_filename で「年」「月」が除かれるため判定には使われない）
+            filename = f'R7年5月_u{user_id}_i{i}.pdf'
+            response = _timed_request(http, recorder, 'POST', base_url, '/upload',
+                                      files={'file': (filename, pdf_bytes, 'application/pdf')})
+            if response.status_code == 302:
+                response = _timed_request(http, recorder, 'GET', base_url, '/confirm')
+                fields = SHIFT_FIELD.findall(response.text)
+                response = _timed_request(http, recorder, 'POST', base_url, '/confirm',
+                                          data={field: 'on' for field in fields})
+                if response.status_code == 302:
+                    _timed_request(http, recorder, 'GET', base_url, '/register')
+
+            _timed_request(http, recorder, 'GET', base_url, '/calendar/events')
+            _timed_request(http, recorder, 'GET', base_url, '/settings')
+            _timed_request(http, recorder, 'POST', base_url, '/settings', data={
+                'target_name': '瓜田', 'event_title': '図書館バイト📚', 'event_location': '図書館',
+                'color_id': '8', 'reminder_minutes': '10', 'calendar_id': 'primary',
+                'additional_reminder_minutes': '60', 'event_description_template': 'シフト時間: {time}',
+            })
+        except requests.RequestException:
+            continue
+
+
+def start_gunicorn(workers: int, threads: int, port: int, env: Dict[str, str], workdir: str) -> subprocess.Popen:
+    """gunicorn を起動し、応答可能になるまで待機"""
+    # 本番と同じ設定（preload と共有状態の準備）で起動し、ワーカー数などだけを上書きする
+    command = [
+        sys.executable, '-m', 'gunicorn', '--config', os.path.join(APP_DIR, 'gunicorn.conf.py'),
+        '--workers', str(workers), '--threads', str(threads),
+        '--bind', f'127.0.0.1:{port}', '--pythonpath', APP_DIR,
+        '--log-level', 'warning', 'app:app',
+    ]
+    process = subprocess.Popen(command, cwd=workdir, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn の起動に失敗しました: {process.stderr.read().decode(errors='replace')}")
+        try:
+            requests.get(f'http://127.0.0.1:{port}/', timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn が時間内に応答しませんでした")
+
+
+def summarize(recorder: LatencyRecorder, elapsed: float) -> Dict[str, Dict[str, float]]:
+    """ルートごとの統計を計算"""
+    summary = {}
+    for route, samples in sorted(recorder.samples.items()):
+        latencies = sorted(seconds for seconds, _ in samples)
+        errors = sum(1 for _, status in samples if status == 0 or status >= 500)
+        summary[route] = {
+            'count': len(samples),
+            'errors': errors,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'throughput_rps': len(samples) / elapsed if elapsed else 0.0,
+        }
+    return summary
+
+
+def print_summary(title: str, summary: Dict[str, Dict[str, float]], elapsed: float) -> None:
+    print(f"\n== {title} ({elapsed:.1f}s) ==")
+    print(f"{'route':<24}{'count':>7}{'errors':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'req/s':>9}")
+    for route, stats in summary.items():
+        print(f"{route:<24}{stats['count']:>7}{stats['errors']:>8}{stats['p50_ms']:>10.1f}"
+              f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['throughput_rps']:>9.1f}")
+
+
+def run_load_test(workers: int, args, calendar_endpoint: str, pdf_bytes: bytes) -> Dict:
+    """指定したワーカー数で1回分の負荷試験を実行"""
+    workdir = tempfile.mkdtemp(prefix='shiftmanager-loadtest-')
+    port = _free_port()
+    env = dict(os.environ)
+    env.update({
+        'LOADTEST_MODE': 'true',
+        'CALENDAR_API_ENDPOINT': calendar_endpoint,
+        # 全ワーカーで同じ署名鍵を使う（プロセスごとに異なるとセッションが無効になる）
+        'FLASK_SECRET_KEY': secrets.token_hex(32),
+        'SESSION_FILE_DIR': os.path.join(workdir, 'flask_session'),
+        'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'),
+    })
+
+    process = start_gunicorn(workers, args.threads, port, env, workdir)
+    recorder = LatencyRecorder()
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.users) as executor:
+            futures = [executor.submit(run_user_flow, f'http://127.0.0.1:{port}', user_id,
+                                       args.iterations, pdf_bytes, recorder)
+                       for user_id in range(args.users)]
+            for future in futures:
+                future.result()
+        elapsed = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    summary = summarize(recorder, elapsed)
+    print_summary(f'gunicorn workers={workers} threads={args.threads} users={args.users}', summary, elapsed)
+    return {'workers': workers, 'threads': args.threads, 'users': args.users,
+            'elapsed_s': elapsed, 'routes': summary}
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description='ShiftManagerWeb 負荷試験')
+    arg_parser.add_argument('--workers', default='1,2,4', help='gunicorn のワーカー数（カンマ区切りで複数指定可）')
+    arg_parser.add_argument('--threads', type=int, default=1, help='ワーカーあたりのスレッド数')
+    arg_parser.add_argument('--users', type=int, default=8, help='同時に実行する仮想ユーザー数')
+    arg_parser.add_argument('--iterations', type=int, default=5, help='仮想ユーザーごとの繰り返し回数')
+    arg_parser.add_argument('--pages', type=int, default=1, help='アップロードするシフト表のページ数')
+    arg_parser.add_argument('--latency-ms', type=float, default=50.0, help='擬似Calendar APIの平均応答遅延')
+    arg_parser.add_argument('--jitter-ms', type=float, default=20.0, help='擬似Calendar APIの応答遅延のばらつき')
+    arg_parser.add_argument('--error-rate', type=float, default=0.0, help='擬似Calendar APIのエラー率（0〜1）')
+    arg_parser.add_argument('--json', help='結果をJSONで保存するパス')
+    args = arg_parser.parse_args(argv)
+
+    state = FakeCalendarState(args.latency_ms, args.jitter_ms, args.error_rate)
+    server = start_server(state)
+    calendar_endpoint = f'http://127.0.0.1:{server.server_address[1]}/calendar/v3/'
+    pdf_bytes, _ = generate_roster('table', pages=args.pages, staff_count=12, seed=0)
+
+    results = []
+    try:
+        for workers in [int(value) for value in args.workers.split(',') if value]:
+            results.append(run_load_test(workers, args, calendar_endpoint, pdf_bytes))
+    finally:
+        server.shutdown()
+
+    print(f"\n擬似Calendar APIへのリクエスト数: {state.request_counts}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'calendar_requests': state.request_counts, 'runs': results}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Metrics Module - 処理段階ごとの計測とPrometheus形式での出力
+
+アップロード保存・PDF読み込み・ページごとの抽出・シフト照合・Calendar API呼び出し・
+セッション入出力などの処理時間をヒストグラムとして集計し、`/metrics` エンドポイントから
+Prometheusのテキスト形式で出力するためのクラスと関数を提供します。
+リクエスト単位の計測結果は `Server-Timing` ヘッダーの生成にも利用できます。
+"""
+
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+# Prometheusクライアントのデフォルトに近いバケット（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# メモリ使用量のバケット（MB）
+MEMORY_BUCKETS_MB = (32, 64, 128, 192, 256, 384, 512, 768, 1024, 2048)
+
+# リクエスト単位で計測結果を保持する（Noneの場合は収集しない）
+_request_spans: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar('request_spans', default=None)
+
+
+def _format_labels(labelnames: Tuple[str, ...], labelvalues: Tuple[str, ...], extra: str = '') -> str:
+    """ラベルをPrometheus形式の文字列に変換"""
+    pairs = []
+    for name, value in zip(labelnames, labelvalues):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """単調増加するカウンター"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        """
+        初期化
+
+        Args:
+            name: メトリクス名
+            documentation: HELP行に出力する説明
+            labelnames: ラベル名のタプル
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        """カウンターを増加"""
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        """現在値を取得"""
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def render(self) -> List[str]:
+        """Prometheus形式の行リストを生成"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {value}')
+        return lines
+
+
+class Gauge(Counter):
+    """増減する現在値（キュー長など）"""
+
+    def set(self, value: float, **labels) -> None:
+        """値を設定"""
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        """値を減少"""
+        self.inc(-amount, **labels)
+
+    def render(self) -> List[str]:
+        """Prometheus形式の行リストを生成"""
+        lines = super().render()
+        lines[1] = f'# TYPE {self.name} gauge'
+        return lines
+
+
+class Histogram:
+    """処理時間などの分布を集計するヒストグラム"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        初期化
+
+        Args:
+            name: メトリクス名
+            documentation: HELP行に出力する説明
+            labelnames: ラベル名のタプル
+            buckets: バケットの上限値（昇順）
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # ラベルごとに [バケット別件数..., 合計値, 件数] を保持
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        """値を記録"""
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [0.0] * (len(self.buckets) + 2)
+                self._series[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self, **labels) -> Tuple[float, int]:
+        """(合計値, 件数) を取得"""
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                return 0.0, 0
+            return series[-2], int(series[-1])
+
+    def render(self) -> List[str]:
+        """Prometheus形式の行リストを生成"""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            for i, bound in enumerate(self.buckets):
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f'{self.name}_bucket{labels} {int(series[i])}')
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{labels} {int(series[-1])}')
+            plain = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{plain} {series[-2]}')
+            lines.append(f'{self.name}_count{plain} {int(series[-1])}')
+        return lines
+
+
+class MetricsRegistry:
+    """メトリクスを名前で管理するレジストリ"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, *args, **kwargs)
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        """カウンターを取得（未登録なら作成）"""
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        """ゲージを取得（未登録なら作成）"""
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        """ヒストグラムを取得（未登録なら作成）"""
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets)
+
+    def render(self) -> str:
+        """全メトリクスをPrometheusのテキスト形式で出力"""
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# アプリケーション全体で共有するレジストリ
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    'shiftmanager_stage_duration_seconds',
+    '処理段階ごとの所要時間（秒）',
+    ('stage',)
+)
+STAGE_ERRORS = registry.counter(
+    'shiftmanager_stage_errors_total',
+    '処理段階ごとの例外発生回数',
+    ('stage',)
+)
+REQUEST_SECONDS = registry.histogram(
+    'shiftmanager_request_duration_seconds',
+    'ルートごとのリクエスト処理時間（秒）',
+    ('endpoint', 'method')
+)
+REQUESTS_TOTAL = registry.counter(
+    'shiftmanager_requests_total',
+    'ルートごとのリクエスト数',
+    ('endpoint', 'method', 'status')
+)
+PARSE_PEAK_RSS_MB = registry.histogram(
+    'shiftmanager_parse_peak_rss_megabytes',
+    'PDF解析中のプロセスの最大常駐メモリ（MB）',
+    buckets=MEMORY_BUCKETS_MB
+)
+PARSE_MEMORY_REJECTIONS = registry.counter(
+    'shiftmanager_parse_memory_budget_exceeded_total',
+    'メモリ上限を超えて中断したPDF解析の回数'
+)
+PARSE_SKIPPED_WORK = registry.counter(
+    'shiftmanager_parse_skipped_work_total',
+    'ページの抽出方法の事前判定で省いた処理の数',
+    ('work',)
+)
+
+
+def current_rss_mb() -> float:
+    """
+    現在のプロセスの常駐メモリ（RSS）をMB単位で取得
+
+    Linux では /proc/self/statm から現在値を読み取ります。
+    読み取れない環境ではプロセス開始以降の最大値（getrusage）で代用します。
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS はバイト単位、Linux はKB単位
+        return max_rss / (1024 * 1024) if sys.platform == 'darwin' else max_rss / 1024
+    except Exception:
+        return 0.0
+
+
+@contextmanager
+def timed(stage: str):
+    """
+    処理段階の所要時間を計測するコンテキストマネージャ
+
+    Args:
+        stage: 段階名（例: "pdf_open", "calendar_events_insert"）
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+def begin_request_spans():
+    """現在のリクエストで計測結果の収集を開始し、終了用のトークンを返す"""
+    return _request_spans.set([])
+
+
+def end_request_spans(token) -> List[Tuple[str, float]]:
+    """計測結果の収集を終了し、収集した (段階名, 秒) のリストを返す"""
+    spans = _request_spans.get() or []
+    _request_spans.reset(token)
+    return spans
+
+
+def record_spans(spans: List[Tuple[str, float]]) -> None:
+    """
+    別のプロセスで計測した (段階名, 秒) を、このプロセスのヒストグラムと現在のリクエストの計測結果に加える
+
+    ProcessPoolExecutor のワーカーで計測した結果はワーカーのレジストリに記録されるため、
+    ワーカーから返された計測結果を親プロセスで記録し直すために使います。
+
+    Args:
+        spans: (段階名, 秒) のリスト（end_request_spans の戻り値）
+    """
+    request_spans = _request_spans.get()
+    for stage, elapsed in spans:
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        if request_spans is not None:
+            request_spans.append((stage, elapsed))
+
+
+def format_server_timing(spans: List[Tuple[str, float]]) -> str:
+    """
+    計測結果を Server-Timing ヘッダーの値に変換
+
+    同じ段階が複数回計測された場合（ページごとの抽出など）は合計時間と回数をまとめます。
+
+    Args:
+        spans: (段階名, 秒) のリスト
+
+    Returns:
+        Server-Timing ヘッダー値
+    """
+    totals: Dict[str, List[float]] = {}
+    for stage, elapsed in spans:
+        entry = totals.setdefault(stage, [0.0, 0])
+        entry[0] += elapsed
+        entry[1] += 1
+
+    parts = []
+    for stage, (elapsed, count) in totals.items():
+        part = f'{stage};dur={elapsed * 1000:.1f}'
+        if count > 1:
+            part += f';desc="x{count}"'
+        parts.append(part)
+    return ', '.join(parts)
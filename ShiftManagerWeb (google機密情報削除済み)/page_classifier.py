@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Page Classifier Module - ページの罫線と文字の配置から抽出方法を事前に判定するモジュール
+
+pdfplumber で読み込んだ罫線（line / rect / curve）の数と文字の密度から、
+ページをテーブル（'table'）・テキスト（'text'）・空（'empty'）のいずれとして抽出するかを判定します。
+テキストだけのページで失敗するテーブル検出を省くためのもので、判定結果はレイアウトの特徴量
+（フィンガープリント）ごとに保持し、同じ様式のページでは前回の抽出結果に基づく判定を再利用します。
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+STRATEGIES = ('table', 'text', 'empty')
+
+
+class PageClassifier:
+    """ページの抽出方法を判定し、レイアウトのフィンガープリントごとに判定結果を保持するクラス"""
+
+    # テーブルの枠を作るのに必要な水平・垂直の罫線の最小数
+    MIN_GRID_EDGES = 2
+    # 罫線で囲まれた範囲にこの割合以上の文字がない場合は、罫線を装飾とみなしてテキストとして扱う
+    MIN_RULED_CHAR_RATIO = 0.2
+    # 保持するフィンガープリントの最大数
+    MAX_ENTRIES = 256
+
+    def __init__(self, max_entries: Optional[int] = None):
+        """
+        初期化
+
+        Args:
+            max_entries: 保持するフィンガープリントの最大数（省略時は MAX_ENTRIES）
+        """
+        self.max_entries = max_entries or self.MAX_ENTRIES
+        self._decisions: 'OrderedDict[str, str]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def layout_features(page) -> Dict[str, float]:
+        """
+        ページのレイアウトの特徴量を計算
+
+        罫線の数と文字数は、テーブル・テキストの抽出でも使う pdfplumber の解析結果（page.objects）から数えるため、
+        抽出とは別にページを解析し直すことはありません。
+
+        Args:
+            page: pdfplumber のページオブジェクト
+
+        Returns:
+            {'width', 'height', 'h_edges', 'v_edges', 'chars', 'density', 'ruled_ratio'} の辞書。
+            density は1万平方ポイントあたりの文字数、ruled_ratio は罫線で囲まれた範囲にある文字の割合です
+        """
+        horizontal = page.horizontal_edges
+        vertical = page.vertical_edges
+        chars = page.chars
+        width, height = float(page.width), float(page.height)
+
+        ruled_ratio = 0.0
+        edges = horizontal + vertical
+        if chars and edges:
+            x0 = min(edge['x0'] for edge in edges)
+            x1 = max(edge['x1'] for edge in edges)
+            top = min(edge['top'] for edge in edges)
+            bottom = max(edge['bottom'] for edge in edges)
+            inside = sum(1 for char in chars
+                         if x0 <= (char['x0'] + char['x1']) / 2 <= x1
+                         and top <= (char['top'] + char['bottom']) / 2 <= bottom)
+            ruled_ratio = inside / len(chars)
+
+        area = max(width * height, 1.0)
+        return {
+            'width': width,
+            'height': height,
+            'h_edges': len(horizontal),
+            'v_edges': len(vertical),
+            'chars': len(chars),
+            'density': len(chars) * 10000 / area,
+            'ruled_ratio': ruled_ratio,
+        }
+
+    @staticmethod
+    def fingerprint(features: Dict[str, float]) -> str:
+        """
+        レイアウトの特徴量からフィンガープリントを作成
+
+        ページサイズと罫線の数はそのまま、文字の密度は2倍ごと、罫線内の文字の割合は0.1単位に丸めて使うため、
+        同じ様式で名前や時間だけが異なるページは同じフィンガープリントになります。
+
+        Args:
+            features: layout_features の戻り値
+
+        Returns:
+            フィンガープリントの文字列
+        """
+        return (f"{features['width']:.0f}x{features['height']:.0f}"
+                f":h{features['h_edges']}:v{features['v_edges']}"
+                f":d{int(features['density']).bit_length()}:r{features['ruled_ratio']:.1f}")
+
+    @classmethod
+    def decide(cls, features: Dict[str, float]) -> str:
+        """
+        特徴量から抽出方法を判定
+
+        水平・垂直の罫線がそれぞれ2本以上ないページでは pdfplumber の既定の設定でテーブルは検出されないため、
+        テーブル検出を行わずにテキストとして扱います。
+
+        Args:
+            features: layout_features の戻り値
+
+        Returns:
+            'table' / 'text' / 'empty'
+        """
+        has_grid = (features['h_edges'] >= cls.MIN_GRID_EDGES
+                    and features['v_edges'] >= cls.MIN_GRID_EDGES)
+        if not has_grid:
+            return 'text' if features['chars'] else 'empty'
+        if features['chars'] and features['ruled_ratio'] < cls.MIN_RULED_CHAR_RATIO:
+            return 'text'
+        return 'table'
+
+    def classify(self, page) -> Tuple[str, str, bool]:
+        """
+        ページの抽出方法を判定
+
+        Args:
+            page: pdfplumber のページオブジェクト
+
+        Returns:
+            (抽出方法, フィンガープリント, 保持していた判定を再利用したか) のタプル
+        """
+        features = self.layout_features(page)
+        key = self.fingerprint(features)
+        with self._lock:
+            strategy = self._decisions.get(key)
+            if strategy is not None:
+                self._decisions.move_to_end(key)
+                return strategy, key, True
+        return self.decide(features), key, False
+
+    def learn(self, key: str, strategy: str) -> None:
+        """
+        実際の抽出結果を判定として保持
+
+        テーブルと判定したページでテーブルが検出されなかった場合は、同じ様式のページで
+        次回からテーブル検出を省けるよう、実際に使った抽出方法を記録します。
+
+        Args:
+            key: classify で得たフィンガープリント
+            strategy: 実際に使った抽出方法（'table' / 'text' / 'empty'）
+        """
+        if strategy not in STRATEGIES:
+            return
+        with self._lock:
+            self._decisions[key] = strategy
+            self._decisions.move_to_end(key)
+            while len(self._decisions) > self.max_entries:
+                self._decisions.popitem(last=False)
+
+
+# プロセス内で共有する判定器（同じ様式のシフト表は繰り返しアップロードされるため、判定をリクエスト間で再利用する）
+shared_classifier = PageClassifier()
@@ -8,76 +8,74 @@ PDF Parser Module - シフト表PDFからシフト情報を抽出するモジュ
 
 import os
 import re
+import hashlib
 import logging
 from datetime import datetime
-from typing import List, Dict, Tuple, Optional, Any
+from typing import List, Dict, Tuple, Optional, Any, Iterable, Iterator
 import pdfplumber
+from pdfminer.pdftypes import PDFObjRef, PDFStream, resolve1
 from PIL import Image
 import tempfile
 
+from metrics import timed, current_rss_mb, begin_request_spans, end_request_spans
+from roster_cache import PageCache
+from cell_index import CellIndex, normalize_lines, normalize_text
+from page_classifier import PageClassifier, shared_classifier
+
 logger = logging.getLogger(__name__)
 
 
+class MemoryBudgetExceeded(Exception):
+    """PDF解析中にメモリ使用量が上限を超えた場合の例外"""
+
+
 class PdfParser:
     """PDFからシフト情報を抽出するクラス"""
 
-    def __init__(self, target_name: str):
+    # 時間形式のパターン（10:00-18:00, 10:00～18:00など）を柔軟に対応
+    TIME_PATTERN = r'(\d{1,2})[\.:](\d{2})\s*[‐\-~〜～－]\s*(\d{1,2})[\.:](\d{2})'
+
+    # 見出しの年月のパターン（正規化済みのテキストに適用）と、西暦に換算するための加算値
+    PERIOD_PATTERNS = [
+        (r'令和(\d{1,2}|元)年(\d{1,2})月', 2018),
+        (r'(?<![A-Za-z])R(\d{1,2})[年./\-](\d{1,2})(?!\d)', 2018),
+        (r'(20\d{2})年(\d{1,2})月', 0),
+        (r'(20\d{2})[./\-](\d{1,2})(?!\d)', 0),
+    ]
+    # 年月を探す見出しの行数
+    HEADER_LINES = 3
+    # ファイル名の和暦（令和）の年。「年」がない場合は直後に月が続くことがある（R75 = 令和7年5月）
+    FILENAME_REIWA_PATTERN = r'(?:令和|(?<![A-Za-zＡ-Ｚａ-ｚ])[RＲ])([0-9０-９]+)(年)?'
+    # ファイル名の年として受け付ける、推測した年（guess_year）との差の上限
+    FILENAME_YEAR_TOLERANCE = 5
+    # name_matches の判定結果を覚えておくセル文字列の上限
+    MATCH_MEMO_SIZE = 4096
+
+    def __init__(self, target_name: str, classifier: Optional[PageClassifier] = None):
         """
         初期化
 
         Args:
             target_name: 検索対象の名前
+            classifier: ページの抽出方法の判定器（省略時はプロセス内で共有する判定器）
         """
         self.target_name = target_name
-        # 時間形式のパターン（10:00-18:00, 10:00～18:00など）を柔軟に対応
-        self.time_pattern = r'(\d{1,2})[\.:](\d{2})\s*[‐\-~〜～－]\s*(\d{1,2})[\.:](\d{2})'
-
-    @staticmethod
-    def extract_year_month(filename: str) -> Tuple[int, str]:
-        """
-        ファイル名から年月情報を抽出
-
-        Args:
-            filename: PDFファイル名
-
-        Returns:
-            (年, 月) のタプル。月は2桁の文字列形式（例: "05"）
-        """
-        # 令和X年Y月 形式
-        reiwa_match = re.search(r'令和(\d+)年(\d+)月', filename)
-        if reiwa_match:
-            reiwa_year = int(reiwa_match.group(1))
-            month = int(reiwa_match.group(2))
-            year = 2018 + reiwa_year
-            return year, f"{month:02d}"
-
-        # X年Y月 形式
-        year_month_match = re.search(r'(\d+)年(\d+)月', filename)
-        if year_month_match:
-            year = int(year_month_match.group(1))
-            if year < 100:
-                year += 2000
-            month = int(year_month_match.group(2))
-            return year, f"{month:02d}"
-
-        # YYYYMM 形式
-        yyyymm_match = re.search(r'(\d{4})(\d{2})', filename)
-        if yyyymm_match:
-            year = int(yyyymm_match.group(1))
-            month = yyyymm_match.group(2)
-            return year, month
-
-        # ファイルの最終更新日時を使用
-        try:
-            pdf_time = os.path.getmtime(filename)
-            pdf_date = datetime.fromtimestamp(pdf_time)
-            return pdf_date.year, f"{pdf_date.month:02d}"
-        except Exception as e:
-            logger.error(f"PDF作成日取得エラー: {e}")
-
-        # 現在の日付をフォールバックとして使用
-        now = datetime.now()
-        return now.year, f"{now.month:02d}"
+        self.normalized_target = normalize_text(target_name)
+        self._target_bigrams = [self.normalized_target[i:i+2] for i in range(len(self.normalized_target) - 1)]
+        self._match_memo: Dict[str, bool] = {}
+        self.time_pattern = self.TIME_PATTERN
+        # 名前は正規表現の特殊文字を含み得るため、エスケープして正規化済みのテキストに適用する
+        name = re.escape(self.normalized_target)
+        self._name_date_time = re.compile(f'{name}.*?(\\d{{1,2}})日.*?({self.time_pattern})')
+        self._date_name_time = re.compile(r'(\d{1,2})日.*?' + name + r'.*?(' + self.time_pattern + r')')
+        self._name_time = re.compile(name + r'.*?(' + self.time_pattern + r')')
+        self._name_date_range = re.compile(f'{name}.*?(\\d{{1,2}})日.*?(\\d{{1,2}}[:.:]\\d{{2}}\\s*[‐\\-~〜～]\\s*[\\d:.]+)')
+        self.page_hashes: List[Optional[str]] = []
+        self.reused_pages = 0
+        self.peak_rss_mb = 0.0
+        self.detected_period: Optional[Tuple[Optional[int], int]] = None
+        self.classifier = classifier or shared_classifier
+        self.skipped_work = self._empty_skipped_work()
 
     def extract_date_from_text(self, text: str) -> Optional[str]:
         """
@@ -148,21 +146,35 @@ class PdfParser:
         if not text:
             return False
 
-        # 完全一致
-        if self.target_name == text.strip():
-            return True
+        # 同じ名前や時刻のセルは何度も現れるため、正規化と照合はセル文字列ごとに1回だけ行う
+        matched = self._match_memo.get(text)
+        if matched is None:
+            if len(self._match_memo) >= self.MATCH_MEMO_SIZE:
+                self._match_memo.clear()
+            matched = self._match_memo[text] = self._normalized_matches(normalize_text(text))
+        return matched
+
+    def _normalized_matches(self, text: str) -> bool:
+        """
+        正規化済みのテキストに対象の名前が含まれているかチェック
+
+        Args:
+            text: normalize_text() を通したテキスト
 
-        # 部分一致（名字や名前の一部だけでもマッチ）
-        if self.target_name in text:
+        Returns:
+            名前が含まれている場合はTrue
+        """
+        # 全角・半角の違いや名前の間の空白を無視して比較する
+        target = self.normalized_target
+        if not target:
+            return False
+
+        # 完全一致・部分一致（名字や名前の一部だけでもマッチ）
+        if target in text:
             return True
 
         # 名前の一部が含まれている場合（2文字以上の名前の場合）
-        if len(self.target_name) >= 2:
-            for i in range(len(self.target_name) - 1):
-                if self.target_name[i:i+2] in text:
-                    return True
-
-        return False
+        return any(part in text for part in self._target_bigrams)
 
     def parse_table_format(self, table: List[List[Any]]) -> List[Dict[str, str]]:
         """
@@ -289,26 +301,25 @@ class PdfParser:
         logger.info(f"テキスト解析開始: 長さ {len(text)} 文字")
         logger.info(f"テキストサンプル: {text[:200]}...")
 
+        # 全角・半角の違いや名前の間の空白を無視するため、行ごとに正規化してから照合する
+        text = normalize_lines(text)
+
         # 名前が含まれているかチェック
-        if self.target_name not in text:
+        if self.normalized_target not in text:
             logger.info(f"テキスト内に名前 '{self.target_name}' が見つかりません")
             # 名前の一部で検索
-            if len(self.target_name) >= 2:
-                for i in range(len(self.target_name) - 1):
-                    part = self.target_name[i:i+2]
-                    if part in text:
-                        logger.info(f"名前の一部 '{part}' がテキスト内に見つかりました")
-                        break
+            for part in self._target_bigrams:
+                if part in text:
+                    logger.info(f"名前の一部 '{part}' がテキスト内に見つかりました")
+                    break
 
         # パターン1: 名前の後に日付と時間が続く形式
-        pattern1 = f'{self.target_name}.*?(\\d{{1,2}})日.*?({self.time_pattern})'
-        for match in re.finditer(pattern1, text):
+        for match in self._name_date_time.finditer(text):
             logger.info(f"パターン1で一致: {match.group(0)[:50]}...")
             shifts.append({'date': match.group(1), 'time': match.group(2)})
 
         # パターン2: 日付の後に名前と時間が続く形式
-        pattern2 = r'(\d{1,2})日.*?' + self.target_name + r'.*?(' + self.time_pattern + r')'
-        for match in re.finditer(pattern2, text):
+        for match in self._date_name_time.finditer(text):
             logger.info(f"パターン2で一致: {match.group(0)[:50]}...")
             shifts.append({'date': match.group(1), 'time': match.group(2)})
 
@@ -316,7 +327,7 @@ class PdfParser:
         dates = re.findall(r'(\d{1,2})日', text)
         if dates:
             logger.info(f"抽出された日付: {dates}")
-            name_time_pairs = re.findall(self.target_name + r'.*?(' + self.time_pattern + r')', text)
+            name_time_pairs = [match.group(1) for match in self._name_time.finditer(text)]
             logger.info(f"抽出された名前と時間のペア: {name_time_pairs}")
 
             if len(dates) == len(name_time_pairs):
@@ -327,7 +338,7 @@ class PdfParser:
         # パターン4: 名前の近くに日付と時間がある場合
         lines = text.split('\n')
         for i, line in enumerate(lines):
-            if self.name_matches(line):
+            if self._normalized_matches(line):
                 logger.info(f"名前を含む行を検出: {i}行目 - {line[:50]}...")
                 context_lines = lines[max(0, i-3):min(len(lines), i+4)]
                 context_text = '\n'.join(context_lines)
@@ -341,94 +352,486 @@ class PdfParser:
 
         return shifts
 
-    def parse_pdf(self, pdf_path: str) -> List[Dict[str, str]]:
+    def _match_table_rows(self, table: List[List[Any]], shifts: List[Dict[str, str]]) -> None:
         """
-        PDFファイルからシフト情報を抽出
+        ページから抽出したテーブルの各行を照合し、見つかったシフトを shifts に追加
 
         Args:
-            pdf_path: PDFファイルのパス
+            table: page.extract_table() の結果
+            shifts: 抽出結果を追加するリスト
+        """
+        for row_index, row in enumerate(table):
+            if row_index == 0:
+                continue  # ヘッダー行をスキップ
+
+            if any(cell and self.name_matches(str(cell or "")) for cell in row):
+                logger.info(f"名前を含む行を検出: {row_index}行目")
+                date_str = str(row[0] or "")
+                time_str = str(row[2] or "") if len(row) > 2 else ""
+                logger.info(f"候補: 日付列={date_str}, 時間列={time_str}")
+
+                date_match = re.search(r'(\d{1,2})日', date_str)
+                if date_match:
+                    date_num = date_match.group(1)
+                    logger.info(f"日付を抽出: {date_num}")
+                    time_extracted = self.extract_time_from_text(time_str)
+                    if time_extracted:
+                        logger.info(f"時間を抽出: {time_extracted}")
+                        shifts.append({'date': date_num, 'time': time_extracted})
+                        logger.info(f"シフト情報を追加: 日付={date_num}, 時間={time_extracted}")
+
+    def _match_page_text(self, text: str, shifts: List[Dict[str, str]]) -> None:
+        """
+        ページから抽出したテキストを照合し、見つかったシフトを shifts に追加
+
+        Args:
+            text: page.extract_text() の結果
+            shifts: 抽出結果を追加するリスト（それまでのページの結果を含む）
+        """
+        text = normalize_lines(text)
+        for match in self._name_date_range.finditer(text):
+            date = match.group(1)
+            time_str = match.group(2)
+            logger.info(f"テキストからシフト情報を抽出: 日付={date}, 時間={time_str}")
+            shifts.append({'date': date, 'time': time_str})
+
+        # 追加のパターン
+        if not shifts:
+            # パターン1: 名前の後に日付と時間が続く形式
+            for match in self._name_date_time.finditer(text):
+                logger.info(f"パターン1で一致: {match.group(0)[:50]}...")
+                shifts.append({'date': match.group(1), 'time': match.group(2)})
+
+            # パターン2: 日付の後に名前と時間が続く形式
+            for match in self._date_name_time.finditer(text):
+                logger.info(f"パターン2で一致: {match.group(0)[:50]}...")
+                shifts.append({'date': match.group(1), 'time': match.group(2)})
+
+    @classmethod
+    def page_content_hash(cls, page) -> str:
+        """
+        ページの内容からハッシュ値を計算
+
+        ページサイズ、コンテンツストリーム、使用フォント（文字コードの対応表を含む）、
+        XObject（画像やフォームXObjectのストリームと、フォームが参照するリソース）、注釈から計算するため、
+        PDFが再発行されても内容が変わっていないページは同じハッシュ値になります。
+
+        Args:
+            page: pdfplumber のページオブジェクト
 
         Returns:
-            シフト情報のリスト
+            SHA-256 の16進文字列
         """
-        shifts = []
+        page_obj = page.page_obj
+        digest = hashlib.sha256()
+        digest.update(repr(tuple(round(float(v), 2) for v in page.bbox)).encode())
+
+        contents = resolve1(page_obj.attrs.get('Contents'))
+        streams = contents if isinstance(contents, list) else [contents]
+        for stream in streams:
+            stream = resolve1(stream)
+            if isinstance(stream, PDFStream):
+                digest.update(stream.get_data())
+
+        seen = set()
+        cls._hash_resources(digest, page_obj.resources, seen)
+
+        annots = resolve1(page_obj.annots) or []
+        for annot in annots if isinstance(annots, list) else []:
+            annot = resolve1(annot)
+            if not isinstance(annot, dict):
+                continue
+            for key in ('Subtype', 'Rect', 'Contents', 'V'):
+                digest.update(repr(resolve1(annot.get(key))).encode())
+            # 注釈の見た目（通常の外観ストリーム。状態ごとに複数ある場合はすべて）
+            appearance = resolve1(annot.get('AP')) or {}
+            normal = appearance.get('N') if isinstance(appearance, dict) else None
+            states = resolve1(normal)
+            if isinstance(states, dict):
+                for state in sorted(states):
+                    cls._hash_xobject(digest, state, states[state], seen)
+            elif normal is not None:
+                cls._hash_xobject(digest, 'N', normal, seen)
+        return digest.hexdigest()
+
+    @classmethod
+    def _hash_resources(cls, digest, resources: Any, seen: set) -> None:
+        """
+        リソース辞書のフォントとXObjectをハッシュに追加（page_content_hash を参照）
 
-        try:
-            logger.info(f"PDF解析開始: {pdf_path}")
-            with pdfplumber.open(pdf_path) as pdf:
-                logger.info(f"PDF読み込み成功: {len(pdf.pages)}ページ")
+        Args:
+            digest: hashlib のハッシュオブジェクト
+            resources: ページまたはフォームXObjectの /Resources
+            seen: ハッシュに追加済みのオブジェクト番号（循環参照の防止用）
+        """
+        resources = resolve1(resources) or {}
+        if not isinstance(resources, dict):
+            return
+
+        fonts = resolve1(resources.get('Font')) or {}
+        for font_name in sorted(fonts):
+            font = resolve1(fonts[font_name]) or {}
+            digest.update(str(font_name).encode())
+            for key in ('BaseFont', 'Encoding'):
+                digest.update(repr(resolve1(font.get(key))).encode())
+            to_unicode = resolve1(font.get('ToUnicode'))
+            if isinstance(to_unicode, PDFStream):
+                digest.update(to_unicode.get_data())
+
+        xobjects = resolve1(resources.get('XObject')) or {}
+        for name in sorted(xobjects):
+            cls._hash_xobject(digest, name, xobjects[name], seen)
+
+    @classmethod
+    def _hash_xobject(cls, digest, name: Any, ref: Any, seen: set) -> None:
+        """
+        XObject のストリームと、フォームXObjectが参照するリソースを再帰的にハッシュに追加
+
+        Args:
+            digest: hashlib のハッシュオブジェクト
+            name: リソース名（または外観ストリームの状態名）
+            ref: XObject（またはその参照）
+            seen: ハッシュに追加済みのオブジェクト番号（循環参照の防止用）
+        """
+        digest.update(str(name).encode())
+        if isinstance(ref, PDFObjRef):
+            # 同じXObjectを複数回参照している場合や循環参照は2回目以降を印だけにする
+            # （オブジェクト番号はPDFの再発行で変わり得るため、ハッシュには含めない）
+            if ref.objid in seen:
+                digest.update(b'<seen>')
+                return
+            seen.add(ref.objid)
+
+        stream = resolve1(ref)
+        if not isinstance(stream, PDFStream):
+            return
+        for key in ('Subtype', 'BBox', 'Matrix'):
+            digest.update(repr(resolve1(stream.get(key))).encode())
+        digest.update(stream.get_data())
+        if stream.get('Resources') is not None:
+            cls._hash_resources(digest, stream.get('Resources'), seen)
+
+    def iter_pages(self, pdf_path: str, page_cache: Optional[PageCache] = None,
+                   rss_budget_mb: Optional[float] = None) -> Iterator[Tuple[str, Any]]:
+        """
+        PDFの各ページからテーブルまたはテキストを1ページずつ抽出するジェネレータ
+
+        ページごとに抽出が終わった時点でpdfplumberのレイアウトキャッシュを解放するため、
+        ページ数の多いPDFでも同時に保持するのは1ページ分の解析結果だけになります。
+        page_cache を指定した場合は、ページごとのハッシュ値で保存済みの抽出結果を再利用し、
+        内容が変わったページだけを抽出します。各ページのハッシュ値は self.page_hashes、
+        再利用したページ数は self.reused_pages、解析中のプロセスの最大RSS（MB）は self.peak_rss_mb、
+        1ページ目の見出しから判定した年月は self.detected_period（detect_period を参照）、
+        抽出方法の事前判定で省いた処理の数は self.skipped_work（_extract_page を参照）に記録されます。
 
-                for page_num, page in enumerate(pdf.pages):
+        Args:
+            pdf_path: PDFファイルのパス
+            page_cache: ページ単位の抽出結果キャッシュ（省略時はキャッシュを使用しない）
+            rss_budget_mb: プロセスのRSSの上限（MB）。超えた場合は MemoryBudgetExceeded を送出
+
+        Yields:
+            ページごとの ('table', テーブル) / ('text', テキスト) / ('empty', None)
+        """
+        self.page_hashes = []
+        self.reused_pages = 0
+        self.detected_period = None
+        self.skipped_work = self._empty_skipped_work()
+        self.peak_rss_mb = current_rss_mb()
+        with timed('pdf_open'):
+            pdf = pdfplumber.open(pdf_path)
+            logger.info(f"PDF読み込み成功: {len(pdf.pages)}ページ")
+        with pdf:
+            for page_num, page in enumerate(pdf.pages):
+                entry = None
+                page_hash = None
+                if page_cache is not None:
+                    try:
+                        with timed('page_hash'):
+                            page_hash = self.page_content_hash(page)
+                    except Exception as e:
+                        # ハッシュが取れなくてもシフトの抽出は続ける（このページはキャッシュを使わない）
+                        logger.warning(f"ページ {page_num+1} のハッシュを計算できないため抽出し直します: {e}")
+                    # 差分集計でページと対応させるため、キャッシュの成否に関わらず記録する
+                    self.page_hashes.append(page_hash)
+                    if page_hash is not None:
+                        entry = self._cache_get(page_cache, page_hash)
+                    if entry is not None:
+                        logger.info(f"ページ {page_num+1} は前回から変更がないため抽出結果を再利用します")
+                        self.reused_pages += 1
+
+                if entry is None:
                     logger.info(f"ページ {page_num+1} の解析開始")
-                    # まずテーブルを抽出して処理
-                    table = page.extract_table()
-                    if table:
-                        logger.info(f"テーブルを検出: {len(table)}行 x {len(table[0]) if table else 0}列")
-                        for row_index, row in enumerate(table):
-                            if row_index == 0:
-                                continue  # ヘッダー行をスキップ
-
-                            if any(cell and self.name_matches(str(cell or "")) for cell in row):
-                                logger.info(f"名前を含む行を検出: {row_index}行目")
-                                date_str = str(row[0] or "")
-                                time_str = str(row[2] or "") if len(row) > 2 else ""
-                                logger.info(f"候補: 日付列={date_str}, 時間列={time_str}")
-
-                                date_match = re.search(r'(\d{1,2})日', date_str)
-                                if date_match:
-                                    date_num = date_match.group(1)
-                                    logger.info(f"日付を抽出: {date_num}")
-                                    time_extracted = self.extract_time_from_text(time_str)
-                                    if time_extracted:
-                                        logger.info(f"時間を抽出: {time_extracted}")
-                                        shifts.append({'date': date_num, 'time': time_extracted})
-                                        logger.info(f"シフト情報を追加: 日付={date_num}, 時間={time_extracted}")
-                    else:
-                        logger.info("テーブルは検出されませんでした。テキスト解析を試みます。")
-                        text = page.extract_text()
-                        if text:
-                            logger.info(f"テキストを抽出: {len(text)}文字")
-                            pattern = f'{self.target_name}.*?(\\d{{1,2}})日.*?(\\d{{1,2}}[:.:]\\d{{2}}\\s*[‐\-~〜～]\\s*[\\d:.]+)'
-                            for match in re.finditer(pattern, text):
-                                date = match.group(1)
-                                time_str = match.group(2)
-                                logger.info(f"テキストからシフト情報を抽出: 日付={date}, 時間={time_str}")
-                                shifts.append({'date': date, 'time': time_str})
-
-                            # 追加のパターン
-                            if not shifts:
-                                # パターン1: 名前の後に日付と時間が続く形式
-                                pattern1 = f'{self.target_name}.*?(\\d{{1,2}})日.*?({self.time_pattern})'
-                                for match in re.finditer(pattern1, text):
-                                    logger.info(f"パターン1で一致: {match.group(0)[:50]}...")
-                                    shifts.append({'date': match.group(1), 'time': match.group(2)})
-
-                                # パターン2: 日付の後に名前と時間が続く形式
-                                pattern2 = r'(\d{1,2})日.*?' + self.target_name + r'.*?(' + self.time_pattern + r')'
-                                for match in re.finditer(pattern2, text):
-                                    logger.info(f"パターン2で一致: {match.group(0)[:50]}...")
-                                    shifts.append({'date': match.group(1), 'time': match.group(2)})
-                        else:
-                            logger.info("テキストは抽出できませんでした")
-
-            # 重複を削除
-            unique_shifts = []
-            seen = set()
-            for shift in shifts:
+                    entry = self._extract_page(page)
+                    if page_hash is not None:
+                        self._cache_set(page_cache, page_hash, entry)
+
+                if page_num == 0:
+                    # 1ページ目の見出しから年月を判定（ページの解析結果を解放する前に行う）
+                    self.detected_period = self.detect_period(self._first_page_header(page, entry, page_hash, page_cache))
+                    if self.detected_period:
+                        logger.info(f"PDFの見出しから年月を検出: {self.detected_period}")
+
+                # このページの文字・罫線などの解析結果を解放
+                page.flush_cache()
+                self._check_memory(rss_budget_mb, page_num)
+                yield entry
+
+    def _first_page_header(self, page, entry: Tuple[str, Any], page_hash: Optional[str],
+                           page_cache: Optional[PageCache]) -> str:
+        """
+        1ページ目の見出し部分のテキストを取得
+
+        テキスト形式のページは抽出済みのテキストを使います。テーブル形式のページは見出しがテーブルの外にあるため、
+        テーブル抽出で読み込み済みの文字からテキストを組み立てます（キャッシュ利用時は保存済みの見出しを使います）。
+        """
+        kind, content = entry
+        if kind == 'text':
+            text = content
+        else:
+            header_key = hashlib.sha256(f'{page_hash}:header'.encode()).hexdigest() if page_hash else None
+            cached = self._cache_get(page_cache, header_key) if header_key else None
+            if cached is not None:
+                text = cached[1]
+            else:
+                with timed('pdf_extract_header'):
+                    text = page.extract_text() or ''
+                text = '\n'.join(text.splitlines()[:self.HEADER_LINES])
+                if header_key:
+                    self._cache_set(page_cache, header_key, ('header', text))
+        return '\n'.join((text or '').splitlines()[:self.HEADER_LINES])
+
+    @staticmethod
+    def _cache_get(page_cache: PageCache, key: str) -> Optional[Tuple[str, Any]]:
+        """キャッシュから取得（キャッシュのエラーは未保存として扱い、呼び出し側で抽出し直す）"""
+        try:
+            return page_cache.get(key)
+        except Exception as e:
+            logger.warning(f"キャッシュを利用できないため抽出し直します: {e}")
+            return None
+
+    @staticmethod
+    def _cache_set(page_cache: PageCache, key: str, entry: Tuple[str, Any]) -> None:
+        """キャッシュに保存（保存できなくても解析は続ける）"""
+        try:
+            page_cache.set(key, entry)
+        except Exception as e:
+            logger.warning(f"抽出結果をキャッシュに保存できませんでした: {e}")
+
+    @classmethod
+    def detect_period(cls, text: Optional[str]) -> Optional[Tuple[Optional[int], int]]:
+        """
+        見出しのテキストから年月を判定
+
+        「令和7年5月」「R7年5月」「R7.5」「2025年5月」「2025/5」の形式に対応し、
+        年の記載がなく「5月」だけの場合は年を None として返します。全角数字にも対応します。
+
+        Args:
+            text: 1ページ目の見出し部分のテキスト
+
+        Returns:
+            (年, 月) のタプル（年は不明な場合 None）。判定できない場合は None
+        """
+        if not text:
+            return None
+        text = normalize_text(text)
+
+        for pattern, era_offset in cls.PERIOD_PATTERNS:
+            for match in re.finditer(pattern, text):
+                year_str, month_str = match.group(1), match.group(2)
+                month = int(month_str)
+                if not 1 <= month <= 12:
+                    continue
+                year = (1 if year_str == '元' else int(year_str)) + era_offset
+                return year, month
+
+        for month_match in re.finditer(r'(?<!\d)(\d{1,2})月', text):
+            if 1 <= int(month_match.group(1)) <= 12:
+                return None, int(month_match.group(1))
+        return None
+
+    def _check_memory(self, rss_budget_mb: Optional[float], page_num: int) -> None:
+        """RSSの最大値を更新し、上限を超えていれば MemoryBudgetExceeded を送出"""
+        rss_mb = current_rss_mb()
+        self.peak_rss_mb = max(self.peak_rss_mb, rss_mb)
+        if rss_budget_mb and rss_mb > rss_budget_mb:
+            raise MemoryBudgetExceeded(
+                f"ページ {page_num+1} の解析中にメモリ使用量が上限を超えました（{rss_mb:.0f}MB > {rss_budget_mb:.0f}MB）")
+
+    def extract_pages(self, pdf_path: str, page_cache: Optional[PageCache] = None) -> List[Tuple[str, Any]]:
+        """
+        PDFの各ページからテーブルまたはテキストを抽出
+
+        抽出結果は対象者に依存しないため、複数の名前で照合する場合は
+        一度だけ抽出して parse_extracted に渡すことでPDFの再解析を避けられます。
+
+        Args:
+            pdf_path: PDFファイルのパス
+            page_cache: ページ単位の抽出結果キャッシュ（iter_pages を参照）
+
+        Returns:
+            ページごとの ('table', テーブル) / ('text', テキスト) / ('empty', None) のリスト
+        """
+        return list(self.iter_pages(pdf_path, page_cache))
+
+    @staticmethod
+    def _empty_skipped_work() -> Dict[str, int]:
+        """
+        省いた処理の数の初期値
+
+        classification は同じ様式のページの判定を再利用した数、table_detection はテーブル検出を、
+        text_extraction はテキスト抽出を行わなかったページ数です。
+        """
+        return {'classification': 0, 'table_detection': 0, 'text_extraction': 0}
+
+    def _extract_page(self, page) -> Tuple[str, Any]:
+        """
+        1ページからテーブルまたはテキストを抽出
+
+        罫線の数と文字の密度からページの抽出方法を先に判定し（page_classifier を参照）、
+        テキストだけのページではテーブル検出を、文字も罫線もないページでは抽出自体を省きます。
+        テーブルと判定したページでテーブルが検出されなかった場合は、従来どおりテキストを抽出します。
+        """
+        with timed('page_classify'):
+            strategy, layout_key, reused = self.classifier.classify(page)
+        if reused:
+            self.skipped_work['classification'] += 1
+
+        if strategy == 'empty':
+            logger.info("文字も罫線もないページのため抽出を省略します")
+            self.skipped_work['table_detection'] += 1
+            self.skipped_work['text_extraction'] += 1
+            return ('empty', None)
+
+        if strategy == 'table':
+            with timed('pdf_extract_table'):
+                table = page.extract_table()
+            if table:
+                logger.info(f"テーブルを検出: {len(table)}行 x {len(table[0]) if table else 0}列")
+                self.classifier.learn(layout_key, 'table')
+                return ('table', table)
+            logger.info("テーブルは検出されませんでした。テキスト解析を試みます。")
+        else:
+            logger.info("罫線の少ないページのため、テーブル検出を省略してテキスト解析を行います")
+            self.skipped_work['table_detection'] += 1
+
+        with timed('pdf_extract_text'):
+            text = page.extract_text()
+        if text:
+            logger.info(f"テキストを抽出: {len(text)}文字")
+            self.classifier.learn(layout_key, 'text')
+            return ('text', text)
+        logger.info("テキストは抽出できませんでした")
+        self.classifier.learn(layout_key, 'empty')
+        return ('empty', None)
+
+    def iter_shifts(self, pages: Iterable[Tuple[str, Any]]) -> Iterator[Dict[str, str]]:
+        """
+        ページごとの抽出結果から対象者のシフト情報を順に取り出すジェネレータ
+
+        iter_pages と組み合わせると、PDF全体の抽出結果を保持せずにページ単位で照合できます。
+        既に取り出したシフトと同じ日付・時間のものは除外します（日付順には並べ替えません）。
+
+        Args:
+            pages: extract_pages の戻り値、または iter_pages のジェネレータ
+
+        Yields:
+            シフト情報
+        """
+        seen = set()
+        # テキストの照合はそれまでのページの結果を参照するため、シフト（小さい辞書）だけは累積する
+        shifts = []
+        for kind, content in pages:
+            start = len(shifts)
+            with timed('shift_match'):
+                if kind == 'table':
+                    self._match_table_rows(content, shifts)
+                elif kind == 'text':
+                    self._match_page_text(content, shifts)
+            for shift in shifts[start:]:
                 key = (shift['date'], shift['time'])
                 if key not in seen:
                     seen.add(key)
-                    unique_shifts.append(shift)
+                    yield shift
+
+    def parse_extracted(self, pages: Iterable[Tuple[str, Any]]) -> List[Dict[str, str]]:
+        """
+        extract_pages の結果から対象者のシフト情報を抽出
 
-            # 日付順にソート
-            sorted_shifts = sorted(unique_shifts, key=lambda x: int(x['date']))
-            logger.info(f"PDF解析完了。抽出したシフト数: {len(sorted_shifts)}")
+        Args:
+            pages: extract_pages の戻り値、または iter_pages のジェネレータ
+
+        Returns:
+            シフト情報のリスト（重複削除・日付順）
+        """
+        return sorted(self.iter_shifts(pages), key=lambda x: int(x['date']))
+
+    def parse_cell_index(self, index: CellIndex) -> List[Dict[str, str]]:
+        """
+        セルインデックスから対象者のシフト情報を抽出（PDFの再解析なし）
+
+        テーブルのページはインデックスで名前に一致した行だけを照合し、
+        テキストのページは保存済みのテキストを照合します。結果は parse_pdf と同じ形式です。
+
+        Args:
+            index: parse_roster_file で保存したセルインデックス
+
+        Returns:
+            シフト情報のリスト（重複削除・日付順）
+        """
+        rows_by_page: Dict[int, List[int]] = {}
+        for page_num, row_index in index.matching_rows(self.target_name):
+            if row_index > 0:
+                rows_by_page.setdefault(page_num, []).append(row_index)
+
+        pages = []
+        for page_num in sorted(set(index.tables) | set(index.texts)):
+            if page_num in index.tables:
+                table = index.tables[page_num]
+                # 先頭行はヘッダーとして扱われるため、元のヘッダー行を残す
+                pages.append(('table', table[:1] + [table[r] for r in rows_by_page.get(page_num, [])]))
+            else:
+                pages.append(('text', index.texts[page_num]))
+        return self.parse_extracted(pages)
+
+    def parse_pdf(self, pdf_path: str, page_cache: Optional[PageCache] = None,
+                  rss_budget_mb: Optional[float] = None, index: Optional[CellIndex] = None) -> List[Dict[str, str]]:
+        """
+        PDFファイルからシフト情報を抽出
+
+        ページを1枚ずつ抽出・照合するため、抽出結果をPDF全体分保持しません。
+
+        Args:
+            pdf_path: PDFファイルのパス
+            page_cache: ページ単位の抽出結果キャッシュ（iter_pages を参照）
+            rss_budget_mb: プロセスのRSSの上限（MB）。超えた場合は MemoryBudgetExceeded を送出
+            index: 指定した場合は抽出したページをこのセルインデックスに追加
+
+        Returns:
+            シフト情報のリスト
+        """
+        try:
+            logger.info(f"PDF解析開始: {pdf_path}")
+            pages = self.iter_pages(pdf_path, page_cache, rss_budget_mb)
+            if index is not None:
+                pages = self._add_to_index(pages, index)
+            sorted_shifts = self.parse_extracted(pages)
+            logger.info(f"PDF解析完了。抽出したシフト数: {len(sorted_shifts)}（最大RSS: {self.peak_rss_mb:.1f}MB、"
+                        f"省いた処理: {self.skipped_work}）")
             return sorted_shifts
 
+        except MemoryBudgetExceeded:
+            raise
         except Exception as e:
             logger.error(f"PDF解析中にエラーが発生しました: {e}")
             return []
 
+    @staticmethod
+    def _add_to_index(pages: Iterable[Tuple[str, Any]], index: CellIndex) -> Iterator[Tuple[str, Any]]:
+        """ページをセルインデックスに追加しながらそのまま返すジェネレータ"""
+        for page_num, entry in enumerate(pages):
+            index.add_page(page_num, entry)
+            yield entry
+
     def generate_preview_image(self, pdf_path: str, page_num: int = 0) -> Optional[str]:
         """
         PDFの指定ページからプレビュー画像を生成
@@ -457,22 +860,15 @@ class PdfParser:
 
         return None
 
-    def extract_year_month_from_filename(self, filename):
-        """ファイル名から年月を抽出する"""
-        # 和暦（令和）のパターンを追加
-        reiwa_pattern = r'[RＲ令和][0-9０-９]{1,2}'
-        reiwa_match = re.search(reiwa_pattern, filename)
-        
-        year = None
-        if reiwa_match:
-            # 和暦を西暦に変換
-            reiwa_str = reiwa_match.group()
-            number = re.search(r'[0-9０-９]{1,2}', reiwa_str).group()
-            # 全角数字を半角に変換
-            number = number.translate(str.maketrans('０１２３４５６７８９', '0123456789'))
-            # 令和から西暦への変換（令和1年 = 2019年）
-            year = 2018 + int(number)
-        
+    def extract_year_month_from_filename(self, filename, guess_year=True):
+        """
+        ファイル名から年月を抽出する
+
+        guess_year=False の場合、ファイル名に年がなければ年を推測せずに None を返します
+        （PDFの見出しの年と組み合わせる resolve_period に渡す場合に使用）。
+        """
+        to_half = str.maketrans('０１２３４５６７８９', '0123456789')
+
         # 月の抽出（既存のコード）
         month_pattern = r'([０-９0-9]+)月'
         month_match = re.search(month_pattern, filename)
@@ -480,32 +876,220 @@ class PdfParser:
         month = None
         if month_match:
             # 全角数字を半角に変換
-            month_str = month_match.group(1)
-            month_str = month_str.translate(str.maketrans('０１２３４５６７８９', '0123456789'))
-            month = int(month_str)
+            month = int(month_match.group(1).translate(to_half))
+
+        # 和暦（令和）を西暦に変換（令和1年 = 2019年）
+        year = None
+        reiwa_match = re.search(self.FILENAME_REIWA_PATTERN, filename)
+        if reiwa_match:
+            year, era_month = self._split_era_digits(reiwa_match.group(1).translate(to_half),
+                                                     bool(reiwa_match.group(2)), month)
+            if month is None:
+                month = era_month
+
+        # 読み違えた年（例: R62 を令和62年）でカレンダーに登録しないよう、現在から離れすぎた年は使わない
+        if year is not None and abs(year - self.guess_year(month)) > self.FILENAME_YEAR_TOLERANCE:
+            logger.warning(f"ファイル名の年 {year} は現在から離れすぎているため使用しません: {filename}")
+            year = None
         
-        if year is None:
-            # 年が取得できない場合は現在の年を使用
-            current_year = datetime.now().year
-            # 月が現在の月より大きい場合は前年の可能性がある
-            current_month = datetime.now().month
-            if month and month > current_month:
-                year = current_year - 1
-            else:
-                year = current_year
+        if year is None and guess_year:
+            year = self.guess_year(month)
         
         return year, month
 
+    @classmethod
+    def _split_era_digits(cls, digits: str, has_year_suffix: bool,
+                          month: Optional[int]) -> Tuple[int, Optional[int]]:
+        """
+        ファイル名の令和の後の数字を年と月に分ける
+
+        「年」が続かない2桁以上の数字は、年の後に月が続いている可能性があるため（R62 = 令和6年2月）、
+        月が1〜12になる分け方のうち、ファイル名の月と矛盾せず推測した年（guess_year）に最も近いものを選びます。
+
+        Args:
+            digits: 令和の後の数字（半角）
+            has_year_suffix: 数字の後に「年」が続く場合は True（数字全体を年とする）
+            month: ファイル名の「N月」から判定した月
+
+        Returns:
+            (西暦の年, 数字から読み取った月) のタプル（月がない場合は None）
+        """
+        candidates = [(2018 + int(digits), None)]
+        if not has_year_suffix:
+            for split in (1, 2):
+                if len(digits) > split and int(digits[:split]) >= 1 and 1 <= int(digits[split:]) <= 12:
+                    candidates.append((2018 + int(digits[:split]), int(digits[split:])))
+        base = cls.guess_year(month)
+        return min(candidates, key=lambda c: (month is not None and c[1] not in (None, month), abs(c[0] - base)))
+
+    @staticmethod
+    def guess_year(month: Optional[int]) -> int:
+        """
+        年が分からない場合に、月と現在の日付から年を推測
+
+        Args:
+            month: 月（不明な場合は None）
+
+        Returns:
+            現在の年（月が現在の月より大きい場合は前年の可能性が高いため前年）
+        """
+        now = datetime.now()
+        if month and month > now.month:
+            return now.year - 1
+        return now.year
+
     def extract_year_month(self, filepath):
         """
         1. まずファイル名から年月を抽出
-        2. 見つからない場合はPDFの内容から抽出（既存の実装）
+        2. 見つからない場合はPDFの1ページ目の見出しから抽出
+
+        シフトの抽出と同時に判定する場合は、parse_pdf 実行後の self.detected_period を使ってください
+        （PDFを開き直さずに済みます）。
         """
         filename = os.path.basename(filepath)
         year, month = self.extract_year_month_from_filename(filename)
         
         if year is None or month is None:
-            # 既存のPDF内容からの抽出ロジックを使用
-            return super().extract_year_month(filepath)
+            with pdfplumber.open(filepath) as pdf:
+                header = pdf.pages[0].extract_text() if pdf.pages else ''
+            return self.resolve_period(None, None, self.detect_period(header))
             
         return year, month
+
+    @staticmethod
+    def resolve_period(file_year: Optional[int], file_month: Optional[int],
+                       detected: Optional[Tuple[Optional[int], int]]) -> Tuple[Optional[int], Optional[int]]:
+        """
+        ファイル名とPDFの見出しから判定した年月を組み合わせる
+
+        月はファイル名を優先します。見出しの月がファイル名と一致し、見出しに年がある場合は見出しの年を使います。
+        それ以外はファイル名の年（月が見出しからしか分からない場合も、見出しに年がなければファイル名の年）を使い、
+        どちらにも年がない場合は guess_year で推測します。
+
+        Args:
+            file_year: ファイル名から判定した年（extract_year_month_from_filename(..., guess_year=False) の結果。
+                ファイル名に年がない場合は None）
+            file_month: ファイル名から判定した月
+            detected: detect_period の結果
+
+        Returns:
+            (年, 月) のタプル。月を判定できない場合は (None, None)
+        """
+        detected_year, detected_month = detected if detected else (None, None)
+        if file_month:
+            if detected_year and detected_month == file_month:
+                return detected_year, file_month
+            return file_year or PdfParser.guess_year(file_month), file_month
+        if not detected_month:
+            return None, None
+        return detected_year or file_year or PdfParser.guess_year(detected_month), detected_month
+
+
+def parse_roster_file(filepath: str, filename: str, target_name: str,
+                      cache_dir: Optional[str] = None, cache_ttl: Optional[float] = None,
+                      rss_budget_mb: Optional[float] = None, collect_spans: bool = False) -> Dict[str, Any]:
+    """
+    アップロードされた1つのシフト表を解析（並列処理のワーカーから呼び出し可能）
+
+    ワーカープロセスで実行する場合は collect_spans=True を指定すると、処理段階ごとの計測結果
+    （pdf_open、pdf_extract_* など）を結果の 'stage_spans' に (段階名, 秒) のリストで返します
+    （ワーカーのメトリクスは親プロセスの /metrics に反映されないため、親で metrics.record_spans に渡します）。
+
+    Args:
+        filepath: 保存したPDFファイルのパス
+        filename: 元のファイル名（年月の判定に使用。判定できない場合はPDFの見出しを使用）
+        target_name: 検索対象の名前
+        cache_dir: ページ単位の抽出結果キャッシュのディレクトリ（省略時はキャッシュを使用しない）
+        cache_ttl: キャッシュの有効期間（秒）
+        rss_budget_mb: 解析中のプロセスのRSSの上限（MB、省略時は制限なし）
+
+    Returns:
+        {'filename', 'filepath', 'year', 'month', 'period_source', 'detected_period', 'shifts', 'page_hashes',
+         'reused_pages', 'peak_rss_mb', 'memory_exceeded', 'skipped_work', 'index_id', 'error'} の辞書。
+        period_source は年月の判定元（'filename' または 'content'）、detected_period は
+        1ページ目の見出しから検出した {'year', 'month'}（年が記載されていない場合 year は None）です。
+        cache_dir を指定した場合は、名前を変えて再検索するためのセルインデックスを保存し、
+        その識別子を index_id に設定します（retarget_roster を参照）。skipped_work は抽出方法の事前判定で
+        省いた処理の数です（PdfParser._empty_skipped_work を参照）
+    """
+    if not collect_spans:
+        return _parse_roster_file(filepath, filename, target_name, cache_dir, cache_ttl, rss_budget_mb)
+    token = begin_request_spans()
+    try:
+        result = _parse_roster_file(filepath, filename, target_name, cache_dir, cache_ttl, rss_budget_mb)
+    finally:
+        spans = end_request_spans(token)
+    result['stage_spans'] = spans
+    return result
+
+
+def _parse_roster_file(filepath: str, filename: str, target_name: str, cache_dir: Optional[str],
+                       cache_ttl: Optional[float], rss_budget_mb: Optional[float]) -> Dict[str, Any]:
+    parser = PdfParser(target_name)
+    result = {'filename': filename, 'filepath': filepath, 'year': None, 'month': None,
+              'period_source': None, 'detected_period': None, 'shifts': [], 'page_hashes': [],
+              'reused_pages': 0, 'peak_rss_mb': 0.0, 'memory_exceeded': False, 'skipped_work': {},
+              'index_id': None, 'error': None}
+    page_cache = None
+    index = None
+    if cache_dir:
+        page_cache = PageCache(cache_dir, cache_ttl)
+        index = CellIndex()
+
+    try:
+        result['shifts'] = parser.parse_pdf(filepath, page_cache, rss_budget_mb, index)
+        if index is not None:
+            result['index_id'] = _file_hash(filepath)
+            page_cache.set_index(result['index_id'], index.to_dict())
+    except MemoryBudgetExceeded as e:
+        logger.warning(f"{filename}: {e}")
+        result['memory_exceeded'] = True
+        result['error'] = 'PDFが大きすぎるため解析を中断しました。ページ数を減らして再度アップロードしてください。'
+        return result
+    finally:
+        result['page_hashes'], result['reused_pages'] = parser.page_hashes, parser.reused_pages
+        result['peak_rss_mb'] = parser.peak_rss_mb
+        result['skipped_work'] = dict(parser.skipped_work)
+
+    # ファイル名と、解析時に1ページ目の見出しから検出した年月を組み合わせる
+    if parser.detected_period:
+        result['detected_period'] = {'year': parser.detected_period[0], 'month': parser.detected_period[1]}
+    file_year, file_month = parser.extract_year_month_from_filename(filename, guess_year=False)
+    year, month = parser.resolve_period(file_year, file_month, parser.detected_period)
+    if month:
+        result['period_source'] = 'filename' if file_month else 'content'
+        logger.info(f"年月を判定: {year}年{month}月 (ファイル名: {filename}, 見出し: {parser.detected_period})")
+        result['year'], result['month'] = int(year), int(month)
+    elif result['shifts']:
+        result['error'] = 'ファイル名またはPDFの内容から年月を特定できませんでした。'
+    return result
+
+
+def _file_hash(filepath: str) -> str:
+    """ファイル内容のSHA-256を計算"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def retarget_roster(cache_dir: str, index_id: str, target_name: str,
+                    cache_ttl: Optional[float] = None) -> Optional[List[Dict[str, str]]]:
+    """
+    保存済みのセルインデックスから別の名前のシフト情報を抽出（PDFの再解析なし）
+
+    Args:
+        cache_dir: parse_roster_file に指定したキャッシュのディレクトリ
+        index_id: parse_roster_file の結果の index_id
+        target_name: 検索対象の名前
+        cache_ttl: キャッシュの有効期間（秒）
+
+    Returns:
+        シフト情報のリスト。インデックスが見つからない場合は None
+    """
+    data = PageCache(cache_dir, cache_ttl).get_index(index_id)
+    if data is None:
+        return None
+    with timed('retarget'):
+        return PdfParser(target_name).parse_cell_index(CellIndex.from_dict(data))
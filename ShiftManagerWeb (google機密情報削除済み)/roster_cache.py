@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Roster Cache Module - ページ単位の抽出結果キャッシュと差分集計
+
+シフト表PDFの各ページをコンテンツのハッシュで識別し、抽出結果（テーブルまたはテキスト）を
+ディスクに保存します。途中で差し替えられたシフト表を再アップロードした場合、
+内容が変わっていないページは保存済みの抽出結果を再利用し、変わったページだけを再抽出します。
+シフト表ごとのセルインデックス（cell_index.CellIndex）も同じディレクトリに保存します。
+"""
+
+import os
+import json
+import time
+import logging
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PageCache:
+    """ページ単位の抽出結果とシフト表ごとのセルインデックスのディスクキャッシュ"""
+
+    def __init__(self, cache_dir: str, ttl_seconds: Optional[float] = 30 * 24 * 3600):
+        """
+        初期化
+
+        Args:
+            cache_dir: キャッシュの保存先ディレクトリ
+            ttl_seconds: キャッシュの有効期間（秒）。None の場合は期限なし
+        """
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+
+    def _path(self, page_hash: str) -> str:
+        return os.path.join(self.cache_dir, page_hash[:2], f'{page_hash}.json')
+
+    def _index_path(self, roster_id: str) -> str:
+        return os.path.join(self.cache_dir, 'index', f'{roster_id}.json')
+
+    def _read(self, path: str) -> Any:
+        """JSONファイルを読み込む（未保存または期限切れの場合は None）"""
+        try:
+            if self.ttl_seconds is not None and time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                os.remove(path)
+                return None
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"キャッシュの読み込みに失敗しました: {e}")
+            return None
+
+    def _write(self, path: str, data: Any) -> None:
+        """JSONファイルを保存"""
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 並行して書き込まれても壊れたファイルを読まないよう、一時ファイルから置き換える
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"キャッシュの保存に失敗しました: {e}")
+
+    def get(self, page_hash: str) -> Optional[Tuple[str, Any]]:
+        """
+        保存済みの抽出結果を取得
+
+        Args:
+            page_hash: ページのコンテンツハッシュ
+
+        Returns:
+            (種類, 内容) のタプル。未保存または期限切れの場合は None
+        """
+        entry = self._read(self._path(page_hash))
+        if not isinstance(entry, list) or len(entry) != 2:
+            # 未保存・期限切れのほか、壊れたファイルも未保存として扱い、呼び出し側で抽出し直す
+            if entry is not None:
+                logger.warning(f"キャッシュの内容が不正なため無視します: {page_hash}")
+            return None
+        kind, content = entry
+        return kind, content
+
+    def set(self, page_hash: str, entry: Tuple[str, Any]) -> None:
+        """
+        抽出結果を保存
+
+        Args:
+            page_hash: ページのコンテンツハッシュ
+            entry: (種類, 内容) のタプル
+        """
+        self._write(self._path(page_hash), list(entry))
+
+    def get_index(self, roster_id: str) -> Optional[Dict[str, Any]]:
+        """
+        シフト表のセルインデックス（CellIndex.to_dict の結果）を取得
+
+        Args:
+            roster_id: シフト表の識別子（PDFファイルのハッシュ値）
+
+        Returns:
+            インデックスの辞書。未保存または期限切れの場合は None
+        """
+        return self._read(self._index_path(roster_id))
+
+    def set_index(self, roster_id: str, data: Dict[str, Any]) -> None:
+        """
+        シフト表のセルインデックスを保存
+
+        Args:
+            roster_id: シフト表の識別子（PDFファイルのハッシュ値）
+            data: CellIndex.to_dict の結果
+        """
+        self._write(self._index_path(roster_id), data)
+
+
+def diff_shifts(old_shifts: List[Dict[str, str]], new_shifts: List[Dict[str, str]]) -> Dict[str, List[Dict[str, str]]]:
+    """
+    前回と今回のシフトを比較
+
+    同じ日付で時間だけが変わったシフトは「変更」、それ以外は「追加」「削除」として集計します。
+
+    Args:
+        old_shifts: 前回のシフトリスト
+        new_shifts: 今回のシフトリスト
+
+    Returns:
+        {'added', 'removed', 'changed'} の辞書。changed の要素は {'date', 'old_time', 'new_time'}
+    """
+    old_keys = {(s['date'], s['time']) for s in old_shifts}
+    new_keys = {(s['date'], s['time']) for s in new_shifts}
+    added = [s for s in new_shifts if (s['date'], s['time']) not in old_keys]
+    removed = [s for s in old_shifts if (s['date'], s['time']) not in new_keys]
+
+    changed = []
+    removed_by_date = {}
+    for shift in removed:
+        removed_by_date.setdefault(shift['date'], []).append(shift)
+    remaining_added = []
+    for shift in added:
+        candidates = removed_by_date.get(shift['date'])
+        if candidates:
+            old = candidates.pop(0)
+            changed.append({'date': shift['date'], 'old_time': old['time'], 'new_time': shift['time']})
+        else:
+            remaining_added.append(shift)
+    remaining_removed = [s for shifts in removed_by_date.values() for s in shifts]
+
+    sort_key = lambda x: int(x['date'])
+    return {
+        'added': sorted(remaining_added, key=sort_key),
+        'removed': sorted(remaining_removed, key=sort_key),
+        'changed': sorted(changed, key=sort_key),
+    }
@@ -120,10 +120,9 @@ function initUploadPage() {
     const files = dt.files;
     
     if (files.length > 0) {
-      const file = files[0];
-      if (file.type === 'application/pdf') {
+      if (Array.from(files).every(file => file.type === 'application/pdf')) {
         fileInput.files = files;
-        handleFileSelect(file);
+        handleFileSelect(Array.from(files));
       } else {
         showNotification('PDFファイルのみアップロード可能です', 'error');
         resetDropArea();
@@ -137,7 +136,7 @@ function initUploadPage() {
         <i class="fas fa-cloud-upload-alt fa-4x text-primary mb-3"></i>
         <h4>PDFファイルをドラッグ&ドロップ</h4>
         <p class="text-muted">または<span class="text-primary">クリックしてファイルを選択</span></p>
-        <small class="text-muted">最大ファイルサイズ: 10MB</small>
+        <small class="text-muted">複数ファイル可（合計最大16MB）</small>
       </div>
     `;
   }
@@ -145,26 +144,26 @@ function initUploadPage() {
   // ファイル選択時の処理
   if (fileInput) {
     fileInput.addEventListener('change', function() {
-      const file = this.files[0];
-      if (file) {
-        handleFileSelect(file);
+      if (this.files.length > 0) {
+        handleFileSelect(Array.from(this.files));
       }
     });
   }
   
-  function handleFileSelect(file) {
-    if (file.type !== 'application/pdf') {
+  function handleFileSelect(files) {
+    if (files.some(file => file.type !== 'application/pdf')) {
       showNotification('PDFファイルのみアップロード可能です', 'error');
       return;
     }
     
-    if (file.size > 10 * 1024 * 1024) { // 10MB
-      showNotification('ファイルサイズが大きすぎます（最大10MB）', 'error');
+    const totalSize = files.reduce((sum, file) => sum + file.size, 0);
+    if (totalSize > 16 * 1024 * 1024) { // 16MB（合計）
+      showNotification('ファイルサイズが大きすぎます（合計最大16MB）', 'error');
       return;
     }
     
     // ファイル情報表示
-    displayFileInfo(file);
+    displayFileInfo(files);
     
     // アップロードボタン有効化
     if (uploadBtn) {
@@ -173,23 +172,24 @@ function initUploadPage() {
       uploadBtn.innerHTML = '<i class="fas fa-upload me-2"></i>アップロード開始';
     }
     
-    showNotification('ファイルが選択されました', 'success');
+    showNotification(`${files.length}件のファイルが選択されました`, 'success');
   }
   
-  function displayFileInfo(file) {
+  function displayFileInfo(files) {
     const fileInfo = document.getElementById('file-info');
     if (fileInfo) {
-      fileInfo.innerHTML = `
-        <div class="card border-success">
-          <div class="card-body">
-            <h6 class="card-title text-success">
-              <i class="fas fa-file-pdf me-2"></i>選択されたファイル
-            </h6>
+      const items = files.map(file => `
             <p class="card-text">
               <strong>ファイル名:</strong> ${file.name}<br>
               <strong>サイズ:</strong> ${formatFileSize(file.size)}<br>
               <strong>最終更新:</strong> ${formatDate(file.lastModified)}
-            </p>
+            </p>`).join('');
+      fileInfo.innerHTML = `
+        <div class="card border-success">
+          <div class="card-body">
+            <h6 class="card-title text-success">
+              <i class="fas fa-file-pdf me-2"></i>選択されたファイル（${files.length}件）
+            </h6>${items}
           </div>
         </div>
       `;
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Batch CLI Tests - ICSファイルの出力のテスト
+
+TZID が参照するタイムゾーンの定義（VTIMEZONE）を含み、75オクテットを超える行が
+UTF-8 の文字の途中で分割されずに折り返されることを確認します。
+
+使い方（ShiftManagerWeb ディレクトリで実行）:
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from batch_cli import IcsWriter
+
+
+class IcsWriterTest(unittest.TestCase):
+    def test_vtimezone_and_folding(self):
+        title = '図書館バイト📚' * 8
+        with tempfile.TemporaryDirectory() as output_dir:
+            writer = IcsWriter(output_dir, title, '図書館')
+            writer.write('瓜田', {'date': '3', 'time': '17:00-20:00'},
+                         datetime(2024, 2, 3, 17, 0), datetime(2024, 2, 3, 20, 0))
+            writer.close()
+            with open(os.path.join(output_dir, '瓜田.ics'), 'rb') as f:
+                data = f.read()
+
+        lines = data.split(b'\r\n')
+        self.assertTrue(all(len(line) <= 75 for line in lines))
+        unfolded = data.decode('utf-8').replace('\r\n ', '')
+        self.assertIn(f'SUMMARY:{title}\r\n', unfolded)
+        self.assertIn('BEGIN:VTIMEZONE\r\nTZID:Asia/Tokyo\r\n', unfolded)
+        self.assertIn('DTSTART;TZID=Asia/Tokyo:20240203T170000\r\n', unfolded)
+        self.assertTrue(unfolded.endswith('END:VCALENDAR\r\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
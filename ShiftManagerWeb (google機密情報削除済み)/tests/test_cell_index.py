@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Cell Index Tests - 照合用のテキスト正規化のテスト
+
+normalize_lines() の結果が、各行に normalize_text() を適用した結果と一致することを確認します。
+
+使い方（ShiftManagerWeb ディレクトリで実行）:
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from cell_index import normalize_lines, normalize_text
+
+
+class NormalizeLinesTest(unittest.TestCase):
+    def test_matches_normalize_text_per_line(self):
+        cases = [
+            '渡部　皓　1日（月） 13:00−18:00 山本　那奈香\n瓜　田　２日（火）　９：００～１７：００',
+            'ｳﾘﾀﾞ ｼﾌﾄ\tＡＢＣ ①②\n\n㍻３１年　㈱テスト',
+            'が゙ が ゛゜ 区切り\n𝟙𝟚日 𠮷田',
+            '',
+        ]
+        for text in cases:
+            with self.subTest(text=text):
+                expected = '\n'.join(normalize_text(line) for line in text.split('\n'))
+                self.assertEqual(normalize_lines(text), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Page Cache Tests - ページキャッシュが使えない場合の回帰テスト
+
+キャッシュの読み書きでエラーが発生しても解析を続け、各ページのハッシュ値（差分集計に使う
+self.page_hashes）がページと対応したまま記録されることを確認します。
+
+使い方（ShiftManagerWeb ディレクトリで実行）:
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+import pdfplumber
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from pdf_parser import PdfParser
+
+
+class _BrokenCache:
+    """読み書きのたびに例外を送出するキャッシュ"""
+
+    def get(self, key):
+        raise OSError('cache unavailable')
+
+    def set(self, key, entry):
+        raise OSError('cache unavailable')
+
+
+class PageCacheFailureTest(unittest.TestCase):
+    def test_hashes_recorded_when_cache_fails(self):
+        path = os.path.join(APP_DIR, 'uploads', 'R75.pdf')
+        with pdfplumber.open(path) as pdf:
+            page_count = len(pdf.pages)
+
+        parser = PdfParser('瓜田')
+        entries = list(parser.iter_pages(path, page_cache=_BrokenCache()))
+
+        self.assertEqual(len(entries), page_count)
+        self.assertEqual(len(parser.page_hashes), page_count)
+        self.assertTrue(all(parser.page_hashes))
+        self.assertEqual(parser.reused_pages, 0)
+        self.assertIsNotNone(parser.detected_period)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Roster Period Tests - 同梱のシフト表PDF（uploads/R62.pdf、uploads/R75.pdf）の年月判定の回帰テスト
+
+ファイル名の「R62」「R75」を令和62年・令和75年と読み違えず、令和6年2月・令和7年5月と判定することを確認します。
+年の推測は現在の日付に依存するため、現在の日付を固定して実行します。
+
+使い方（ShiftManagerWeb ディレクトリで実行）:
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+from datetime import datetime
+from unittest import mock
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import pdf_parser
+from pdf_parser import PdfParser, parse_roster_file
+
+
+class _FixedDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2026, 10, 19, 12, 0, 0)
+
+
+class RosterPeriodTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(pdf_parser, 'datetime', _FixedDatetime)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sample_pdfs(self):
+        for filename, expected in [('R62.pdf', (2024, 2)), ('R75.pdf', (2025, 5))]:
+            with self.subTest(filename=filename):
+                result = parse_roster_file(os.path.join(APP_DIR, 'uploads', filename), filename, '瓜田')
+                self.assertIsNone(result['error'])
+                self.assertTrue(result['shifts'])
+                self.assertEqual((result['year'], result['month']), expected)
+
+    def test_era_digits_followed_by_month(self):
+        parser = PdfParser('瓜田')
+        cases = {
+            'R62.pdf': (2024, 2),
+            'R75.pdf': (2025, 5),
+            'R612.pdf': (2024, 12),
+            'R7年5月.pdf': (2025, 5),
+            '令和7年12月.pdf': (2025, 12),
+            'シフト5月.pdf': (None, 5),
+        }
+        for filename, expected in cases.items():
+            with self.subTest(filename=filename):
+                self.assertEqual(parser.extract_year_month_from_filename(filename, guess_year=False), expected)
+
+    def test_rejects_far_filename_year(self):
+        parser = PdfParser('瓜田')
+        self.assertEqual(parser.extract_year_month_from_filename('R50年1月.pdf', guess_year=False), (None, 1))
+        self.assertEqual(parser.resolve_period(None, None, (None, 2)), (2026, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Warmup Module - ワーカー起動前に読み取り専用の共有状態を準備するモジュール
+
+gunicorn を preload_app で起動した場合、マスタープロセスで一度だけ以下を読み込み、
+fork したワーカーからコピーオンライトで共有します。
+
+- 正規表現のコンパイル結果（PdfParser・CellIndex で使うパターン）
+- Calendar APIのディスカバリードキュメント
+- pdfminer の日本語CMap（シフト表PDFのフォントで使用）
+- Jinja2 テンプレートのコンパイル結果
+"""
+
+import gc
+import re
+import time
+import logging
+
+from pdfminer.cmapdb import CMapDB
+
+from pdf_parser import PdfParser
+
+logger = logging.getLogger(__name__)
+
+# シフト表PDFで使われる日本語フォントのCMap
+WARM_CMAPS = ('UniJIS-UCS2-H', 'UniJIS-UTF16-H', '90ms-RKSJ-H')
+WARM_UNICODE_MAPS = ('Adobe-Japan1',)
+
+
+def _warm_patterns() -> None:
+    """解析で使う正規表現を re モジュールのキャッシュに登録"""
+    patterns = [
+        PdfParser.TIME_PATTERN,
+        r'(\d{1,2})日',
+        r'(\d{1,2})\s*[\(（]',
+        r'(\d{1,2})時\s*[‐\-~〜～－]\s*(\d{1,2})時',
+        r'(\d{1,2}):(\d{2})\s*[‐\-~〜～]\s*(\d{1,2}):(\d{2})',
+        r'(?<!\d)(\d{1,2})月',
+    ]
+    patterns.extend(pattern for pattern, _ in PdfParser.PERIOD_PATTERNS)
+    for pattern in patterns:
+        re.compile(pattern)
+
+
+def _warm_cmaps() -> None:
+    """pdfminer のCMapを読み込み、クラス変数のキャッシュに保持させる"""
+    for name in WARM_CMAPS:
+        try:
+            CMapDB.get_cmap(name)
+        except CMapDB.CMapNotFound:
+            logger.debug(f"CMapが見つかりません: {name}")
+    for name in WARM_UNICODE_MAPS:
+        for vertical in (False, True):
+            try:
+                CMapDB.get_unicode_map(name, vertical)
+            except CMapDB.CMapNotFound:
+                logger.debug(f"Unicodeマップが見つかりません: {name}")
+
+
+def _warm_templates(app) -> None:
+    """全テンプレートをコンパイルしてJinja2のキャッシュに保持させる"""
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+
+
+def warm_shared_state(app, freeze: bool = True) -> None:
+    """
+    ワーカー間で共有する読み取り専用の状態を準備
+
+    Args:
+        app: Flaskアプリケーション
+        freeze: 準備したオブジェクトをガベージコレクションの対象外にする（gc.freeze）。
+            ワーカーでGCが走ったときに共有メモリのページが書き換えられてコピーされるのを防ぎます
+    """
+    from app import get_calendar_discovery_doc
+
+    start = time.perf_counter()
+    _warm_patterns()
+    get_calendar_discovery_doc()
+    _warm_cmaps()
+    _warm_templates(app)
+    if freeze:
+        gc.collect()
+        gc.freeze()
+    logger.info(f"共有状態の準備が完了しました（{(time.perf_counter() - start) * 1000:.0f}ms）")
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Centroid Search Module - クラスタ中心や任意のベクトルに近い発言を検索するモジュール
+
+分散表現の各行のノルムを一度だけ計算し、クラスタ中心（*11cluster_centers.npy）や検索ベクトルとの
+コサイン類似度をブロック単位の行列積でまとめて計算します。上位k件は全件の並べ替えではなく
+np.argpartition で選ぶため、クラスタ数や検索回数が増えても全データの argsort を繰り返しません。
+
+使い方（ノートブック）:
+    from embeddings import ensure_embeddings
+    from centroid_search import CentroidSearch
+
+    store = ensure_embeddings('Cyber/Cyber_vecs.csv', labels_csv='Cyber/Cyber11cullabels.csv')
+    vectors, labels = store.aligned()
+    search = CentroidSearch(vectors, np.load('Cyber/Cyber11cluster_centers.npy'), labels)
+    for cluster_id, (indices, similarities) in search.top_k_per_cluster(10).items():
+        ...
+"""
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# 一度に行列積を計算する行数（4096次元の float32 で約64MB）
+BLOCK_ROWS = 4096
+
+
+def row_norms(vectors: np.ndarray, block_rows: int = BLOCK_ROWS) -> np.ndarray:
+    """
+    各行のL2ノルムをブロック単位で計算
+
+    Args:
+        vectors: (行数, 次元数) の分散表現（メモリマップ可）
+        block_rows: 一度に読み込む行数
+
+    Returns:
+        (行数,) の float32 配列
+    """
+    norms = np.empty(len(vectors), dtype=np.float32)
+    for start in range(0, len(vectors), block_rows):
+        block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+        norms[start:start + len(block)] = np.linalg.norm(block, axis=1)
+    return norms
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    """行ごとにL2正規化した float32 の配列を返す（ノルムが0の行は0のまま）"""
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    スコアの大きい順に上位k件を取得
+
+    Args:
+        scores: (件数,) のスコア
+        k: 取得する件数
+
+    Returns:
+        (位置, スコア) のタプル（スコアの降順）
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=scores.dtype)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    order = candidates[np.argsort(-scores[candidates], kind='stable')]
+    return order, scores[order]
+
+
+class CentroidSearch:
+    """クラスタ中心・検索ベクトルとのコサイン類似度で発言を検索するクラス"""
+
+    def __init__(self, vectors: np.ndarray, centers: np.ndarray, labels: Optional[np.ndarray] = None,
+                 block_rows: int = BLOCK_ROWS):
+        """
+        初期化（各行のノルムをここで一度だけ計算します）
+
+        Args:
+            vectors: (行数, 次元数) の分散表現（EmbeddingStore.vectors などのメモリマップ可）
+            centers: (クラスタ数, 次元数) のクラスタ中心
+            labels: 行ごとのクラスタ番号（省略時は最も類似度の高い中心をクラスタとみなす）
+            block_rows: 一度に行列積を計算する行数
+        """
+        self.vectors = vectors
+        self.centers = normalize(centers)
+        self.block_rows = block_rows
+        self.norms = row_norms(vectors, block_rows)
+        self._center_scores: Optional[np.ndarray] = None
+        if labels is not None:
+            labels = np.asarray(labels).reshape(-1)[:len(vectors)]
+            if len(labels) != len(vectors):
+                raise ValueError(f"ラベルの行数（{len(labels)}）が分散表現の行数（{len(vectors)}）より少なくなっています")
+        self._labels = labels
+
+    def similarities(self, queries: np.ndarray) -> np.ndarray:
+        """
+        全行と検索ベクトルのコサイン類似度をブロック単位の行列積で計算
+
+        Args:
+            queries: (件数, 次元数) または (次元数,) の検索ベクトル
+
+        Returns:
+            (行数, 件数) の float32 配列
+        """
+        queries = normalize(queries)
+        result = np.empty((len(self.vectors), len(queries)), dtype=np.float32)
+        safe_norms = np.where(self.norms == 0, 1, self.norms)
+        for start in range(0, len(self.vectors), self.block_rows):
+            block = np.asarray(self.vectors[start:start + self.block_rows], dtype=np.float32)
+            stop = start + len(block)
+            result[start:stop] = (block @ queries.T) / safe_norms[start:stop, None]
+        return result
+
+    @property
+    def center_scores(self) -> np.ndarray:
+        """(行数, クラスタ数) のクラスタ中心とのコサイン類似度（初回に一度だけ計算）"""
+        if self._center_scores is None:
+            self._center_scores = self.similarities(self.centers)
+        return self._center_scores
+
+    @property
+    def labels(self) -> np.ndarray:
+        """行ごとのクラスタ番号"""
+        if self._labels is None:
+            self._labels = np.argmax(self.center_scores, axis=1)
+        return self._labels
+
+    def top_k_per_cluster(self, k: int = 10) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        """
+        クラスタごとに、所属する発言の中から中心に近い順に上位k件を取得
+
+        Args:
+            k: クラスタごとの件数
+
+        Returns:
+            クラスタ番号 -> (行番号, 類似度) の辞書（類似度の降順）
+        """
+        scores = self.center_scores
+        labels = self.labels
+        result = {}
+        for cluster_id in range(len(self.centers)):
+            members = np.flatnonzero(labels == cluster_id)
+            positions, values = top_k(scores[members, cluster_id], k)
+            result[cluster_id] = (members[positions], values)
+        return result
+
+    def search(self, query: np.ndarray, k: int = 10, cluster: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        任意のベクトルに近い発言を検索
+
+        Args:
+            query: (次元数,) の検索ベクトル（同じモデルで作成した分散表現）
+            k: 取得する件数
+            cluster: 指定した場合はこのクラスタに所属する発言だけを対象にする
+
+        Returns:
+            (行番号, 類似度) のタプル（類似度の降順）
+        """
+        scores = self.similarities(query)[:, 0]
+        if cluster is None:
+            return top_k(scores, k)
+        members = np.flatnonzero(self.labels == cluster)
+        positions, values = top_k(scores[members], k)
+        return members[positions], values
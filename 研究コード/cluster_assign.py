@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Cluster Assign Module - 新しい発言を保存済みのクラスタ中心に割り当てるモジュール
+
+K-means の結果（*11cluster_centers.npy と *11cullabels.csv）を固定したまま、新しく作成した分散表現を
+ブロック単位の行列積で最も近い（ユークリッド距離）クラスタ中心に割り当て、ラベルを分散表現の
+.labels.npy に追記します。必要に応じてミニバッチ K-means と同じ更新式でクラスタ中心を少しずつ更新し、
+元のクラスタリングからのずれ（ドリフト）を集計して、全件を再クラスタリングすべきかどうかを判定します。
+
+割り当ての状態（現在のクラスタ中心、クラスタごとの件数、元のデータでの中心までの距離の分布、
+追加した発言の集計）はクラスタ中心と同じ場所の *.incremental.npz に保存します。
+
+使い方（研究コード ディレクトリで実行）:
+    # 分散表現の .labels.npy より後ろの行（ラベルのない行）を割り当てる
+    python cluster_assign.py BERT/BERT_vecs BERT/BERT11cluster_centers.npy
+    # 別に作成した分散表現を割り当て、クラスタ中心も更新する
+    python cluster_assign.py BERT/BERT_vecs BERT/BERT11cluster_centers.npy --new BERT/BERT_vecs_2023 --update-centers
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from embeddings import EmbeddingStore, open_embeddings, write_atomic_json
+
+logger = logging.getLogger(__name__)
+
+# 一度に距離を計算する行数（4096次元の float32 で約64MB）
+BLOCK_ROWS = 4096
+# 元のデータで「中心から遠い」とみなす距離のパーセンタイル
+OUTLIER_PERCENTILE = 95.0
+# 再クラスタリングを勧める基準
+DRIFT_THRESHOLDS = {
+    # クラスタの割合の変化（Population Stability Index）
+    'psi': 0.25,
+    # 元のデータの95パーセンタイルより中心から遠い発言の割合（元のデータでは約5%）
+    'outlier_rate': 0.10,
+    # 中心までの平均距離の比（追加した発言 / 元のデータ）
+    'distance_ratio': 1.2,
+    # クラスタ中心の移動量（元のデータの中心までの平均距離に対する比）
+    'center_shift': 0.25,
+}
+
+
+def state_path_for(centers_path: str) -> str:
+    """クラスタ中心のパスから状態ファイルのパスを作成（例: BERT/BERT11cluster_centers.incremental.npz）"""
+    return os.path.splitext(centers_path)[0] + '.incremental.npz'
+
+
+def assign(vectors: np.ndarray, centers: np.ndarray,
+           block_rows: int = BLOCK_ROWS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    各行を最も近いクラスタ中心に割り当てる（K-means の predict と同じユークリッド距離）
+
+    ||x - c||^2 = ||x||^2 - 2 x・c + ||c||^2 をブロック単位の行列積で計算するため、
+    (行数, クラスタ数, 次元数) の差分の配列は作りません。
+
+    Args:
+        vectors: (行数, 次元数) の分散表現（メモリマップ可）
+        centers: (クラスタ数, 次元数) のクラスタ中心
+        block_rows: 一度に読み込む行数
+
+    Returns:
+        (クラスタ番号 int16, 中心までの距離 float32) のタプル
+    """
+    centers = np.asarray(centers, dtype=np.float32)
+    center_sq = np.einsum('ij,ij->i', centers, centers)
+    labels = np.empty(len(vectors), dtype=np.int16)
+    distances = np.empty(len(vectors), dtype=np.float32)
+    for start in range(0, len(vectors), block_rows):
+        block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+        stop = start + len(block)
+        sq = np.einsum('ij,ij->i', block, block)[:, None] - 2 * (block @ centers.T) + center_sq
+        nearest = np.argmin(sq, axis=1)
+        labels[start:stop] = nearest
+        distances[start:stop] = np.sqrt(np.maximum(sq[np.arange(len(block)), nearest], 0))
+    return labels, distances
+
+
+def distances_to(vectors: np.ndarray, centers: np.ndarray, labels: np.ndarray,
+                 block_rows: int = BLOCK_ROWS) -> np.ndarray:
+    """各行から指定したクラスタの中心までの距離（保存済みのラベルでの距離の分布に使用）"""
+    centers = np.asarray(centers, dtype=np.float32)
+    distances = np.empty(len(vectors), dtype=np.float32)
+    for start in range(0, len(vectors), block_rows):
+        block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+        stop = start + len(block)
+        distances[start:stop] = np.linalg.norm(block - centers[labels[start:stop]], axis=1)
+    return distances
+
+
+def population_stability(expected: np.ndarray, actual: np.ndarray, eps: float = 1e-4) -> float:
+    """クラスタの割合の変化（Population Stability Index。0.1未満は変化なし、0.25以上は大きな変化の目安）"""
+    expected = np.maximum(np.asarray(expected, dtype=np.float64), eps)
+    actual = np.maximum(np.asarray(actual, dtype=np.float64), eps)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+class IncrementalClusters:
+    """保存済みのクラスタ中心への割り当てと、元のクラスタリングからのずれの集計"""
+
+    def __init__(self, centers: np.ndarray, reference: Dict[str, np.ndarray],
+                 counts: Optional[np.ndarray] = None, added: Optional[Dict[str, np.ndarray]] = None,
+                 history: Optional[List[Dict[str, Any]]] = None):
+        """
+        初期化
+
+        Args:
+            centers: 現在のクラスタ中心
+            reference: 元のデータの集計（'centers'、'counts'、'mean_distance'、'outlier_distance'）
+            counts: クラスタごとの累計件数（中心の更新の重みに使用。省略時は元のデータの件数）
+            added: 追加した発言の集計（'counts'、'distance_sum'、'outliers'）
+            history: 追加した分散表現の記録
+        """
+        n_clusters = len(centers)
+        self.centers = np.array(centers, dtype=np.float64)
+        self.reference = reference
+        self.counts = np.array(reference['counts'] if counts is None else counts, dtype=np.int64)
+        self.added = added or {
+            'counts': np.zeros(n_clusters, dtype=np.int64),
+            'distance_sum': np.zeros(n_clusters, dtype=np.float64),
+            'outliers': np.zeros(n_clusters, dtype=np.int64),
+        }
+        self.history = history or []
+
+    @property
+    def n_clusters(self) -> int:
+        return len(self.centers)
+
+    @classmethod
+    def from_reference(cls, vectors: np.ndarray, centers: np.ndarray, labels: Optional[np.ndarray] = None,
+                       block_rows: int = BLOCK_ROWS) -> 'IncrementalClusters':
+        """
+        元のデータとクラスタ中心から作成
+
+        Args:
+            vectors: 元のデータの分散表現
+            centers: K-means のクラスタ中心
+            labels: 元のデータのクラスタ番号（省略時は最も近い中心）
+            block_rows: 一度に読み込む行数
+
+        Returns:
+            IncrementalClusters
+        """
+        centers = np.asarray(centers, dtype=np.float64)
+        n_clusters = len(centers)
+        if labels is None:
+            labels, distances = assign(vectors, centers, block_rows)
+        else:
+            labels = np.asarray(labels[:len(vectors)], dtype=np.int64)
+            distances = distances_to(vectors, centers, labels, block_rows)
+        counts = np.bincount(labels, minlength=n_clusters).astype(np.int64)
+        mean_distance = np.zeros(n_clusters, dtype=np.float64)
+        outlier_distance = np.full(n_clusters, np.inf)
+        for cluster_id in range(n_clusters):
+            members = distances[labels == cluster_id]
+            if len(members):
+                mean_distance[cluster_id] = members.mean()
+                outlier_distance[cluster_id] = np.percentile(members, OUTLIER_PERCENTILE)
+        reference = {
+            'centers': centers.copy(),
+            'counts': counts,
+            'mean_distance': mean_distance,
+            'outlier_distance': outlier_distance,
+        }
+        return cls(centers, reference)
+
+    @classmethod
+    def load(cls, path: str) -> 'IncrementalClusters':
+        """状態ファイルから読み込み"""
+        with np.load(path) as data:
+            reference = {key[len('reference_'):]: data[key] for key in data.files if key.startswith('reference_')}
+            added = {key[len('added_'):]: data[key] for key in data.files if key.startswith('added_')}
+            history = json.loads(str(data['history']))
+            return cls(data['centers'], reference, data['counts'], added, history)
+
+    def save(self, path: str) -> None:
+        """状態ファイルに保存（一時ファイルに書き込んでから置き換える）"""
+        arrays = {'centers': self.centers, 'counts': self.counts,
+                  'history': np.array(json.dumps(self.history, ensure_ascii=False))}
+        arrays.update({'reference_' + key: value for key, value in self.reference.items()})
+        arrays.update({'added_' + key: value for key, value in self.added.items()})
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    def partial_fit(self, vectors: np.ndarray, update_centers: bool = False,
+                    block_rows: int = BLOCK_ROWS) -> np.ndarray:
+        """
+        新しい発言をクラスタに割り当て、ずれの集計に加える
+
+        update_centers を指定した場合は、ブロックごとにミニバッチ K-means と同じく
+        クラスタ中心を「これまでの件数で重み付けした平均」に更新します（元のデータの件数も重みに含むため、
+        少数の追加で中心が大きく動くことはありません）。
+
+        Args:
+            vectors: (行数, 次元数) の新しい分散表現（メモリマップ可）
+            update_centers: クラスタ中心を更新するかどうか
+            block_rows: 一度に読み込む行数
+
+        Returns:
+            (行数,) のクラスタ番号（int16）
+        """
+        labels = np.empty(len(vectors), dtype=np.int16)
+        for start in range(0, len(vectors), block_rows):
+            block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+            block_labels, distances = assign(block, self.centers, block_rows)
+            labels[start:start + len(block)] = block_labels
+
+            block_counts = np.bincount(block_labels, minlength=self.n_clusters)
+            self.added['counts'] += block_counts
+            self.added['distance_sum'] += np.bincount(block_labels, weights=distances, minlength=self.n_clusters)
+            far = distances > self.reference['outlier_distance'][block_labels]
+            self.added['outliers'] += np.bincount(block_labels[far], minlength=self.n_clusters)
+
+            self.counts += block_counts
+            if update_centers:
+                for cluster_id in np.flatnonzero(block_counts):
+                    members = block[block_labels == cluster_id]
+                    step = (members.sum(axis=0, dtype=np.float64)
+                            - len(members) * self.centers[cluster_id]) / self.counts[cluster_id]
+                    self.centers[cluster_id] += step
+        return labels
+
+    def drift(self) -> Dict[str, Any]:
+        """
+        追加した発言と元のクラスタリングとのずれを集計
+
+        Returns:
+            各指標、クラスタごとの値、再クラスタリングを勧めるかどうか（'needs_recluster'）と理由の辞書
+        """
+        added = self.added
+        n_added = int(added['counts'].sum())
+        reference_share = self.reference['counts'] / max(int(self.reference['counts'].sum()), 1)
+        report: Dict[str, Any] = {'added': n_added, 'needs_recluster': False, 'reasons': []}
+
+        shift = np.linalg.norm(self.centers - self.reference['centers'], axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            relative_shift = np.where(self.reference['mean_distance'] > 0,
+                                      shift / self.reference['mean_distance'], 0.0)
+            added_mean = np.where(added['counts'] > 0, added['distance_sum'] / added['counts'], np.nan)
+        report['clusters'] = [
+            {
+                'cluster': cluster_id,
+                'reference_share': float(reference_share[cluster_id]),
+                'added_share': float(added['counts'][cluster_id] / n_added) if n_added else None,
+                'mean_distance_ratio': (float(added_mean[cluster_id] / self.reference['mean_distance'][cluster_id])
+                                        if added['counts'][cluster_id] and self.reference['mean_distance'][cluster_id]
+                                        else None),
+                'outlier_rate': (float(added['outliers'][cluster_id] / added['counts'][cluster_id])
+                                 if added['counts'][cluster_id] else None),
+                'center_shift': float(relative_shift[cluster_id]),
+            }
+            for cluster_id in range(self.n_clusters)
+        ]
+        report['center_shift'] = float(relative_shift.max()) if self.n_clusters else 0.0
+        if n_added == 0:
+            report.update({'psi': 0.0, 'outlier_rate': 0.0, 'distance_ratio': 1.0})
+        else:
+            reference_mean = float(np.dot(reference_share, self.reference['mean_distance']))
+            report['psi'] = population_stability(reference_share, added['counts'] / n_added)
+            report['outlier_rate'] = float(added['outliers'].sum() / n_added)
+            report['distance_ratio'] = (float(added['distance_sum'].sum() / n_added / reference_mean)
+                                        if reference_mean else 1.0)
+
+        for name, threshold in DRIFT_THRESHOLDS.items():
+            if report[name] > threshold:
+                report['reasons'].append(f"{name}={report[name]:.3f} > {threshold}")
+        report['needs_recluster'] = bool(report['reasons'])
+        return report
+
+
+def append_labels(store: EmbeddingStore, labels: np.ndarray, source: str) -> Dict[str, Any]:
+    """
+    分散表現の .labels.npy にラベルを追記し、メタデータのラベル情報を更新
+
+    Args:
+        store: ラベルを追記する分散表現
+        labels: 追記するクラスタ番号
+        source: ラベルの作成元（メタデータに記録）
+
+    Returns:
+        更新後のラベルのメタデータ
+    """
+    labels_path = store.paths['labels']
+    existing = np.load(labels_path) if os.path.exists(labels_path) else np.empty(0, dtype=np.int16)
+    combined = np.concatenate([existing.astype(np.int16), np.asarray(labels, dtype=np.int16)])
+    tmp_path = labels_path + '.tmp.npy'
+    np.save(tmp_path, combined)
+    os.replace(tmp_path, labels_path)
+
+    meta = dict(store.meta)
+    labels_meta = dict(meta.get('labels') or {})
+    labels_meta.update({
+        'rows': int(len(combined)),
+        'aligned_rows': int(min(len(combined), len(store))),
+        'n_clusters': int(combined.max()) + 1 if len(combined) else 0,
+        'appended': labels_meta.get('appended', []) + [{'source': source, 'rows': int(len(labels))}],
+    })
+    meta['labels'] = labels_meta
+    write_atomic_json(store.paths['meta'], meta)
+    return labels_meta
+
+
+def unlabeled_rows(store: EmbeddingStore) -> int:
+    """ラベルのない行の先頭の行番号（.labels.npy の行数）"""
+    labels = store.labels
+    return 0 if labels is None else min(len(labels), len(store))
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description='新しい発言の分散表現を保存済みのクラスタ中心に割り当てます')
+    arg_parser.add_argument('reference', help='K-means に使用した分散表現のベースパス（例: BERT/BERT_vecs）')
+    arg_parser.add_argument('centers', help='クラスタ中心の .npy（例: BERT/BERT11cluster_centers.npy）')
+    arg_parser.add_argument('--new', help='割り当てる分散表現のベースパス（省略時は reference のラベルのない行）')
+    arg_parser.add_argument('--update-centers', action='store_true', help='ミニバッチの更新式でクラスタ中心を更新')
+    arg_parser.add_argument('--state', help='状態ファイル（省略時はクラスタ中心と同じ場所の *.incremental.npz）')
+    arg_parser.add_argument('--block-rows', type=int, default=BLOCK_ROWS, help='一度に読み込む行数')
+    args = arg_parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+    state_path = args.state or state_path_for(args.centers)
+    reference = open_embeddings(args.reference)
+    if os.path.exists(state_path):
+        clusters = IncrementalClusters.load(state_path)
+    else:
+        vectors, labels = reference.aligned()
+        logger.info(f"元のデータ（{len(vectors)}行）からクラスタごとの距離の分布を集計します")
+        clusters = IncrementalClusters.from_reference(vectors, np.load(args.centers), labels, args.block_rows)
+
+    target = open_embeddings(args.new) if args.new else reference
+    start = unlabeled_rows(target)
+    rows = len(target) - start
+    if rows <= 0:
+        logger.info(f"{target.base}: ラベルのない行はありません")
+    else:
+        began = time.perf_counter()
+        labels = clusters.partial_fit(target.vectors[start:], args.update_centers, args.block_rows)
+        append_labels(target, labels, os.path.basename(args.centers))
+        clusters.history.append({
+            'store': target.base,
+            'start': start,
+            'rows': rows,
+            'update_centers': args.update_centers,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        })
+        clusters.save(state_path)
+        logger.info(f"{target.base}: {rows}行を割り当てました（{time.perf_counter() - began:.1f}秒）")
+
+    report = clusters.drift()
+    if report['needs_recluster']:
+        logger.warning(f"元のクラスタリングからのずれが大きいため、全件の再クラスタリングを推奨します: {', '.join(report['reasons'])}")
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
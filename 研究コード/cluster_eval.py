@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Cluster Evaluation Module - シルエット係数でクラスタ数を評価するモジュール
+
+シルエット係数は全点間の距離を使うため、16,537件・768〜4096次元では距離行列だけで数GBになります。
+本モジュールは距離を一定の行数ずつ計算してクラスタごとの距離の合計だけを保持するため、
+距離行列全体を作りません。さらにクラスタごとの層化抽出で選んだ点のシルエット値から
+全体の平均と信頼区間を推定し、複数のクラスタ数（k）を複数プロセスで並列に評価します。
+
+使い方（研究コード ディレクトリで実行）:
+    python cluster_eval.py BERT/BERT_vecs.npy --k-min 2 --k-max 29 --sample 3000 --output BERT/silhouette.csv
+"""
+
+import os
+import sys
+import csv
+import math
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 一度に距離を計算する行数（16,537件なら 1024 x 16,537 の float32 で約64MB）
+CHUNK_ROWS = 1024
+# 信頼区間（95%）の係数
+Z_95 = 1.959964
+
+
+def silhouette_samples_chunked(vectors: np.ndarray, labels: np.ndarray, rows: Optional[np.ndarray] = None,
+                               chunk_rows: int = CHUNK_ROWS) -> np.ndarray:
+    """
+    指定した点のシルエット値を、距離行列全体を作らずに計算
+
+    rows の各点について全点とのユークリッド距離を chunk_rows 行ずつ計算し、
+    クラスタごとの距離の合計（距離 × クラスタの one-hot 行列）だけを残します。
+    定義は sklearn.metrics.silhouette_samples と同じで、1点だけのクラスタの点は 0 になります。
+
+    Args:
+        vectors: (点数, 次元数) の分散表現（メモリマップ可）
+        labels: (点数,) のクラスタ番号
+        rows: シルエット値を計算する点の行番号（省略時は全点）
+        chunk_rows: 一度に距離を計算する行数
+
+    Returns:
+        rows の各点のシルエット値
+    """
+    labels = np.asarray(labels)
+    clusters, codes = np.unique(labels, return_inverse=True)
+    n_clusters = len(clusters)
+    if n_clusters < 2:
+        raise ValueError('シルエット係数の計算には2つ以上のクラスタが必要です')
+    rows = np.arange(len(labels)) if rows is None else np.asarray(rows)
+
+    data = np.asarray(vectors, dtype=np.float32)
+    sq_norms = np.einsum('ij,ij->i', data, data, dtype=np.float64)
+    onehot = np.zeros((len(labels), n_clusters), dtype=np.float64)
+    onehot[np.arange(len(labels)), codes] = 1.0
+    sizes = onehot.sum(axis=0)
+
+    result = np.empty(len(rows), dtype=np.float64)
+    for start in range(0, len(rows), chunk_rows):
+        chunk = rows[start:start + chunk_rows]
+        sq = sq_norms[chunk, None] + sq_norms[None, :] - 2.0 * (data[chunk] @ data.T)
+        distances = np.sqrt(np.maximum(sq, 0.0))
+        # 自分自身との距離は丸め誤差で0にならない場合があるため0にする
+        distances[np.arange(len(chunk)), chunk] = 0.0
+        sums = distances @ onehot
+
+        own = codes[chunk]
+        own_sizes = sizes[own]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            a = sums[np.arange(len(chunk)), own] / (own_sizes - 1)
+            means = sums / sizes
+        means[np.arange(len(chunk)), own] = np.inf
+        b = means.min(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            s = (b - a) / np.maximum(a, b)
+        s[own_sizes <= 1] = 0.0
+        result[start:start + len(chunk)] = np.nan_to_num(s)
+    return result
+
+
+def stratified_sample(labels: np.ndarray, n_samples: int, rng: np.random.Generator) -> Dict[int, np.ndarray]:
+    """
+    クラスタごとの大きさに比例して点を抽出（各クラスタ最低2点、クラスタより多くは抽出しない）
+
+    Args:
+        labels: (点数,) のクラスタ番号
+        n_samples: 抽出する点数の目安
+        rng: 乱数生成器
+
+    Returns:
+        クラスタ番号 -> 抽出した行番号 の辞書
+    """
+    labels = np.asarray(labels)
+    total = len(labels)
+    sample = {}
+    for cluster in np.unique(labels):
+        members = np.flatnonzero(labels == cluster)
+        size = max(min(2, len(members)), int(round(n_samples * len(members) / total)))
+        size = min(size, len(members))
+        sample[int(cluster)] = np.sort(rng.choice(members, size=size, replace=False))
+    return sample
+
+
+def estimate_silhouette(vectors: np.ndarray, labels: np.ndarray, n_samples: Optional[int] = None,
+                        seed: int = 0, chunk_rows: int = CHUNK_ROWS) -> Dict[str, float]:
+    """
+    シルエット係数（全点の平均）を層化抽出で推定
+
+    抽出した点のシルエット値は全点との距離から正確に計算し、クラスタを層とする層化抽出の
+    推定量（有限母集団修正あり）で平均と95%信頼区間を求めます。n_samples を省略するか
+    点数以上を指定した場合は全点で計算し、信頼区間の幅は0になります。
+
+    Args:
+        vectors: (点数, 次元数) の分散表現
+        labels: (点数,) のクラスタ番号
+        n_samples: 抽出する点数
+        seed: 乱数のシード
+        chunk_rows: 一度に距離を計算する行数
+
+    Returns:
+        {'score', 'ci_low', 'ci_high', 'stderr', 'n_sampled'} の辞書
+    """
+    labels = np.asarray(labels)
+    total = len(labels)
+    if not n_samples or n_samples >= total:
+        strata = {int(c): np.flatnonzero(labels == c) for c in np.unique(labels)}
+    else:
+        strata = stratified_sample(labels, n_samples, np.random.default_rng(seed))
+
+    rows = np.concatenate(list(strata.values()))
+    values = silhouette_samples_chunked(vectors, labels, rows, chunk_rows)
+
+    score = 0.0
+    variance = 0.0
+    offset = 0
+    for cluster, members in strata.items():
+        n_h = len(members)
+        s_h = values[offset:offset + n_h]
+        offset += n_h
+        population = int(np.sum(labels == cluster))
+        weight = population / total
+        score += weight * s_h.mean()
+        if n_h > 1 and n_h < population:
+            variance += weight ** 2 * s_h.var(ddof=1) / n_h * (1 - n_h / population)
+    stderr = math.sqrt(variance)
+    return {'score': float(score), 'ci_low': float(score - Z_95 * stderr), 'ci_high': float(score + Z_95 * stderr),
+            'stderr': stderr, 'n_sampled': int(len(rows))}
+
+
+def _load_vectors(vectors_path: str) -> np.ndarray:
+    return np.load(vectors_path, mmap_mode='r')
+
+
+def evaluate_k(vectors_path: str, k: int, n_samples: Optional[int] = None, seed: int = 0,
+               max_iter: int = 1000, n_init: int = 10, threads: Optional[int] = None) -> Dict[str, float]:
+    """
+    1つのクラスタ数で K-means を実行してシルエット係数を推定（ワーカープロセスから呼び出し可能）
+
+    Args:
+        vectors_path: 分散表現の .npy（embeddings.py で変換したもの）
+        k: クラスタ数
+        n_samples: シルエット係数の推定に使う点数（省略時は全点）
+        seed: K-means と抽出の乱数のシード
+        max_iter: K-means の最大反復回数（ノートブックと同じ1000）
+        n_init: K-means の初期値を変えて実行する回数（ノートブックと同じ10）
+        threads: このプロセスで使うBLAS・OpenMPのスレッド数（並列実行時の過剰なスレッドを防ぐ）
+
+    Returns:
+        {'k', 'score', 'ci_low', 'ci_high', 'stderr', 'n_sampled', 'inertia', 'seconds'} の辞書
+    """
+    from sklearn.cluster import KMeans
+    from threadpoolctl import threadpool_limits
+
+    start = time.perf_counter()
+    vectors = np.asarray(_load_vectors(vectors_path), dtype=np.float32)
+    with threadpool_limits(limits=threads):
+        kmeans = KMeans(n_clusters=k, max_iter=max_iter, n_init=n_init, random_state=seed)
+        labels = kmeans.fit_predict(vectors)
+        result = estimate_silhouette(vectors, labels, n_samples, seed)
+    result.update({'k': k, 'inertia': float(kmeans.inertia_), 'seconds': time.perf_counter() - start})
+    return result
+
+
+def evaluate_range(vectors_path: str, ks: Sequence[int], n_samples: Optional[int] = None, seed: int = 0,
+                   jobs: Optional[int] = None, max_iter: int = 1000, n_init: int = 10) -> List[Dict[str, float]]:
+    """
+    複数のクラスタ数を並列に評価
+
+    Args:
+        vectors_path: 分散表現の .npy
+        ks: 評価するクラスタ数
+        n_samples: シルエット係数の推定に使う点数
+        seed: 乱数のシード
+        jobs: 並列プロセス数（省略時はCPUコア数とkの数の小さい方）
+        max_iter: K-means の最大反復回数
+        n_init: K-means の初期値を変えて実行する回数
+
+    Returns:
+        k の昇順に並べた評価結果のリスト
+    """
+    ks = list(ks)
+    cpu_count = os.cpu_count() or 1
+    jobs = max(1, min(jobs or cpu_count, len(ks)))
+    # プロセスごとのスレッド数を分け、全体でCPUコア数を超えないようにする
+    threads = max(1, cpu_count // jobs)
+    if jobs == 1:
+        results = [evaluate_k(vectors_path, k, n_samples, seed, max_iter, n_init, threads) for k in ks]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(evaluate_k, vectors_path, k, n_samples, seed, max_iter, n_init, threads)
+                       for k in ks]
+            results = [future.result() for future in futures]
+    for result in results:
+        logger.info(f"k={result['k']}: {result['score']:.4f} "
+                    f"[{result['ci_low']:.4f}, {result['ci_high']:.4f}]（{result['seconds']:.1f}秒）")
+    return sorted(results, key=lambda r: r['k'])
+
+
+def best_k(results: Sequence[Dict[str, float]]) -> int:
+    """シルエット係数の推定値が最大のクラスタ数"""
+    return int(max(results, key=lambda r: r['score'])['k'])
+
+
+def format_report(results: Sequence[Dict[str, float]]) -> str:
+    """
+    k とシルエット係数の表を作成
+
+    信頼区間が最大値の信頼区間と重なるkには「*」を付けます（抽出による誤差の範囲で最大値と区別できないk）。
+    """
+    best = max(results, key=lambda r: r['score'])
+    lines = [f"{'k':>3}  {'score':>8}  {'95% CI':>21}  {'inertia':>14}  {'sec':>7}"]
+    for r in results:
+        overlap = '*' if r['ci_high'] >= best['ci_low'] else ' '
+        lines.append(f"{r['k']:>3}  {r['score']:8.4f}  [{r['ci_low']:8.4f}, {r['ci_high']:8.4f}]  "
+                     f"{r['inertia']:14.1f}  {r['seconds']:7.1f} {overlap}")
+    lines.append(f"最適なクラスタ数: {best['k']}（* は信頼区間が最大値と重なるk）")
+    return '\n'.join(lines)
+
+
+def write_report_csv(results: Sequence[Dict[str, float]], path: str) -> None:
+    """評価結果をCSVに保存"""
+    fields = ['k', 'score', 'ci_low', 'ci_high', 'stderr', 'n_sampled', 'inertia', 'seconds']
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for result in results:
+            writer.writerow({field: result[field] for field in fields})
+
+
+def plot_report(results: Sequence[Dict[str, float]], path: str, title: str = 'SilhouetteCoefficient') -> None:
+    """k とシルエット係数（信頼区間付き）のグラフを保存"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    ks = [r['k'] for r in results]
+    scores = [r['score'] for r in results]
+    errors = [[r['score'] - r['ci_low'] for r in results], [r['ci_high'] - r['score'] for r in results]]
+    plt.figure(figsize=(8, 5))
+    plt.errorbar(ks, scores, yerr=errors, marker='o', capsize=3)
+    plt.xlabel('Number of clusters')
+    plt.ylabel('Silhouette coefficient')
+    plt.xticks(ks)
+    plt.title(title)
+    plt.savefig(path, bbox_inches='tight')
+    plt.close()
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description='クラスタ数ごとのシルエット係数を推定します')
+    arg_parser.add_argument('vectors', help='分散表現の .npy（embeddings.py で変換したもの）')
+    arg_parser.add_argument('--k-min', type=int, default=2, help='評価する最小のクラスタ数')
+    arg_parser.add_argument('--k-max', type=int, default=29, help='評価する最大のクラスタ数')
+    arg_parser.add_argument('--sample', type=int, default=3000, help='シルエット係数の推定に使う点数（0で全点）')
+    arg_parser.add_argument('--seed', type=int, default=0, help='乱数のシード')
+    arg_parser.add_argument('--jobs', type=int, help='並列プロセス数')
+    arg_parser.add_argument('--max-iter', type=int, default=1000, help='K-means の最大反復回数')
+    arg_parser.add_argument('--n-init', type=int, default=10, help='K-means の初期値を変えて実行する回数')
+    arg_parser.add_argument('--output', help='評価結果のCSVの保存先')
+    arg_parser.add_argument('--plot', help='グラフの保存先（PNG）')
+    args = arg_parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+    results = evaluate_range(args.vectors, range(args.k_min, args.k_max + 1), args.sample or None,
+                             args.seed, args.jobs, args.max_iter, args.n_init)
+    print(format_report(results))
+    if args.output:
+        write_report_csv(results, args.output)
+    if args.plot:
+        plot_report(results, args.plot, os.path.splitext(os.path.basename(args.vectors))[0])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Cluster Stats Module - クラスタ別の集計を一度の groupby で作成するモジュール
+
+発言データ（DF_2018-2022.csv）とクラスタラベルを結合したデータフレームから、
+クラスタ × 発言者 × 会派 × 年 ごとの発言数と男性の発言数（性別列の合計）を一度の groupby で集計し、
+クラスタ別の発言数・割合・女性の発言率、発言者別・会派別・年別の集計はこの集計表から作成します。
+集計表は入力データのハッシュ値とともに保存できるため、同じデータでは再集計しません。
+
+使い方（ノートブック）:
+    from cluster_stats import ClusterStats
+    stats = ClusterStats.cached(df3, 'Cyber/Cyber11_stats.pkl')
+    stats.cluster_summary()        # クラスタ別の発言数・割合・女性の発言率
+    stats.speaker_clusters('氏名')  # 発言者のクラスタ別発言数
+"""
+
+import os
+import hashlib
+import logging
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_COLUMN = 'cluster'
+SPEAKER_COLUMN = '発言者名'
+PARTY_COLUMN = '会派'
+DATE_COLUMN = '日付'
+GENDER_COLUMN = '性別(男1,女0)'
+YEAR_COLUMN = '年'
+KEYS = [CLUSTER_COLUMN, SPEAKER_COLUMN, PARTY_COLUMN, YEAR_COLUMN]
+
+
+def frame_key(df: pd.DataFrame) -> str:
+    """集計に使う列の内容からハッシュ値を計算（保存した集計表が使えるかの判定に使用）"""
+    columns = [CLUSTER_COLUMN, SPEAKER_COLUMN, PARTY_COLUMN, DATE_COLUMN, GENDER_COLUMN]
+    hashed = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    return hashlib.sha256(hashed.tobytes()).hexdigest()
+
+
+def build_cube(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    クラスタ × 発言者 × 会派 × 年 ごとの発言数と男性の発言数を集計
+
+    文字列の列はカテゴリ型に変換してから集計するため、発言者名などの比較は整数のコードで行われます。
+
+    Args:
+        df: 'cluster'、'発言者名'、'会派'、'日付'、'性別(男1,女0)' の列を持つデータフレーム
+
+    Returns:
+        KEYS を列に持ち、'発言数' と '男性発言数' を集計したデータフレーム
+    """
+    frame = pd.DataFrame({
+        CLUSTER_COLUMN: df[CLUSTER_COLUMN].astype(int),
+        SPEAKER_COLUMN: df[SPEAKER_COLUMN].astype('category'),
+        PARTY_COLUMN: df[PARTY_COLUMN].fillna('').astype('category'),
+        YEAR_COLUMN: pd.to_datetime(df[DATE_COLUMN]).dt.year,
+        # ノートブックの計算（1 - 性別の合計 / 発言数）と同じく、欠損値は合計に含めない
+        GENDER_COLUMN: pd.to_numeric(df[GENDER_COLUMN], errors='coerce').fillna(0),
+    })
+    cube = (frame.groupby(KEYS, observed=True, sort=True)
+            .agg(発言数=(GENDER_COLUMN, 'size'), 男性発言数=(GENDER_COLUMN, 'sum'))
+            .reset_index())
+    for column in (SPEAKER_COLUMN, PARTY_COLUMN):
+        cube[column] = cube[column].astype('category')
+    return cube
+
+
+class ClusterStats:
+    """クラスタ別の集計表と、そこから作る各種の集計"""
+
+    def __init__(self, cube: pd.DataFrame, n_clusters: Optional[int] = None, key: Optional[str] = None):
+        """
+        初期化
+
+        Args:
+            cube: build_cube で作成した集計表
+            n_clusters: クラスタ数（省略時は集計表のクラスタ番号の最大値 + 1）
+            key: 集計元のデータのハッシュ値（frame_key）
+        """
+        self.cube = cube
+        self.key = key
+        self.n_clusters = n_clusters or (int(cube[CLUSTER_COLUMN].max()) + 1 if len(cube) else 0)
+        self._speaker_table: Optional[pd.DataFrame] = None
+        self._speaker_years: Optional[pd.Series] = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, n_clusters: Optional[int] = None) -> 'ClusterStats':
+        """データフレームから集計"""
+        return cls(build_cube(df), n_clusters, frame_key(df))
+
+    @classmethod
+    def cached(cls, df: pd.DataFrame, cache_path: str, n_clusters: Optional[int] = None) -> 'ClusterStats':
+        """
+        保存した集計表を読み込み、データが変わっている場合だけ集計し直して保存
+
+        Args:
+            df: 集計するデータフレーム
+            cache_path: 集計表の保存先（pickle）
+            n_clusters: クラスタ数
+
+        Returns:
+            ClusterStats
+        """
+        key = frame_key(df)
+        if os.path.exists(cache_path):
+            saved = pd.read_pickle(cache_path)
+            if saved.get('key') == key:
+                return cls(saved['cube'], n_clusters or saved.get('n_clusters'), key)
+            logger.info(f"データが変更されているため集計し直します: {cache_path}")
+        stats = cls(build_cube(df), n_clusters, key)
+        stats.save(cache_path)
+        return stats
+
+    def save(self, cache_path: str) -> None:
+        """集計表を保存"""
+        tmp_path = cache_path + '.tmp'
+        pd.to_pickle({'key': self.key, 'n_clusters': self.n_clusters, 'cube': self.cube}, tmp_path)
+        os.replace(tmp_path, cache_path)
+
+    @property
+    def clusters(self) -> pd.Index:
+        return pd.RangeIndex(self.n_clusters, name=CLUSTER_COLUMN)
+
+    def _sum_by(self, keys) -> pd.DataFrame:
+        return self.cube.groupby(keys, observed=True)[['発言数', '男性発言数']].sum()
+
+    def cluster_summary(self) -> pd.DataFrame:
+        """
+        クラスタ別の発言数・発言の割合（%）・女性の発言率
+
+        Returns:
+            クラスタ番号を行に持ち、'発言数'、'割合'、'女性の発言率' の列を持つデータフレーム
+        """
+        totals = self._sum_by(CLUSTER_COLUMN).reindex(self.clusters, fill_value=0)
+        counts = totals['発言数']
+        summary = pd.DataFrame({'発言数': counts})
+        summary['割合'] = counts / max(counts.sum(), 1) * 100
+        with np.errstate(divide='ignore', invalid='ignore'):
+            summary['女性の発言率'] = 1 - totals['男性発言数'] / counts
+        return summary
+
+    def speaker_table(self) -> pd.DataFrame:
+        """発言者 × クラスタ の発言数の表（初回に一度だけ作成）"""
+        if self._speaker_table is None:
+            self._speaker_table = (self._sum_by([SPEAKER_COLUMN, CLUSTER_COLUMN])['発言数']
+                                   .unstack(CLUSTER_COLUMN, fill_value=0)
+                                   .reindex(columns=self.clusters, fill_value=0))
+        return self._speaker_table
+
+    def speakers(self) -> pd.Index:
+        """発言者名の一覧（発言データに現れた順ではなく名前順）"""
+        return self.speaker_table().index
+
+    def speaker_clusters(self, name: str) -> pd.Series:
+        """
+        発言者のクラスタ別発言数
+
+        Args:
+            name: 発言者名
+
+        Returns:
+            クラスタ番号 -> 発言数（発言がない場合はすべて0）
+        """
+        table = self.speaker_table()
+        if name not in table.index:
+            return pd.Series(0, index=self.clusters, name=name)
+        return table.loc[name]
+
+    def speaker_yearly(self, name: str) -> pd.DataFrame:
+        """
+        発言者のクラスタ別・年別発言数
+
+        Args:
+            name: 発言者名
+
+        Returns:
+            'cluster'、'年'、'発言数' の列を持つデータフレーム（ノートブックの棒グラフの入力と同じ形式）
+        """
+        if self._speaker_years is None:
+            self._speaker_years = self._sum_by([SPEAKER_COLUMN, CLUSTER_COLUMN, YEAR_COLUMN])['発言数']
+        if name not in self._speaker_years.index.get_level_values(0):
+            return pd.DataFrame(columns=[CLUSTER_COLUMN, YEAR_COLUMN, '発言数'])
+        return self._speaker_years.xs(name, level=SPEAKER_COLUMN).reset_index()
+
+    def party_table(self) -> pd.DataFrame:
+        """会派 × クラスタ の発言数の表"""
+        return (self._sum_by([PARTY_COLUMN, CLUSTER_COLUMN])['発言数']
+                .unstack(CLUSTER_COLUMN, fill_value=0)
+                .reindex(columns=self.clusters, fill_value=0))
+
+    def year_table(self) -> pd.DataFrame:
+        """年 × クラスタ の発言数の表"""
+        return (self._sum_by([YEAR_COLUMN, CLUSTER_COLUMN])['発言数']
+                .unstack(CLUSTER_COLUMN, fill_value=0)
+                .reindex(columns=self.clusters, fill_value=0))
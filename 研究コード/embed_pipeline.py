@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Embed Pipeline - 発言内容の分散表現をCPUでバッチ作成するスクリプト
+
+分散表現作成ノートブック（BERT_分散表現作成 / Cyber_分散表現作成）と同じく、モデルの最終層の隠れ状態を
+トークンについて平均した文章ベクトルを作成します。ノートブックは1発言ずつGPUで処理していましたが、
+本スクリプトはローカルのディレクトリからモデルを読み込み、トークン数の近い発言をまとめて
+（バッチ内の最長の発言に合わせてパディングし、パディング部分は平均から除外）CPUで処理します。
+
+結果は embeddings.py と同じメモリマップ形式（.npy と .meta.json）に書き込み、一定件数（シャード）ごとに
+進捗を保存するため、中断しても再実行すると未処理のシャードから再開します。
+
+使い方（研究コード ディレクトリで実行）:
+    python embed_pipeline.py DF_2018-2022.csv models/bert-base-japanese-whole-word-masking --output BERT/BERT_vecs
+    python embed_pipeline.py DF_2018-2022.csv models/open-calm-7b --kind causal --output Cyber/Cyber_vecs
+    python embed_pipeline.py --smoke-test   # 小さなモデルを作成して動作を確認
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from embeddings import store_paths, source_info, write_atomic_json
+
+logger = logging.getLogger(__name__)
+
+# 1バッチのトークン数の上限（バッチの行数 x バッチ内の最大トークン数）
+MAX_TOKENS = 16384
+# 1バッチの最大行数
+MAX_BATCH = 64
+# 進捗を保存する単位（発言数）
+SHARD_SIZE = 1024
+# 1発言の最大トークン数（ノートブックの truncation=True と同じくモデルの上限で切り詰める）
+MAX_LENGTH = 512
+
+
+def load_model(model_dir: str, kind: str = 'auto', threads: Optional[int] = None):
+    """
+    ローカルのディレクトリからモデルとトークナイザを読み込む
+
+    Args:
+        model_dir: save_pretrained で保存したディレクトリ
+        kind: 'encoder'（BERTなど。last_hidden_state を使用）/ 'causal'（OpenCALMなど。hidden_states[-1] を使用）/
+            'auto'（設定の architectures から判定）
+        threads: PyTorch の演算に使うCPUスレッド数（省略時はPyTorchの既定値）
+
+    Returns:
+        (モデル, トークナイザ, kind) のタプル
+    """
+    import torch
+    from transformers import AutoConfig, AutoModel, AutoModelForCausalLM, AutoTokenizer
+
+    if threads:
+        torch.set_num_threads(threads)
+    config = AutoConfig.from_pretrained(model_dir, local_files_only=True)
+    if kind == 'auto':
+        architectures = config.architectures or []
+        kind = 'causal' if any(name.endswith('ForCausalLM') for name in architectures) else 'encoder'
+    model_class = AutoModelForCausalLM if kind == 'causal' else AutoModel
+    model = model_class.from_pretrained(model_dir, local_files_only=True, torch_dtype=torch.float32)
+    model.eval()
+
+    tokenizer = AutoTokenizer.from_pretrained(model_dir, local_files_only=True)
+    tokenizer.padding_side = 'right'
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    return model, tokenizer, kind
+
+
+def make_batches(lengths: Sequence[int], max_tokens: int = MAX_TOKENS, max_batch: int = MAX_BATCH) -> List[List[int]]:
+    """
+    トークン数の長い順に並べ、パディング後のトークン数が max_tokens を超えないようにバッチを作成
+
+    Args:
+        lengths: 発言ごとのトークン数
+        max_tokens: 1バッチのトークン数の上限（行数 x バッチ内の最大トークン数）
+        max_batch: 1バッチの最大行数
+
+    Returns:
+        バッチごとの発言の位置のリスト
+    """
+    order = np.argsort(-np.asarray(lengths), kind='stable')
+    batches = []
+    current: List[int] = []
+    longest = 0
+    for index in order.tolist():
+        length = max(int(lengths[index]), 1)
+        width = max(longest, length)
+        if current and (len(current) >= max_batch or (len(current) + 1) * width > max_tokens):
+            batches.append(current)
+            current, width = [], length
+        current.append(index)
+        longest = width
+    if current:
+        batches.append(current)
+    return batches
+
+
+def make_shards(batches: List[List[int]], shard_size: int = SHARD_SIZE) -> List[List[List[int]]]:
+    """連続するバッチを発言数が shard_size 以上になるまでまとめ、進捗を保存する単位にする"""
+    shards = []
+    current: List[List[int]] = []
+    count = 0
+    for batch in batches:
+        current.append(batch)
+        count += len(batch)
+        if count >= shard_size:
+            shards.append(current)
+            current, count = [], 0
+    if current:
+        shards.append(current)
+    return shards
+
+
+def _collate(token_ids: List[List[int]], batch: List[int], pad_id: int):
+    """バッチ内の最長の発言に合わせてパディングしたテンソルを作成"""
+    import torch
+
+    width = max(len(token_ids[i]) for i in batch)
+    input_ids = torch.full((len(batch), width), pad_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(batch), width), dtype=torch.long)
+    for row, index in enumerate(batch):
+        ids = token_ids[index]
+        input_ids[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+        attention_mask[row, :len(ids)] = 1
+    return input_ids, attention_mask
+
+
+def embed_batch(model, kind: str, input_ids, attention_mask) -> np.ndarray:
+    """
+    1バッチの文章ベクトルを計算（最終層の隠れ状態をパディング以外のトークンについて平均）
+
+    Returns:
+        (行数, 次元数) の float32 配列
+    """
+    import torch
+
+    with torch.no_grad():
+        if kind == 'causal':
+            outputs = model(input_ids=input_ids, attention_mask=attention_mask, output_hidden_states=True)
+            hidden = outputs.hidden_states[-1]
+        else:
+            hidden = model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+        mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+    return pooled.float().cpu().numpy()
+
+
+def _plan_key(token_ids: List[List[int]], batches: List[List[int]], model_dir: str, kind: str, dtype: str) -> str:
+    """入力・バッチの分け方・モデル・保存する型が同じかどうかを判定するためのハッシュ値"""
+    digest = hashlib.sha256()
+    digest.update(f'{os.path.abspath(model_dir)}:{kind}:{dtype}:{len(token_ids)}'.encode())
+    for ids in token_ids:
+        digest.update(np.asarray(ids, dtype=np.int64).tobytes())
+        digest.update(b'|')
+    digest.update(json.dumps(batches).encode())
+    return digest.hexdigest()
+
+
+def run_pipeline(texts: Sequence[str], model_dir: str, output_base: str, kind: str = 'auto',
+                 dtype: str = 'float32', threads: Optional[int] = None, max_tokens: int = MAX_TOKENS,
+                 max_batch: int = MAX_BATCH, shard_size: int = SHARD_SIZE, max_length: int = MAX_LENGTH,
+                 source_path: Optional[str] = None, max_shards: Optional[int] = None) -> Dict[str, Any]:
+    """
+    発言内容の分散表現を作成してメモリマップ形式で保存（中断した場合は再開）
+
+    Args:
+        texts: 発言内容のリスト
+        model_dir: モデルのディレクトリ
+        output_base: 保存先のベースパス（例: 'BERT/BERT_vecs'。embeddings.open_embeddings で開けます）
+        kind: モデルの種類（load_model を参照）
+        dtype: 保存する型（'float32' / 'float16'）
+        threads: PyTorch の演算に使うCPUスレッド数
+        max_tokens: 1バッチのトークン数の上限
+        max_batch: 1バッチの最大行数
+        shard_size: 進捗を保存する単位（発言数）
+        max_length: 1発言の最大トークン数
+        source_path: 発言データのCSV（メタデータに記録）
+        max_shards: この実行で処理するシャード数の上限（動作確認用）
+
+    Returns:
+        {'rows', 'dim', 'completed', 'total_shards', 'processed', 'seconds', 'texts_per_second',
+         'tokens_per_second', 'finished'} の辞書
+    """
+    model, tokenizer, kind = load_model(model_dir, kind, threads)
+    limit = min(max_length, tokenizer.model_max_length or max_length)
+    texts = [text if isinstance(text, str) else '' for text in texts]
+    # バッチの分け方を決めるには全発言のトークン数が必要なため、トークン化は最初にまとめて行う
+    # （fast tokenizer は一括で渡すと並列に処理する）。別スレッドで先読みするのはパディングのみ
+    tokenize_start = time.perf_counter()
+    token_ids = tokenizer(texts, truncation=True, max_length=limit)['input_ids']
+    logger.info(f"{len(texts)}件をトークン化しました（{time.perf_counter() - tokenize_start:.1f}秒）")
+    batches = make_batches([len(ids) for ids in token_ids], max_tokens, max_batch)
+    shards = make_shards(batches, shard_size)
+    plan_key = _plan_key(token_ids, batches, model_dir, kind, dtype)
+
+    paths = store_paths(output_base)
+    progress_path = output_base + '.progress.json'
+    progress = None
+    if os.path.exists(progress_path) and os.path.exists(paths['vectors']):
+        with open(progress_path, encoding='utf-8') as f:
+            progress = json.load(f)
+        if progress.get('plan_key') != plan_key:
+            logger.warning('入力・モデル・バッチ・保存する型の設定が前回と異なるため最初から作成します')
+            progress = None
+
+    if progress is None:
+        # 次元数は最初のバッチで決まるため、1件だけ計算して確認する
+        probe = embed_batch(model, kind, *_collate(token_ids, batches[0][:1], tokenizer.pad_token_id))
+        dim = probe.shape[1]
+        vectors = np.lib.format.open_memmap(paths['vectors'], mode='w+', dtype=np.dtype(dtype),
+                                            shape=(len(texts), dim))
+        progress = {'plan_key': plan_key, 'dim': dim, 'dtype': dtype, 'completed': [], 'max_abs': 0.0}
+        write_atomic_json(progress_path, progress)
+    else:
+        vectors = np.load(paths['vectors'], mmap_mode='r+')
+        logger.info(f"{len(shards)}シャード中{len(progress['completed'])}シャードは作成済みのため再開します")
+
+    completed = set(progress['completed'])
+    limit_float16 = float(np.finfo(np.float16).max)
+    processed = 0
+    tokens = 0
+    start = time.perf_counter()
+    pending = [shard_id for shard_id in range(len(shards)) if shard_id not in completed]
+    if max_shards is not None:
+        pending = pending[:max_shards]
+
+    # 次のバッチのパディング（テンソルの作成）を別スレッドで準備し、モデルの計算と重ねる
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        for shard_id in pending:
+            shard_start = time.perf_counter()
+            shard_rows = 0
+            batches_in_shard = shards[shard_id]
+            future = prefetcher.submit(_collate, token_ids, batches_in_shard[0], tokenizer.pad_token_id)
+            for position, batch in enumerate(batches_in_shard):
+                input_ids, attention_mask = future.result()
+                if position + 1 < len(batches_in_shard):
+                    future = prefetcher.submit(_collate, token_ids, batches_in_shard[position + 1],
+                                               tokenizer.pad_token_id)
+                pooled = embed_batch(model, kind, input_ids, attention_mask)
+                max_abs = float(np.abs(pooled).max()) if len(pooled) else 0.0
+                if dtype == 'float16' and max_abs > limit_float16:
+                    raise ValueError(f"float16 の範囲を超える値（{max_abs:.1f}）があります。--dtype float32 を指定してください")
+                progress['max_abs'] = max(progress['max_abs'], max_abs)
+                vectors[np.asarray(batch)] = pooled
+                shard_rows += len(batch)
+                tokens += int(attention_mask.sum())
+
+            vectors.flush()
+            completed.add(shard_id)
+            progress['completed'] = sorted(completed)
+            write_atomic_json(progress_path, progress)
+            processed += shard_rows
+            elapsed = time.perf_counter() - shard_start
+            logger.info(f"シャード {shard_id + 1}/{len(shards)}: {shard_rows}件（{shard_rows / max(elapsed, 1e-9):.1f}件/秒）")
+
+    seconds = time.perf_counter() - start
+    finished = len(completed) == len(shards)
+    if finished:
+        meta = {
+            'source': source_info(source_path) if source_path else None,
+            'rows': len(texts),
+            'dim': progress['dim'],
+            'dtype': dtype,
+            'max_abs': progress['max_abs'],
+            'labels': None,
+            'model': {'path': os.path.basename(os.path.normpath(model_dir)), 'kind': kind, 'max_length': limit},
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        write_atomic_json(paths['meta'], meta)
+        os.remove(progress_path)
+    del vectors
+
+    stats = {
+        'rows': len(texts),
+        'dim': progress['dim'],
+        'completed': len(completed),
+        'total_shards': len(shards),
+        'processed': processed,
+        'seconds': seconds,
+        'texts_per_second': processed / seconds if seconds else 0.0,
+        'tokens_per_second': tokens / seconds if seconds else 0.0,
+        'finished': finished,
+    }
+    logger.info(f"{processed}件を{seconds:.1f}秒で処理しました（{stats['texts_per_second']:.1f}件/秒、"
+                f"{stats['tokens_per_second']:.0f}トークン/秒）")
+    return stats
+
+
+def create_tiny_model(model_dir: str, texts: Sequence[str]) -> None:
+    """
+    動作確認用の小さなBERTモデル（ランダムな重み、文字単位の語彙）を作成して保存
+
+    Args:
+        model_dir: 保存先のディレクトリ
+        texts: 語彙に含める文字を集める文章
+    """
+    import torch
+    from tokenizers import Tokenizer, models, normalizers, pre_tokenizers, processors
+    from transformers import BertConfig, BertModel, PreTrainedTokenizerFast
+
+    os.makedirs(model_dir, exist_ok=True)
+    chars = sorted({char for text in texts for char in text if not char.isspace()})
+    vocab = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + chars
+    backend = Tokenizer(models.WordPiece({token: i for i, token in enumerate(vocab)}, unk_token='[UNK]'))
+    backend.normalizer = normalizers.BertNormalizer(lowercase=False)
+    backend.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    backend.post_processor = processors.BertProcessing(('[SEP]', 3), ('[CLS]', 2))
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=backend, unk_token='[UNK]', pad_token='[PAD]',
+                                        cls_token='[CLS]', sep_token='[SEP]', mask_token='[MASK]',
+                                        model_max_length=64)
+    tokenizer.save_pretrained(model_dir)
+
+    torch.manual_seed(0)
+    config = BertConfig(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                        intermediate_size=64, max_position_embeddings=64)
+    BertModel(config).save_pretrained(model_dir)
+
+
+def smoke_test(workdir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    小さなモデルで、中断・再開した結果が一括で作成した結果および1件ずつ計算した結果と一致するか、
+    保存する型を変えて再実行した場合に最初から作成し直すかを確認
+
+    Returns:
+        再開後の実行の統計情報
+    """
+    from embeddings import open_embeddings
+
+    workdir = workdir or tempfile.mkdtemp(prefix='embed_smoke_')
+    rng = np.random.default_rng(0)
+    words = ['国会', '予算', '審議', '地域', '経済', '財政', '外交', '政策', '質問', '答弁', '委員会', '法案']
+    texts = [''.join(rng.choice(words, size=int(rng.integers(1, 20)))) for _ in range(300)]
+    model_dir = os.path.join(workdir, 'tiny-bert')
+    create_tiny_model(model_dir, texts)
+
+    resumed = os.path.join(workdir, 'resumed_vecs')
+    first = run_pipeline(texts, model_dir, resumed, shard_size=64, max_tokens=512, max_shards=2)
+    assert not first['finished'] and first['completed'] == 2
+    second = run_pipeline(texts, model_dir, resumed, shard_size=64, max_tokens=512)
+    assert second['finished'] and second['processed'] == len(texts) - first['processed']
+
+    direct = os.path.join(workdir, 'direct_vecs')
+    run_pipeline(texts, model_dir, direct, shard_size=64, max_tokens=512)
+    resumed_vectors = open_embeddings(resumed).vectors
+    assert np.allclose(resumed_vectors, open_embeddings(direct).vectors, atol=1e-5)
+
+    # パディングしたバッチの結果が、1件ずつ（パディングなし）の結果と一致すること
+    model, tokenizer, kind = load_model(model_dir)
+    for index in (0, 1, 2):
+        ids = tokenizer(texts[index], truncation=True, max_length=64, return_tensors='pt')
+        single = embed_batch(model, kind, ids['input_ids'], ids['attention_mask'])[0]
+        assert np.allclose(single, resumed_vectors[index], atol=1e-4)
+
+    # float32 で中断した続きを float16 で実行すると、再開せずに最初から float16 で作成し直すこと
+    retyped = os.path.join(workdir, 'retyped_vecs')
+    run_pipeline(texts, model_dir, retyped, shard_size=64, max_tokens=512, max_shards=1)
+    rerun = run_pipeline(texts, model_dir, retyped, dtype='float16', shard_size=64, max_tokens=512)
+    assert rerun['finished'] and rerun['processed'] == len(texts)
+    retyped_vectors = open_embeddings(retyped).vectors
+    assert retyped_vectors.dtype == np.float16
+    assert np.allclose(retyped_vectors.astype(np.float32), resumed_vectors, atol=1e-2)
+    logger.info(f"動作確認が完了しました: {workdir}")
+    return second
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description='発言内容の分散表現をCPUでバッチ作成します')
+    arg_parser.add_argument('csv', nargs='?', help='発言データのCSV（例: DF_2018-2022.csv）')
+    arg_parser.add_argument('model_dir', nargs='?', help='モデルのディレクトリ（save_pretrained で保存したもの）')
+    arg_parser.add_argument('--output', help='保存先のベースパス（例: BERT/BERT_vecs）')
+    arg_parser.add_argument('--column', default='発言内容', help='発言内容の列名')
+    arg_parser.add_argument('--kind', choices=['auto', 'encoder', 'causal'], default='auto', help='モデルの種類')
+    arg_parser.add_argument('--dtype', choices=['float32', 'float16'], default='float32', help='保存する型')
+    arg_parser.add_argument('--threads', type=int, default=os.cpu_count() or 1, help='CPUスレッド数')
+    arg_parser.add_argument('--max-tokens', type=int, default=MAX_TOKENS, help='1バッチのトークン数の上限')
+    arg_parser.add_argument('--max-batch', type=int, default=MAX_BATCH, help='1バッチの最大行数')
+    arg_parser.add_argument('--shard-size', type=int, default=SHARD_SIZE, help='進捗を保存する単位（発言数）')
+    arg_parser.add_argument('--max-length', type=int, default=MAX_LENGTH, help='1発言の最大トークン数')
+    arg_parser.add_argument('--smoke-test', action='store_true', help='小さなモデルを作成して動作を確認')
+    args = arg_parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+    if args.smoke_test:
+        print(json.dumps(smoke_test(), ensure_ascii=False))
+        return 0
+    if not args.csv or not args.model_dir or not args.output:
+        arg_parser.error('発言データのCSV、モデルのディレクトリ、--output を指定してください')
+
+    import pandas as pd
+
+    texts = pd.read_csv(args.csv, usecols=[args.column])[args.column].tolist()
+    stats = run_pipeline(texts, args.model_dir, args.output, args.kind, args.dtype, args.threads,
+                         args.max_tokens, args.max_batch, args.shard_size, args.max_length, args.csv)
+    print(json.dumps(stats, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
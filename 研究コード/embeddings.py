@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Embeddings Module - 分散表現をメモリマップ形式で保存・読み込みするモジュール
+
+分散表現作成ノートブックが出力したCSV（BERT: 768次元、OpenCALM: 4096次元）を一度だけ
+.npy（float16 または float32）に変換し、分析ノートブックからはメモリマップで必要な部分だけを読み込みます。
+変換時にクラスタラベル（BERT11cullabels.csv / Cyber11cullabels.csv）を行番号で揃えた
+.labels.npy と、行数・次元数・変換元の情報を記録したメタデータ（.meta.json）を同じ場所に作成します。
+
+使い方（研究コード ディレクトリで実行）:
+    python embeddings.py Cyber/Cyber_vecs.csv --labels Cyber/Cyber11cullabels.csv
+    python embeddings.py BERT/BERT_vecs.csv --labels BERT/BERT11cullabels.csv --dtype float32
+
+ノートブックでの読み込み:
+    from embeddings import ensure_embeddings
+    store = ensure_embeddings('Cyber/Cyber_vecs.csv', labels_csv='Cyber/Cyber11cullabels.csv')
+    vecs = store.vectors   # (行数, 次元数) のメモリマップ
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DTYPE = 'float16'
+# CSVを読み込む行数の単位（4096次元の float32 で約16MB）
+CHUNK_ROWS = 1024
+FLOAT16_MAX = float(np.finfo(np.float16).max)
+
+
+def store_paths(base: str) -> Dict[str, str]:
+    """
+    保存先のベースパスから各ファイルのパスを作成
+
+    Args:
+        base: 拡張子を除いたパス（例: 'Cyber/Cyber_vecs'）
+
+    Returns:
+        {'vectors', 'labels', 'meta'} のパスの辞書
+    """
+    return {
+        'vectors': base + '.npy',
+        'labels': base + '.labels.npy',
+        'meta': base + '.meta.json',
+    }
+
+
+def _base_from_csv(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0]
+
+
+def source_info(path: str) -> Dict[str, Any]:
+    """変換元のファイル名・サイズ・更新時刻（変換後に更新されたかの判定に使用）"""
+    stat = os.stat(path)
+    return {'path': os.path.basename(path), 'size': stat.st_size, 'mtime': int(stat.st_mtime)}
+
+
+def _count_rows(csv_path: str) -> int:
+    """CSVのデータ行数を数える（ヘッダーを除く。分散表現のCSVはセル内に改行を含まない）"""
+    lines = 0
+    last = b'\n'
+    with open(csv_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            lines += block.count(b'\n')
+            last = block[-1:]
+    if last != b'\n':
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def write_atomic_json(path: str, data: Dict[str, Any]) -> None:
+    """JSONを一時ファイルに書き込んでから置き換える（書き込み中に中断しても壊れたファイルを残さない）"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def convert_csv(csv_path: str, base: Optional[str] = None, dtype: str = DEFAULT_DTYPE,
+                labels_csv: Optional[str] = None, chunk_rows: int = CHUNK_ROWS) -> Dict[str, Any]:
+    """
+    分散表現のCSVをメモリマップ形式の .npy に変換
+
+    CSVは chunk_rows 行ずつ読み込んで .npy に書き込むため、変換中もCSV全体をメモリに保持しません。
+    float16 を指定した場合でも、float16 で表せない大きさの値（OpenCALMの隠れ状態の外れ値など）が
+    含まれる場合は精度を保つため float32 で保存します。
+
+    Args:
+        csv_path: 分散表現のCSV（1行目はヘッダー、1行が1発言）
+        base: 保存先のベースパス（省略時はCSVのパスから拡張子を除いたもの）
+        dtype: 保存する型（'float16' / 'float32'）
+        labels_csv: クラスタラベルのCSV（'cluster' 列）。指定した場合は .labels.npy を作成
+        chunk_rows: 一度に読み込む行数
+
+    Returns:
+        保存したメタデータ
+    """
+    if dtype not in ('float16', 'float32'):
+        raise ValueError(f"dtype は float16 または float32 を指定してください: {dtype}")
+    base = base or _base_from_csv(csv_path)
+    paths = store_paths(base)
+    start = time.perf_counter()
+
+    rows = _count_rows(csv_path)
+    dim = len(pd.read_csv(csv_path, nrows=0).columns)
+    logger.info(f"{csv_path}: {rows}行 x {dim}次元を変換します")
+
+    # まず float32 で書き込み、値の範囲を確認してから保存する型を決める
+    tmp_path = paths['vectors'] + '.f32.tmp'
+    vectors = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(rows, dim))
+    offset = 0
+    max_abs = 0.0
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows, dtype=np.float32):
+        values = chunk.to_numpy(dtype=np.float32)
+        vectors[offset:offset + len(values)] = values
+        if len(values):
+            max_abs = max(max_abs, float(np.nanmax(np.abs(values))))
+        offset += len(values)
+    if offset != rows:
+        del vectors
+        os.remove(tmp_path)
+        raise ValueError(f"{csv_path}: 行数が一致しません（{rows}行の想定に対して{offset}行）")
+
+    saved_dtype = dtype
+    if dtype == 'float16' and max_abs > FLOAT16_MAX:
+        logger.warning(f"float16 の範囲を超える値（{max_abs:.1f}）があるため float32 で保存します")
+        saved_dtype = 'float32'
+
+    if saved_dtype == 'float32':
+        vectors.flush()
+        del vectors
+        os.replace(tmp_path, paths['vectors'])
+    else:
+        out_tmp = paths['vectors'] + '.tmp'
+        converted = np.lib.format.open_memmap(out_tmp, mode='w+', dtype=np.float16, shape=(rows, dim))
+        for begin in range(0, rows, chunk_rows):
+            converted[begin:begin + chunk_rows] = vectors[begin:begin + chunk_rows]
+        converted.flush()
+        del converted, vectors
+        os.replace(out_tmp, paths['vectors'])
+        os.remove(tmp_path)
+
+    meta = {
+        'source': source_info(csv_path),
+        'rows': rows,
+        'dim': dim,
+        'dtype': saved_dtype,
+        'max_abs': max_abs,
+        'labels': None,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    if labels_csv:
+        meta['labels'] = write_labels(labels_csv, paths['labels'], rows)
+    write_atomic_json(paths['meta'], meta)
+    logger.info(f"{paths['vectors']} を作成しました（{saved_dtype}、{time.perf_counter() - start:.1f}秒）")
+    return meta
+
+
+def write_labels(labels_csv: str, labels_path: str, rows: int) -> Dict[str, Any]:
+    """
+    クラスタラベルのCSVを .labels.npy に変換
+
+    ノートブックでは分散表現・発言データ・ラベルを行番号で結合（inner join）しているため、
+    ラベルも行番号で揃えて保存し、分散表現と行数が異なる場合は共通する行数を aligned_rows に記録します。
+
+    Args:
+        labels_csv: クラスタラベルのCSV（'cluster' 列）
+        labels_path: 保存先のパス
+        rows: 分散表現の行数
+
+    Returns:
+        ラベルのメタデータ
+    """
+    labels = pd.read_csv(labels_csv, usecols=['cluster'])['cluster'].to_numpy(dtype=np.int16)
+    tmp_path = labels_path + '.tmp.npy'
+    np.save(tmp_path, labels)
+    os.replace(tmp_path, labels_path)
+    if len(labels) != rows:
+        logger.warning(f"{labels_csv}: ラベルの行数（{len(labels)}）が分散表現の行数（{rows}）と異なります")
+    return {
+        'source': source_info(labels_csv),
+        'rows': int(len(labels)),
+        'aligned_rows': int(min(len(labels), rows)),
+        'n_clusters': int(labels.max()) + 1 if len(labels) else 0,
+    }
+
+
+class EmbeddingStore:
+    """メモリマップ形式で保存した分散表現とクラスタラベル"""
+
+    def __init__(self, base: str, mmap_mode: Optional[str] = 'r'):
+        """
+        初期化（ファイルは実際に参照するまで開きません）
+
+        Args:
+            base: 保存先のベースパス（例: 'Cyber/Cyber_vecs'）
+            mmap_mode: np.load の mmap_mode（None の場合はメモリに読み込む）
+        """
+        self.base = base
+        self.paths = store_paths(base)
+        self.mmap_mode = mmap_mode
+        self._meta: Optional[Dict[str, Any]] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._labels: Optional[np.ndarray] = None
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        """メタデータ"""
+        if self._meta is None:
+            with open(self.paths['meta'], encoding='utf-8') as f:
+                self._meta = json.load(f)
+        return self._meta
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """(行数, 次元数) の分散表現（メモリマップ）"""
+        if self._vectors is None:
+            self._vectors = np.load(self.paths['vectors'], mmap_mode=self.mmap_mode)
+        return self._vectors
+
+    @property
+    def labels(self) -> Optional[np.ndarray]:
+        """行ごとのクラスタ番号（ラベルを変換していない場合は None）"""
+        if self._labels is None and os.path.exists(self.paths['labels']):
+            self._labels = np.load(self.paths['labels'], mmap_mode=self.mmap_mode)
+        return self._labels
+
+    def __len__(self) -> int:
+        return int(self.meta['rows'])
+
+    @property
+    def aligned_rows(self) -> int:
+        """分散表現とラベルで共通する行数（ラベルがない場合は分散表現の行数）"""
+        labels = self.meta.get('labels')
+        return int(labels['aligned_rows']) if labels else len(self)
+
+    def aligned(self):
+        """
+        分散表現とラベルを共通する行数に揃えて取得
+
+        Returns:
+            (分散表現, ラベル) のタプル（ラベルがない場合は None）
+        """
+        n = self.aligned_rows
+        labels = self.labels
+        return self.vectors[:n], (labels[:n] if labels is not None else None)
+
+    def as_float32(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """指定した範囲の行を float32 で取得（計算用。範囲外の行は読み込みません）"""
+        return np.asarray(self.vectors[start:stop], dtype=np.float32)
+
+    def is_stale(self, csv_path: str) -> bool:
+        """変換元のCSVが変換後に更新されているかどうか"""
+        try:
+            source = self.meta['source']
+        except (OSError, ValueError, KeyError):
+            return True
+        current = source_info(csv_path)
+        return source['size'] != current['size'] or source['mtime'] != current['mtime']
+
+
+def open_embeddings(base: str, mmap_mode: Optional[str] = 'r') -> EmbeddingStore:
+    """
+    変換済みの分散表現を開く
+
+    Args:
+        base: 保存先のベースパス（'.npy' を付けたパスも可）
+        mmap_mode: np.load の mmap_mode
+
+    Returns:
+        EmbeddingStore
+    """
+    if base.endswith('.npy'):
+        base = base[:-len('.npy')]
+    store = EmbeddingStore(base, mmap_mode)
+    if not os.path.exists(store.paths['vectors']):
+        raise FileNotFoundError(f"変換済みの分散表現がありません: {store.paths['vectors']}")
+    return store
+
+
+def ensure_embeddings(csv_path: str, labels_csv: Optional[str] = None, dtype: str = DEFAULT_DTYPE,
+                      mmap_mode: Optional[str] = 'r') -> EmbeddingStore:
+    """
+    分散表現のCSVを必要な場合だけ変換して開く
+
+    変換済みのファイルがない場合、またはCSV・ラベルのCSVが変換後に更新されている場合だけ変換します。
+
+    Args:
+        csv_path: 分散表現のCSV
+        labels_csv: クラスタラベルのCSV
+        dtype: 変換する場合の保存型
+        mmap_mode: np.load の mmap_mode
+
+    Returns:
+        EmbeddingStore
+    """
+    base = _base_from_csv(csv_path)
+    store = EmbeddingStore(base, mmap_mode)
+    stale = not os.path.exists(store.paths['vectors']) or store.is_stale(csv_path)
+    if not stale and labels_csv:
+        labels_meta = store.meta.get('labels')
+        current = source_info(labels_csv)
+        stale = (not labels_meta or labels_meta['source']['size'] != current['size']
+                 or labels_meta['source']['mtime'] != current['mtime'])
+    if stale:
+        convert_csv(csv_path, base, dtype, labels_csv)
+        store = EmbeddingStore(base, mmap_mode)
+    return store
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description='分散表現のCSVをメモリマップ形式の .npy に変換します')
+    arg_parser.add_argument('csv', help='分散表現のCSV（例: Cyber/Cyber_vecs.csv）')
+    arg_parser.add_argument('--labels', help='クラスタラベルのCSV（例: Cyber/Cyber11cullabels.csv）')
+    arg_parser.add_argument('--dtype', choices=['float16', 'float32'], default=DEFAULT_DTYPE, help='保存する型')
+    arg_parser.add_argument('--output', help='保存先のベースパス（省略時はCSVと同じ場所）')
+    arg_parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='一度に読み込む行数')
+    args = arg_parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+    meta = convert_csv(args.csv, args.output, args.dtype, args.labels, args.chunk_rows)
+    print(json.dumps(meta, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+"""
+Kokkai Collector - 国会会議録検索システムAPIから発言を収集するスクリプト
+
+国会議事録API収集用.ipynb と同じ検索条件・同じ列（種別、院名、会議名、日付、発言番号、発言者名、
+発言者所属会派、発言者肩書き、発言内容）で発言を取得します。ノートブックは1ページ（100件）ずつ
+順番に取得していましたが、本スクリプトは少数の並列リクエストで取得し、リクエストの開始間隔を
+全体で一定以上に保ちます（APIへの負荷を抑えるため、既定は2並列・0.5秒間隔）。
+
+- 取得したレスポンスはそのまま cache/ に保存し、同じ検索条件で再実行した場合はAPIに再リクエストしません
+  （件数を確認するため、1ページ目だけは毎回APIから取得します。件数が変わっていた場合は cache/ と parts/ を
+  破棄して最初から取得し直します）
+- 一定ページ数ごとに parts/ にCSV（または Parquet）として書き込み、書き込み済みの位置を progress.json に
+  記録するため、中断しても再実行すると続きから取得します
+- 保存したレスポンスを返すローカルのHTTPサーバー（--replay）に対して実行でき、APIに接続せずに動作を確認できます
+
+使い方（研究コード ディレクトリで実行）:
+    python kokkai_collector.py --from 2018-01-01 --until 2022-12-31 --output kokkai_2018-2022 --merge kokkai_speech.csv
+    python kokkai_collector.py --replay kokkai_2018-2022/cache/<検索条件のキー> --port 8000
+    python kokkai_collector.py --from 2018-01-01 --until 2022-12-31 --output replay_test --base-url http://127.0.0.1:8000/api/speech
+    python kokkai_collector.py --smoke-test   # 架空のレスポンスを返すサーバーで中断・再開を確認
+"""
+
+import os
+import sys
+import csv
+import glob
+import json
+import time
+import hashlib
+import logging
+import argparse
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = 'https://kokkai.ndl.go.jp/api/speech'
+# 1回のリクエストで取得できる発言数の上限
+PAGE_SIZE = 100
+# 同時に送るリクエスト数
+WORKERS = 2
+# リクエストの開始間隔（秒。並列数によらず全体での間隔）
+INTERVAL = 0.5
+# parts/ の1ファイルに書き込むページ数
+PAGES_PER_PART = 10
+TIMEOUT = 30
+MAX_RETRIES = 5
+# 再試行するHTTPステータス
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+COLUMNS = ['種別', '院名', '会議名', '日付', '発言番号', '発言者名', '発言者所属会派', '発言者肩書き', '発言内容']
+RECORD_FIELDS = ['imageKind', 'nameOfHouse', 'nameOfMeeting', 'date', 'speechOrder', 'speaker',
+                 'speakerGroup', 'speakerPosition', 'speech']
+# 検索条件として指定できるパラメータ（ノートブックの入力項目）
+QUERY_PARAMS = ['any', 'nameOfHouse', 'nameOfMeeting', 'speaker', 'from', 'until']
+
+
+def query_key(params: Dict[str, Any]) -> str:
+    """検索条件のハッシュ値（キャッシュのディレクトリ名に使用）"""
+    query = {key: str(params[key]) for key in QUERY_PARAMS if params.get(key)}
+    return hashlib.sha1(json.dumps(query, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
+
+def page_file(start: int) -> str:
+    """ページの開始位置に対応するキャッシュのファイル名"""
+    return f'{start:08d}.json'
+
+
+def parse_records(data: Dict[str, Any]) -> List[List[Any]]:
+    """
+    レスポンスの speechRecord をノートブックと同じ列の行に変換
+
+    Args:
+        data: APIのレスポンス（JSON）
+
+    Returns:
+        COLUMNS の順の値のリスト
+    """
+    rows = []
+    for record in data.get('speechRecord', []):
+        row = [record.get(field) for field in RECORD_FIELDS]
+        # ノートブックと同じく、発言内容の改行と全角スペースを取り除く
+        row[-1] = (row[-1] or '').replace('\r\n', '').replace('　', '')
+        rows.append(row)
+    return rows
+
+
+def _write_atomic(path: str, text: str) -> None:
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class RateLimiter:
+    """複数のスレッドから呼ばれても、リクエストの開始間隔を interval 秒以上に保つ"""
+
+    def __init__(self, interval: float = INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            delay = max(0.0, self._next - now)
+            self._next = max(now, self._next) + self.interval
+        if delay:
+            time.sleep(delay)
+
+
+class KokkaiCollector:
+    """検索条件に一致する発言をページ単位で並列に取得し、parts/ に書き込むクラス"""
+
+    def __init__(self, output_dir: str, params: Dict[str, Any], base_url: str = BASE_URL,
+                 workers: int = WORKERS, interval: float = INTERVAL, pages_per_part: int = PAGES_PER_PART,
+                 fmt: str = 'csv', timeout: float = TIMEOUT,
+                 session_factory: Callable[[], requests.Session] = requests.Session):
+        """
+        初期化
+
+        Args:
+            output_dir: 出力先のディレクトリ（cache/、parts/、progress.json を作成）
+            params: 検索条件（'any'、'nameOfHouse'、'nameOfMeeting'、'speaker'、'from'、'until'）
+            base_url: APIのURL（テストではローカルのサーバーを指定）
+            workers: 同時に送るリクエスト数
+            interval: リクエストの開始間隔（秒）
+            pages_per_part: parts/ の1ファイルに書き込むページ数
+            fmt: 出力形式（'csv' / 'parquet'）
+            timeout: リクエストのタイムアウト（秒）
+            session_factory: スレッドごとに作成する HTTP セッション
+        """
+        if fmt not in ('csv', 'parquet'):
+            raise ValueError(f"fmt は csv または parquet を指定してください: {fmt}")
+        self.output_dir = output_dir
+        self.params = {key: str(params[key]) for key in QUERY_PARAMS if params.get(key)}
+        self.key = query_key(self.params)
+        self.base_url = base_url
+        self.workers = max(1, workers)
+        self.limiter = RateLimiter(interval)
+        self.pages_per_part = pages_per_part
+        self.fmt = fmt
+        self.timeout = timeout
+        self.session_factory = session_factory
+        self.cache_dir = os.path.join(output_dir, 'cache', self.key)
+        self.parts_dir = os.path.join(output_dir, 'parts')
+        self.progress_path = os.path.join(output_dir, 'progress.json')
+        self._local = threading.local()
+        self.stats = {'requests': 0, 'cache_hits': 0, 'retries': 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _session(self) -> requests.Session:
+        # requests.Session はスレッド間で共有しない
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self.session_factory()
+        return session
+
+    def _request(self, start: int) -> str:
+        params = dict(self.params, maximumRecords=PAGE_SIZE, recordPacking='json', startRecord=start)
+        for attempt in range(MAX_RETRIES + 1):
+            self.limiter.wait()
+            self._count('requests')
+            try:
+                response = self._session().get(self.base_url, params=params, timeout=self.timeout)
+            except requests.RequestException as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                delay = min(2 ** attempt, 60)
+                logger.warning(f"startRecord={start}: {e}（{delay}秒後に再試行）")
+            else:
+                if response.status_code == 200:
+                    return response.text
+                if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                    raise RuntimeError(f"startRecord={start}: HTTP {response.status_code} {response.text[:200]}")
+                retry_after = response.headers.get('Retry-After', '')
+                delay = int(retry_after) if retry_after.isdigit() else min(2 ** attempt, 60)
+                logger.warning(f"startRecord={start}: HTTP {response.status_code}（{delay}秒後に再試行）")
+            self._count('retries')
+            time.sleep(delay)
+        raise RuntimeError(f"startRecord={start}: 取得できませんでした")
+
+    def fetch_page(self, start: int, refresh: bool = False) -> Dict[str, Any]:
+        """
+        1ページ分のレスポンスを取得（保存済みの場合はキャッシュから読み込む）
+
+        Args:
+            start: startRecord（1始まり）
+            refresh: True の場合はキャッシュを使わずにAPIから取得し、保存済みのレスポンスを置き換える
+
+        Returns:
+            APIのレスポンス（JSON）
+        """
+        path = os.path.join(self.cache_dir, page_file(start))
+        if not refresh and os.path.exists(path):
+            self._count('cache_hits')
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        text = self._request(start)
+        data = json.loads(text)
+        if 'numberOfRecords' not in data:
+            # 検索条件に誤りがある場合は message のみが返る
+            raise RuntimeError(f"startRecord={start}: {data.get('message', text[:200])}")
+        _write_atomic(path, text)
+        return data
+
+    def _new_progress(self) -> Dict[str, Any]:
+        return {'key': self.key, 'params': self.params, 'total': None, 'next_start': 1,
+                'pages_per_part': self.pages_per_part, 'parts': []}
+
+    def _load_progress(self) -> Dict[str, Any]:
+        if os.path.exists(self.progress_path):
+            with open(self.progress_path, encoding='utf-8') as f:
+                progress = json.load(f)
+            if progress['key'] != self.key:
+                raise ValueError(f"{self.output_dir} は別の検索条件（{progress['params']}）の出力先です")
+            return progress
+        return self._new_progress()
+
+    def _invalidate(self) -> Dict[str, Any]:
+        """
+        保存済みのレスポンス（1ページ目を除く）と parts/ を削除し、進捗を最初からに戻す
+
+        検索結果の件数が変わった場合は途中のページの区切りがずれているため、保存済みのページは使えません。
+
+        Returns:
+            初期状態の進捗（progress.json にも書き込む）
+        """
+        first_page = page_file(1)
+        for name in os.listdir(self.cache_dir):
+            if name != first_page:
+                os.remove(os.path.join(self.cache_dir, name))
+        # 進捗を記録する前に中断した書きかけのファイルも含めて削除する
+        for path in glob.glob(os.path.join(self.parts_dir, 'part-*')):
+            os.remove(path)
+        progress = self._new_progress()
+        _write_atomic(self.progress_path, json.dumps(progress, ensure_ascii=False, indent=2))
+        return progress
+
+    def _write_part(self, index: int, rows: List[List[Any]]) -> str:
+        path = os.path.join(self.parts_dir, f'part-{index:05d}.{self.fmt}')
+        if self.fmt == 'parquet':
+            import pandas as pd
+            tmp_path = path + '.tmp'
+            pd.DataFrame(rows, columns=COLUMNS).to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        else:
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC)
+                writer.writerow(COLUMNS)
+                writer.writerows(rows)
+            os.replace(tmp_path, path)
+        return path
+
+    def run(self, max_pages: Optional[int] = None) -> Dict[str, Any]:
+        """
+        未取得のページを取得して parts/ に書き込む
+
+        ページは並列に取得しますが、書き込みは startRecord の順に pages_per_part ページごとに行い、
+        書き込んだ位置を progress.json に記録します。1ページ目は毎回APIから取得し、検索結果の件数が
+        前回と異なる場合は保存済みのページと parts/ を破棄して最初から取得します。
+
+        Args:
+            max_pages: 今回取得する最大ページ数（省略時は最後まで。動作確認や分割実行に使用）
+
+        Returns:
+            件数・リクエスト数・キャッシュの利用数などの辞書
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        os.makedirs(self.parts_dir, exist_ok=True)
+        progress = self._load_progress()
+        started = time.perf_counter()
+
+        # 件数の変化（会議録の追加など）に気付けるよう、1ページ目は毎回APIから取得する
+        first = self.fetch_page(1, refresh=True)
+        total = int(first['numberOfRecords'])
+        if progress['total'] is not None and progress['total'] != total:
+            logger.warning(f"検索結果の件数が変わっています（{progress['total']}件 → {total}件）。"
+                           f"保存済みのページと parts/ を破棄して最初から取得します")
+            progress = self._invalidate()
+        progress['total'] = total
+
+        # 書き込み済みのファイルと区切りを揃えるため、前回の pages_per_part を引き継ぐ
+        part_span = PAGE_SIZE * progress['pages_per_part']
+        starts = list(range(progress['next_start'], total + 1, PAGE_SIZE))
+        if max_pages is not None:
+            starts = starts[:max_pages]
+        if progress['next_start'] > 1:
+            logger.info(f"{progress['next_start'] - 1}件目まで取得済みのため続きから取得します")
+        logger.info(f"検索結果は{total}件です（{len(starts)}ページを取得）")
+
+        written = 0
+        rows: List[List[Any]] = []
+        queue = iter(starts)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # 取得待ちのページ数を制限しつつ、startRecord の順に結果を受け取る
+            pending: deque = deque()
+            for start in queue:
+                pending.append((start, executor.submit(self.fetch_page, start)))
+                if len(pending) >= self.workers * 2:
+                    break
+            while pending:
+                start, future = pending.popleft()
+                following = next(queue, None)
+                if following is not None:
+                    pending.append((following, executor.submit(self.fetch_page, following)))
+                rows.extend(parse_records(future.result()))
+                next_start = start + PAGE_SIZE
+                if (next_start - 1) % part_span == 0 or next_start > total:
+                    path = self._write_part((start - 1) // part_span, rows)
+                    written += len(rows)
+                    rows = []
+                    progress['next_start'] = next_start
+                    progress['parts'] = sorted(set(progress['parts']) | {os.path.basename(path)})
+                    _write_atomic(self.progress_path, json.dumps(progress, ensure_ascii=False, indent=2))
+                    logger.info(f"{min(next_start - 1, total)}/{total}件を書き込みました")
+
+        elapsed = time.perf_counter() - started
+        return dict(self.stats, total=total, written=written, complete=progress['next_start'] > total,
+                    seconds=round(elapsed, 2))
+
+
+def load_parts(output_dir: str):
+    """
+    parts/ の発言を startRecord の順に結合して読み込む
+
+    Args:
+        output_dir: KokkaiCollector の出力先
+
+    Returns:
+        COLUMNS の列を持つデータフレーム（ノートブックが作成する kokkai_speech_<件数>.csv と同じ内容）
+    """
+    import pandas as pd
+
+    paths = sorted(glob.glob(os.path.join(output_dir, 'parts', 'part-*.*')))
+    frames = [pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+              for path in paths if not path.endswith('.tmp')]
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        start = int(query.get('startRecord', ['1'])[0])
+        path = os.path.join(self.server.cache_dir, page_file(start))
+        with self.server.lock:
+            self.server.requests.append(start)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                body = f.read()
+            status = 200
+        else:
+            body = json.dumps({'message': f'startRecord={start} のレスポンスは保存されていません'},
+                              ensure_ascii=False).encode('utf-8')
+            status = 404
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def start_replay_server(cache_dir: str, port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    保存したレスポンス（cache/<検索条件のキー>/）を startRecord に応じて返すHTTPサーバーを起動
+
+    Args:
+        cache_dir: レスポンスを保存したディレクトリ
+        port: 待ち受けるポート（0の場合は空いているポート）
+
+    Returns:
+        (サーバー, APIのURL) のタプル（server.requests に受け付けた startRecord が記録されます）
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), _ReplayHandler)
+    server.cache_dir = cache_dir
+    server.requests = []
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/api/speech'
+
+
+def _record_responses(directory: str, total: int) -> List[List[Any]]:
+    """APIと同じ形式の架空のレスポンスを作成（smoke_test 用）"""
+    os.makedirs(directory, exist_ok=True)
+    records = [{
+        'speechID': f'test_{i}', 'imageKind': '会議録', 'nameOfHouse': '衆議院' if i % 2 else '参議院',
+        'nameOfMeeting': '本会議', 'date': f'2023-{i % 12 + 1:02d}-01', 'speechOrder': i % 50,
+        'speaker': f'議員{i % 37}', 'speakerGroup': '' if i % 7 == 0 else f'会派{i % 5}',
+        'speakerPosition': '', 'speech': f'○議員{i % 37}君　発言{i}です。\r\n次の文です。',
+    } for i in range(total)]
+    for start in range(1, total + 1, PAGE_SIZE):
+        page = records[start - 1:start - 1 + PAGE_SIZE]
+        next_position = start + len(page)
+        data = {'numberOfRecords': total, 'numberOfReturn': len(page), 'startRecord': start,
+                'nextRecordPosition': next_position if next_position <= total else None, 'speechRecord': page}
+        with open(os.path.join(directory, page_file(start)), 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+    return parse_records({'speechRecord': records})
+
+
+def smoke_test(workdir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    架空のレスポンスを返すローカルのサーバーに対して、途中で中断してから再開し、
+    出力が全件を一度に取得した場合と一致すること、1ページ目以外の同じページを二度リクエストしないこと、
+    件数が変わった場合は最初から取得し直すことを確認
+
+    Args:
+        workdir: 作業ディレクトリ（省略時は一時ディレクトリ）
+
+    Returns:
+        確認結果の辞書（一致しない場合は AssertionError）
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix='kokkai_smoke_')
+    total = 2345
+    expected = _record_responses(os.path.join(workdir, 'recorded'), total)
+    server, base_url = start_replay_server(os.path.join(workdir, 'recorded'))
+    params = {'from': '2023-01-01', 'until': '2023-12-31'}
+    try:
+        output_dir = os.path.join(workdir, 'output')
+        first = KokkaiCollector(output_dir, params, base_url, workers=4, interval=0.0, pages_per_part=3).run(max_pages=5)
+        assert not first['complete']
+        second = KokkaiCollector(output_dir, params, base_url, workers=4, interval=0.0, pages_per_part=3).run()
+        assert second['complete']
+        third = KokkaiCollector(output_dir, params, base_url, workers=4, interval=0.0, pages_per_part=3).run()
+        # 取得済みの場合は件数の確認（1ページ目）だけをリクエストする
+        assert third['requests'] == 1 and third['written'] == 0
+        _check_parts(output_dir, expected)
+        pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+        requested = [start for start in server.requests if start != 1]
+        assert sorted(requested) == list(range(1 + PAGE_SIZE, total + 1, PAGE_SIZE)), \
+            f"{pages}ページに対して{len(requested) + 1}ページ分リクエストしました"
+        assert server.requests.count(1) == 3
+
+        # 件数が変わった場合は保存済みのページと parts/ を破棄して最初から取得し直す
+        changed_total = total + 150
+        changed = _record_responses(os.path.join(workdir, 'recorded'), changed_total)
+        del server.requests[:]
+        fourth = KokkaiCollector(output_dir, params, base_url, workers=4, interval=0.0, pages_per_part=3).run()
+        assert fourth['complete'] and fourth['total'] == changed_total
+        assert sorted(server.requests) == list(range(1, changed_total + 1, PAGE_SIZE))
+        _check_parts(output_dir, changed)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return {'workdir': workdir, 'records': total, 'pages': pages, 'first_run': first, 'resumed_run': second,
+            'changed_run': fourth}
+
+
+def _check_parts(output_dir: str, expected: List[List[Any]]) -> None:
+    """parts/ の発言が expected と一致することを確認（smoke_test 用）"""
+    frame = load_parts(output_dir)
+    actual = frame.astype(object).where(frame.notna(), '').values.tolist()
+    expected = [[value if value is not None else '' for value in row] for row in expected]
+    assert len(actual) == len(expected), f"件数が一致しません: {len(actual)} != {len(expected)}"
+    assert actual == expected, "取得した発言が一致しません"
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description='国会会議録検索システムAPIから発言を収集します')
+    arg_parser.add_argument('--any', help='検索する文字列')
+    arg_parser.add_argument('--house', dest='nameOfHouse', help='院名')
+    arg_parser.add_argument('--meeting', dest='nameOfMeeting', help='会議名')
+    arg_parser.add_argument('--speaker', help='発言者名')
+    arg_parser.add_argument('--from', dest='date_from', help='開始日（例: 2018-01-01）')
+    arg_parser.add_argument('--until', dest='date_until', help='終了日（例: 2022-12-31）')
+    arg_parser.add_argument('--output', help='出力先のディレクトリ')
+    arg_parser.add_argument('--format', choices=['csv', 'parquet'], default='csv', help='parts/ の出力形式')
+    arg_parser.add_argument('--merge', help='取得後に全件を結合して書き込むCSV（例: kokkai_speech.csv）')
+    arg_parser.add_argument('--workers', type=int, default=WORKERS, help='同時に送るリクエスト数')
+    arg_parser.add_argument('--interval', type=float, default=INTERVAL, help='リクエストの開始間隔（秒）')
+    arg_parser.add_argument('--pages-per-part', type=int, default=PAGES_PER_PART, help='1ファイルに書き込むページ数')
+    arg_parser.add_argument('--max-pages', type=int, help='今回取得する最大ページ数')
+    arg_parser.add_argument('--base-url', default=BASE_URL, help='APIのURL')
+    arg_parser.add_argument('--replay', help='保存したレスポンスのディレクトリを返すサーバーを起動')
+    arg_parser.add_argument('--port', type=int, default=8000, help='--replay で待ち受けるポート')
+    arg_parser.add_argument('--smoke-test', action='store_true', help='ローカルのサーバーで中断・再開を確認')
+    args = arg_parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+    if args.smoke_test:
+        print(json.dumps(smoke_test(), ensure_ascii=False, indent=2))
+        return 0
+    if args.replay:
+        server, base_url = start_replay_server(args.replay, args.port)
+        logger.info(f"{base_url} で {args.replay} のレスポンスを返します（Ctrl+C で終了）")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+        return 0
+    if not args.output or not (args.date_from and args.date_until):
+        arg_parser.error('--output、--from、--until を指定してください')
+
+    params = {'any': args.any, 'nameOfHouse': args.nameOfHouse, 'nameOfMeeting': args.nameOfMeeting,
+              'speaker': args.speaker, 'from': args.date_from, 'until': args.date_until}
+    collector = KokkaiCollector(args.output, params, args.base_url, args.workers, args.interval,
+                                args.pages_per_part, args.format)
+    result = collector.run(args.max_pages)
+    if args.merge and result['complete']:
+        frame = load_parts(args.output)
+        frame.to_csv(args.merge, index=False, quoting=csv.QUOTE_NONNUMERIC)
+        result['merged'] = args.merge
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Noun Cache Module - 発言内容の一般名詞を一度だけ抽出して保存するモジュール
+
+ワードクラウド用の一般名詞（Janome の品詞が「名詞,一般」のもの）を発言ごとに抽出し、
+発言内容のハッシュ値をキーとして名詞の出現回数を SQLite に保存します。未抽出の発言だけを
+複数プロセスで形態素解析するため、ストップワードやクラスタの割り当てを変えても再解析は不要で、
+クラスタ別の単語の出現回数は保存済みの出現回数を合計して求めます。
+
+使い方（研究コード ディレクトリで実行）:
+    python noun_cache.py DF_2018-2022.csv --column 発言内容
+
+ノートブックでの利用:
+    from noun_cache import extract_corpus, cluster_word_counts
+    doc_nouns = extract_corpus(df3['発言内容'].tolist(), 'nouns.sqlite3')
+    counts = cluster_word_counts(doc_nouns, df3['cluster'], stoplist)
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = 'nouns.sqlite3'
+# 1回のプロセス間通信で渡す発言数
+CHUNK_SIZE = 64
+# この件数ごとに抽出結果を保存（中断しても保存済みの分は再解析しない）
+COMMIT_EVERY = 1000
+
+# ワーカープロセスごとに1つだけ作成する形態素解析器（辞書の読み込みに時間がかかるため）
+_tokenizer = None
+
+
+def text_key(text: str) -> str:
+    """発言内容のハッシュ値（キャッシュのキー）"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _get_tokenizer():
+    global _tokenizer
+    if _tokenizer is None:
+        from janome.tokenizer import Tokenizer
+        _tokenizer = Tokenizer()
+    return _tokenizer
+
+
+def extract_nouns(text: str) -> Dict[str, int]:
+    """
+    発言内容から一般名詞を抽出して出現回数を数える
+
+    ノートブックの get_nouns と同じく、品詞が「名詞,一般」の単語を対象にします。
+
+    Args:
+        text: 発言内容
+
+    Returns:
+        名詞 -> 出現回数 の辞書
+    """
+    counts: Dict[str, int] = {}
+    if not isinstance(text, str) or not text:
+        return counts
+    for token in _get_tokenizer().tokenize(text):
+        split_token = token.part_of_speech.split(',')
+        if split_token[0] == '名詞' and split_token[1] == '一般':
+            counts[token.surface] = counts.get(token.surface, 0) + 1
+    return counts
+
+
+def _extract_item(item: Tuple[str, str]) -> Tuple[str, Dict[str, int]]:
+    key, text = item
+    return key, extract_nouns(text)
+
+
+class NounCache:
+    """発言内容のハッシュ値ごとに名詞の出現回数を保存する SQLite のキャッシュ"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        """
+        初期化
+
+        Args:
+            path: SQLite ファイルのパス
+        """
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS nouns (key TEXT PRIMARY KEY, counts TEXT NOT NULL)')
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> 'NounCache':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, int]]:
+        """保存済みの出現回数をまとめて取得（保存されていないキーは含まれません）"""
+        result = {}
+        keys = list(keys)
+        # SQLite のパラメータ数の上限を超えないよう分割して問い合わせる
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            for key, counts in self.conn.execute(f'SELECT key, counts FROM nouns WHERE key IN ({placeholders})', batch):
+                result[key] = json.loads(counts)
+        return result
+
+    def put_many(self, items: Iterable[Tuple[str, Dict[str, int]]]) -> None:
+        """出現回数をまとめて保存"""
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO nouns (key, counts) VALUES (?, ?)',
+                                  ((key, json.dumps(counts, ensure_ascii=False)) for key, counts in items))
+
+
+def extract_corpus(texts: Sequence[str], cache_path: str = DEFAULT_CACHE_PATH,
+                   workers: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> List[Counter]:
+    """
+    全発言の一般名詞の出現回数を取得（未抽出の発言だけを並列に形態素解析）
+
+    Args:
+        texts: 発言内容のリスト
+        cache_path: キャッシュの SQLite ファイルのパス
+        workers: 並列プロセス数（省略時はCPUコア数、1の場合はこのプロセスで解析）
+        chunk_size: 1回のプロセス間通信で渡す発言数
+
+    Returns:
+        発言ごとの Counter のリスト（texts と同じ順序）
+    """
+    keys = [text_key(text) if isinstance(text, str) else '' for text in texts]
+    with NounCache(cache_path) as cache:
+        cached = cache.get_many(set(keys))
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in pending:
+                pending[key] = text if isinstance(text, str) else ''
+
+        if pending:
+            start = time.perf_counter()
+            logger.info(f"{len(texts)}件中{len(pending)}件の発言を形態素解析します")
+            workers = workers or os.cpu_count() or 1
+            buffer = []
+            if workers > 1:
+                executor = ProcessPoolExecutor(max_workers=workers)
+                results = executor.map(_extract_item, pending.items(), chunksize=chunk_size)
+            else:
+                executor = None
+                results = map(_extract_item, pending.items())
+            try:
+                for key, counts in results:
+                    cached[key] = counts
+                    buffer.append((key, counts))
+                    if len(buffer) >= COMMIT_EVERY:
+                        cache.put_many(buffer)
+                        buffer = []
+            finally:
+                cache.put_many(buffer)
+                if executor is not None:
+                    executor.shutdown()
+            elapsed = time.perf_counter() - start
+            logger.info(f"形態素解析が完了しました（{elapsed:.1f}秒、{len(pending) / max(elapsed, 1e-9):.0f}件/秒）")
+
+    return [Counter(cached[key]) for key in keys]
+
+
+def _merge_word_forms(counts: Counter, stopwords: Set[str]) -> Counter:
+    """
+    WordCloud.generate() が単語を数える際と同じ整理を出現回数に適用する
+
+    数字だけの単語とストップワード（大文字・小文字を区別しない）を除き、大文字・小文字の違いと
+    英単語の複数形（末尾の s）をまとめます。まとめた単語は最も多く出現した表記で数えます。
+    """
+    forms: Dict[str, Counter] = {}
+    for word, count in counts.items():
+        if word.isdigit() or word.lower() in stopwords:
+            continue
+        forms.setdefault(word.lower(), Counter())[word] += count
+    for key in list(forms):
+        if key.endswith('s') and not key.endswith('ss') and key[:-1] in forms:
+            for word, count in forms.pop(key).items():
+                forms[key[:-1]][word[:-1]] += count
+    return Counter({case_counts.most_common(1)[0][0]: sum(case_counts.values())
+                    for case_counts in forms.values()})
+
+
+def cluster_word_counts(doc_counts: Sequence[Counter], labels: Iterable[int],
+                        stoplist: Optional[Iterable[str]] = None) -> Dict[int, Counter]:
+    """
+    クラスタごとの名詞の出現回数を、発言ごとの出現回数の合計で求める
+
+    WordCloud.generate_from_frequencies() は単語を整理しないため、以前の generate() と同じ描画になるよう
+    数字だけの単語の除外、大文字・小文字と複数形の統合もここで行います。
+
+    Args:
+        doc_counts: extract_corpus の戻り値
+        labels: 発言ごとのクラスタ番号（doc_counts と同じ順序）
+        stoplist: 除外する単語
+
+    Returns:
+        クラスタ番号 -> Counter の辞書
+    """
+    totals: Dict[int, Counter] = {}
+    for counts, label in zip(doc_counts, labels):
+        totals.setdefault(int(label), Counter()).update(counts)
+    stopwords = {word.lower() for word in stoplist or ()}
+    return {label: _merge_word_forms(counts, stopwords) for label, counts in totals.items()}
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description='発言内容の一般名詞を抽出してキャッシュに保存します')
+    arg_parser.add_argument('csv', help='発言データのCSV（例: DF_2018-2022.csv）')
+    arg_parser.add_argument('--column', default='発言内容', help='発言内容の列名')
+    arg_parser.add_argument('--cache', default=DEFAULT_CACHE_PATH, help='キャッシュの SQLite ファイル')
+    arg_parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='並列プロセス数')
+    args = arg_parser.parse_args(argv)
+
+    import pandas as pd
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+    texts = pd.read_csv(args.csv, usecols=[args.column])[args.column].tolist()
+    doc_counts = extract_corpus(texts, args.cache, args.jobs)
+    total = sum((counts for counts in doc_counts), Counter())
+    print(json.dumps({'documents': len(doc_counts), 'unique_nouns': len(total),
+                      'top': total.most_common(20)}, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+PCA Views Module - 3次元PCAの座標を一度だけ計算し、表示する点を間引いて返すモジュール
+
+BERT_UnityData.ipynb の3次元プロット（Plotly / Dash）用に、PCAを一度だけ学習して全発言の座標を保存し、
+Dash のコールバックからはクラスタ・発言者・会派・年の条件とズームの段階（詳細度）に応じて、
+表示する発言の行番号だけを返します。
+
+- 条件ごとの行番号は値ごとに並べた索引から取り出すため、データフレームの絞り込みは行いません
+- 点数が上限を超える場合は、空間を格子に分けて格子ごとの点数に比例して間引きます（点の少ない格子も
+  最低1点は残すため、外れた位置の発言も表示されます）。ズームの段階が上がるほど細かい格子を使います
+- 座標は分散表現のハッシュ値とともに保存し、同じ分散表現では再計算しません
+
+使い方（ノートブック）:
+    from pca_views import PcaViews
+    views = PcaViews.cached(store.vectors[:len(df3)], df3, 'BERT/BERT_pca3d.npz')
+    rows = views.query(cluster=[0, 3], year=2020, level=2, center=(0, 0, 0))
+    df_view = views.frame(rows)
+"""
+
+import os
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 一度に座標を計算する行数
+BLOCK_ROWS = 4096
+# 1回の表示で返す最大の点数（ブラウザに送る点数）
+MAX_POINTS = 5000
+# ズームの段階の数（段階ごとに格子の幅を半分にする）
+LEVELS = 6
+# 段階0の格子の1軸あたりの分割数
+BASE_RESOLUTION = 8
+# 保持する問い合わせ結果の数
+RESULT_CACHE_SIZE = 128
+# Plotly の3次元プロットの既定のカメラ位置（eye）の原点からの距離
+DEFAULT_CAMERA_DISTANCE = float(np.linalg.norm([1.25, 1.25, 1.25]))
+
+COORD_COLUMNS = ['PCA 1', 'PCA 2', 'PCA 3']
+# query の引数名 -> データフレームの列名
+FILTER_COLUMNS = {'cluster': 'cluster', 'speaker': '発言者名', 'party': '会派', 'year': '年'}
+
+FilterValue = Optional[Union[Any, Sequence[Any]]]
+
+
+def vectors_key(vectors: np.ndarray, block_rows: int = BLOCK_ROWS) -> str:
+    """分散表現の内容からハッシュ値を計算（保存した座標が使えるかの判定に使用）"""
+    digest = hashlib.sha256(f'{vectors.shape}:{vectors.dtype}'.encode('utf-8'))
+    for start in range(0, len(vectors), block_rows):
+        digest.update(np.ascontiguousarray(vectors[start:start + block_rows]).tobytes())
+    return digest.hexdigest()
+
+
+def fit_projection(vectors: np.ndarray, n_components: int = 3, fit_rows: Optional[int] = None,
+                   block_rows: int = BLOCK_ROWS, random_state: int = 42) -> Dict[str, np.ndarray]:
+    """
+    PCAを学習し、全行の座標をブロック単位で計算
+
+    Args:
+        vectors: (行数, 次元数) の分散表現（メモリマップ可）
+        n_components: 次元数
+        fit_rows: 学習に使う行数（省略時は全行。指定した場合は無作為に抽出）
+        block_rows: 一度に座標を計算する行数
+        random_state: 抽出とPCAの乱数シード
+
+    Returns:
+        'coords'、'components'、'mean'、'explained_variance_ratio' の辞書
+    """
+    from sklearn.decomposition import PCA
+
+    if fit_rows and fit_rows < len(vectors):
+        rng = np.random.default_rng(random_state)
+        sample = np.sort(rng.choice(len(vectors), fit_rows, replace=False))
+        fit_data = np.asarray(vectors[sample], dtype=np.float32)
+    else:
+        fit_data = np.asarray(vectors, dtype=np.float32)
+    pca = PCA(n_components=n_components, random_state=random_state).fit(fit_data)
+    del fit_data
+
+    coords = np.empty((len(vectors), n_components), dtype=np.float32)
+    for start in range(0, len(vectors), block_rows):
+        block = np.asarray(vectors[start:start + block_rows], dtype=np.float32)
+        coords[start:start + len(block)] = pca.transform(block)
+    return {
+        'coords': coords,
+        'components': pca.components_.astype(np.float32),
+        'mean': pca.mean_.astype(np.float32),
+        'explained_variance_ratio': pca.explained_variance_ratio_,
+    }
+
+
+def grid_cells(coords: np.ndarray, lower: np.ndarray, upper: np.ndarray, levels: int = LEVELS) -> np.ndarray:
+    """
+    段階ごとの格子の番号を計算
+
+    Args:
+        coords: (行数, 3) の座標
+        lower: 各軸の最小値
+        upper: 各軸の最大値
+        levels: 段階の数
+
+    Returns:
+        (段階の数, 行数) の int32 配列（段階 l の格子は1軸あたり BASE_RESOLUTION * 2**l 分割）
+    """
+    extent = np.where(upper > lower, upper - lower, 1.0)
+    unit = (coords - lower) / extent
+    cells = np.empty((levels, len(coords)), dtype=np.int32)
+    for level in range(levels):
+        resolution = BASE_RESOLUTION * 2 ** level
+        index = np.clip((unit * resolution).astype(np.int64), 0, resolution - 1)
+        cells[level] = index[:, 0] + resolution * (index[:, 1] + resolution * index[:, 2])
+    return cells
+
+
+def downsample(rows: np.ndarray, cells: np.ndarray, rank: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    格子ごとの点数に比例して max_points 点に間引く（点のある格子は最低1点を残す）
+
+    各格子の点を乱数の順位で並べ、「格子内の何番目か / 格子の点数」の小さい順に選ぶため、
+    選ばれる点数は各格子の点数にほぼ比例します。
+
+    Args:
+        rows: 候補の行番号
+        cells: 候補の格子の番号（rows と同じ順序）
+        rank: 候補の乱数の順位（rows と同じ順序）
+        max_points: 最大の点数
+
+    Returns:
+        選んだ行番号（昇順）
+    """
+    if len(rows) <= max_points:
+        return rows
+    order = np.lexsort((rank, cells))
+    sorted_cells = cells[order]
+    _, starts, inverse, counts = np.unique(sorted_cells, return_index=True, return_inverse=True,
+                                           return_counts=True)
+    position = np.arange(len(order)) - starts[inverse]
+    share = np.where(position == 0, -1.0, (position + 0.5) / counts[inverse])
+    chosen = order[np.lexsort((rank[order], share))[:max_points]]
+    return np.sort(rows[chosen])
+
+
+class PcaViews:
+    """3次元PCAの座標と、条件・ズームの段階に応じた表示用の行番号の索引"""
+
+    def __init__(self, projection: Dict[str, np.ndarray], df: pd.DataFrame, key: Optional[str] = None,
+                 random_state: int = 42):
+        """
+        初期化（条件ごとの索引と段階ごとの格子をここで作成します）
+
+        Args:
+            projection: fit_projection の戻り値
+            df: 分散表現と同じ行順の発言データ（'cluster'、'発言者名'、'会派'、'日付' の列）
+            key: 分散表現のハッシュ値（vectors_key）
+            random_state: 間引きに使う乱数の順位のシード
+        """
+        self.projection = projection
+        self.coords = projection['coords']
+        if len(df) != len(self.coords):
+            raise ValueError(f"発言データの行数（{len(df)}）が座標の行数（{len(self.coords)}）と異なります")
+        self.df = df
+        self.key = key
+        self.lower = self.coords.min(axis=0) if len(self.coords) else np.zeros(3, dtype=np.float32)
+        self.upper = self.coords.max(axis=0) if len(self.coords) else np.zeros(3, dtype=np.float32)
+        self.cells = grid_cells(self.coords, self.lower, self.upper)
+        self.rank = np.random.default_rng(random_state).permutation(len(self.coords)).astype(np.int32)
+        self._postings = {name: self._build_postings(self._filter_values(column))
+                          for name, column in FILTER_COLUMNS.items() if column in df.columns or column == '年'}
+        self._results: 'OrderedDict[Tuple, np.ndarray]' = OrderedDict()
+
+    def _filter_values(self, column: str) -> pd.Series:
+        if column == '年':
+            return pd.to_datetime(self.df['日付']).dt.year
+        return self.df[column]
+
+    @staticmethod
+    def _build_postings(values: pd.Series) -> Tuple[Dict[Any, int], np.ndarray, np.ndarray]:
+        # 値ごとに行番号を並べた配列と、各値の範囲（offsets[code]:offsets[code + 1]）
+        codes, uniques = pd.factorize(values, sort=True)
+        order = np.argsort(codes, kind='stable').astype(np.int64)
+        offsets = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        lookup = {value.item() if hasattr(value, 'item') else value: code for code, value in enumerate(uniques)}
+        return lookup, order[codes[order] >= 0], offsets - np.count_nonzero(codes < 0)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, df: pd.DataFrame, fit_rows: Optional[int] = None) -> 'PcaViews':
+        """分散表現からPCAを学習して作成"""
+        start = time.perf_counter()
+        projection = fit_projection(vectors, fit_rows=fit_rows)
+        logger.info(f"{len(vectors)}行のPCAの座標を計算しました（{time.perf_counter() - start:.1f}秒）")
+        return cls(projection, df, vectors_key(vectors))
+
+    @classmethod
+    def cached(cls, vectors: np.ndarray, df: pd.DataFrame, cache_path: str,
+               fit_rows: Optional[int] = None) -> 'PcaViews':
+        """
+        保存した座標を読み込み、分散表現が変わっている場合だけPCAを学習し直して保存
+
+        Args:
+            vectors: (行数, 次元数) の分散表現（EmbeddingStore.vectors などのメモリマップ可）
+            df: 分散表現と同じ行順の発言データ
+            cache_path: 座標の保存先（.npz）
+            fit_rows: 学習に使う行数（省略時は全行）
+
+        Returns:
+            PcaViews
+        """
+        key = vectors_key(vectors)
+        if os.path.exists(cache_path):
+            with np.load(cache_path) as data:
+                if str(data['key']) == key:
+                    projection = {name: data[name] for name in data.files if name != 'key'}
+                    return cls(projection, df, key)
+            logger.info(f"分散表現が変更されているためPCAを学習し直します: {cache_path}")
+        views = cls.build(vectors, df, fit_rows)
+        views.save(cache_path)
+        return views
+
+    def save(self, cache_path: str) -> None:
+        """座標とPCAの係数を保存"""
+        tmp_path = cache_path + '.tmp.npz'
+        np.savez(tmp_path, key=np.array(self.key or ''), **self.projection)
+        os.replace(tmp_path, cache_path)
+
+    @property
+    def bounds(self) -> Dict[str, Tuple[float, float]]:
+        """各軸の表示範囲（ノートブックと同じく最小値 - 1 から最大値 + 1）"""
+        return {column: (float(low) - 1, float(high) + 1)
+                for column, low, high in zip(COORD_COLUMNS, self.lower, self.upper)}
+
+    @staticmethod
+    def _camera_vector(camera: Dict[str, Any], name: str) -> np.ndarray:
+        vector = camera.get(name) or {}
+        return np.array([vector.get('x', 0), vector.get('y', 0), vector.get('z', 0)], dtype=np.float64)
+
+    @classmethod
+    def level_for_camera(cls, camera: Optional[Dict[str, Any]]) -> int:
+        """
+        Plotly の3次元プロットのカメラ位置からズームの段階を求める
+
+        Args:
+            camera: relayoutData['scene.camera']（{'eye': {'x', 'y', 'z'}, 'center': {...}, ...}）
+
+        Returns:
+            既定のカメラ位置で0、注視点までの距離が半分になるごとに1増える段階
+        """
+        if not camera or 'eye' not in camera:
+            return 0
+        distance = float(np.linalg.norm(cls._camera_vector(camera, 'eye') - cls._camera_vector(camera, 'center')))
+        if distance <= 0:
+            return LEVELS - 1
+        return int(np.clip(np.floor(np.log2(DEFAULT_CAMERA_DISTANCE / distance) + 0.5), 0, LEVELS - 1))
+
+    def center_for_camera(self, camera: Optional[Dict[str, Any]],
+                          aspectratio: Optional[Dict[str, float]] = None) -> Optional[np.ndarray]:
+        """
+        Plotly の3次元プロットのカメラの注視点を、PCAの座標に変換（query の center に指定）
+
+        カメラの座標は、軸の表示範囲（bounds）の中央を原点とし、各軸の表示範囲を aspectratio の長さとした座標です。
+
+        Args:
+            camera: relayoutData['scene.camera']（{'center': {'x', 'y', 'z'}, ...}）
+            aspectratio: relayoutData['scene.aspectratio']（省略時は既定の {'x': 1, 'y': 1, 'z': 1}）
+
+        Returns:
+            注視点のPCAの座標（カメラの情報がない場合は None）
+        """
+        if not camera or 'center' not in camera:
+            return None
+        aspect = self._camera_vector({'aspect': aspectratio or {'x': 1, 'y': 1, 'z': 1}}, 'aspect')
+        aspect[aspect <= 0] = 1
+        lower, upper = np.array(list(self.bounds.values()), dtype=np.float64).T
+        return (lower + upper) / 2 + self._camera_vector(camera, 'center') / aspect * (upper - lower)
+
+    def rows_for(self, name: str, values: FilterValue) -> Optional[np.ndarray]:
+        """
+        条件に一致する行番号（昇順）を索引から取得
+
+        Args:
+            name: 'cluster'、'speaker'、'party'、'year' のいずれか
+            values: 値または値のリスト（None の場合は条件なし）
+
+        Returns:
+            行番号の配列（条件なしの場合は None）
+        """
+        if values is None:
+            return None
+        lookup, order, offsets = self._postings[name]
+        if isinstance(values, (str, bytes)) or not isinstance(values, Iterable):
+            values = [values]
+        parts = [order[offsets[lookup[value]]:offsets[lookup[value] + 1]] for value in values if value in lookup]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return parts[0] if len(parts) == 1 else np.sort(np.concatenate(parts))
+
+    def query(self, cluster: FilterValue = None, speaker: FilterValue = None, party: FilterValue = None,
+              year: FilterValue = None, level: int = 0, center: Optional[Sequence[float]] = None,
+              max_points: int = MAX_POINTS) -> np.ndarray:
+        """
+        条件とズームの段階に応じて表示する行番号を取得
+
+        Args:
+            cluster: クラスタ番号（複数可）
+            speaker: 発言者名（複数可）
+            party: 会派（複数可）
+            year: 年（複数可）
+            level: ズームの段階（0〜LEVELS-1。大きいほど細かい格子で間引く）
+            center: 指定した場合は、この座標を中心に段階に応じた範囲（全体の 1/2**level）の点だけを対象にする
+            max_points: 最大の点数
+
+        Returns:
+            行番号の配列（昇順）
+        """
+        level = int(np.clip(level, 0, LEVELS - 1))
+        filters = {'cluster': cluster, 'speaker': speaker, 'party': party, 'year': year}
+        cache_key = (tuple((name, self._freeze(value)) for name, value in filters.items()), level,
+                     None if center is None else tuple(np.round(center, 3)), max_points)
+        if cache_key in self._results:
+            self._results.move_to_end(cache_key)
+            return self._results[cache_key]
+
+        rows = None
+        for name, value in filters.items():
+            matched = self.rows_for(name, value)
+            if matched is not None:
+                rows = matched if rows is None else np.intersect1d(rows, matched, assume_unique=True)
+        if rows is None:
+            rows = np.arange(len(self.coords))
+        if center is not None and level > 0:
+            half = (self.upper - self.lower) / 2 ** (level + 1)
+            points = self.coords[rows]
+            inside = np.all(np.abs(points - np.asarray(center, dtype=np.float32)) <= half, axis=1)
+            rows = rows[inside]
+
+        result = downsample(rows, self.cells[level][rows], self.rank[rows], max_points)
+        self._results[cache_key] = result
+        if len(self._results) > RESULT_CACHE_SIZE:
+            self._results.popitem(last=False)
+        return result
+
+    @staticmethod
+    def _freeze(value: FilterValue):
+        if value is None or isinstance(value, (str, bytes)) or not isinstance(value, Iterable):
+            return value
+        return tuple(sorted(value))
+
+    def frame(self, rows: np.ndarray, columns: Sequence[str] = ('cluster', '発言者名', '発言内容')) -> pd.DataFrame:
+        """
+        行番号の座標と発言データの列をデータフレームにする（plotly.express の入力用）
+
+        Args:
+            rows: query の戻り値
+            columns: 追加する発言データの列
+
+        Returns:
+            'PCA 1'〜'PCA 3' と columns の列を持つデータフレーム（インデックスは行番号）
+        """
+        result = pd.DataFrame(self.coords[rows], columns=COORD_COLUMNS, index=rows)
+        for column in columns:
+            result[column] = self.df[column].to_numpy()[rows]
+        return result